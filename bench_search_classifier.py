@@ -0,0 +1,149 @@
+"""
+Benchmark the should_search_web fast path against the LLM-only classifier.
+
+    python bench_search_classifier.py          # heuristic only
+    python bench_search_classifier.py --llm    # also run the LLM classifier (needs GROQ_API_KEY)
+
+Reports accuracy, how many queries the heuristic left to the LLM, and
+per-query latency for each strategy on the labelled set below.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import search_classifier
+
+# (query, needs_search)
+LABELLED_QUERIES = [
+    # needs live data
+    ("who is the current president of the usa", True),
+    ("latest iphone release date?", True),
+    ("what's the bitcoin price right now", True),
+    ("who won the champions league final yesterday", True),
+    ("any news about the gta 6 trailer", True),
+    ("weather in london today", True),
+    ("premier league standings", True),
+    ("when does season 3 of the show come out", True),
+    ("who is the ceo of twitter", True),
+    ("nvidia stock price", True),
+    ("what happened in the election", True),
+    ("current exchange rate usd to inr", True),
+    ("is ozzy osbourne still alive", True),
+    ("what are the patch notes for the new minecraft update", True),
+    ("search for the best budget phones 2026", True),
+    ("how much does a ps5 cost now", True),
+    ("top trending games this week", True),
+    ("who is the prime minister of the uk", True),
+    ("did the new marvel movie release", True),
+    ("what's the score of the lakers game tonight", True),
+    ("recent earthquakes in japan", True),
+    ("f1 race results", True),
+    ("latest version of python", True),
+    ("look up the opening hours of the louvre", True),
+
+    # does not need search
+    ("hi", False),
+    ("yooo wsg", False),
+    ("how are you doing today bro", False),
+    ("lol that's so funny", False),
+    ("write me a poem about cats", False),
+    ("roast my friend alex", False),
+    ("fix this python error: IndexError list index out of range", False),
+    ("explain how photosynthesis works", False),
+    ("what is a black hole", False),
+    ("what's 25 * 48", False),
+    ("2+2", False),
+    ("can you help me with my essay", False),
+    ("what do you think about pineapple on pizza", False),
+    ("would you rather fight 100 ducks or 1 horse", False),
+    ("translate hello to spanish", False),
+    ("difference between a list and a tuple", False),
+    ("write a javascript function to reverse a string", False),
+    ("tell me a joke", False),
+    ("thanks man", False),
+    ("good night", False),
+    ("why is the sky blue", False),
+    ("solve x^2 - 4 = 0", False),
+    ("who are you", False),
+    ("what's your favorite color", False),
+    ("summarize the plot of hamlet", False),
+    ("should i learn rust or go", False),
+    ("ok", False),
+    ("define entropy", False),
+
+    # judgement calls (the LLM gets these)
+    ("tell me about the eiffel tower", False),
+    ("who invented the telephone", False),
+    ("best laptop for programming", True),
+    ("is it safe to travel to egypt", True),
+]
+
+
+async def run_llm(queries):
+    results = []
+    for query, _ in queries:
+        started = time.perf_counter()
+        try:
+            decision = await search_classifier.llm_should_search(query)
+        except Exception as e:
+            print(f"  LLM error on {query!r}: {e}")
+            decision = False
+        results.append((decision, (time.perf_counter() - started) * 1000))
+    return results
+
+
+def run_heuristic(queries):
+    results = []
+    for query, _ in queries:
+        started = time.perf_counter()
+        decision, _, _ = search_classifier.heuristic(search_classifier.normalize(query))
+        results.append((decision, (time.perf_counter() - started) * 1000))
+    return results
+
+
+def report(name, queries, results, fallback=None):
+    correct = undecided = 0
+    for (query, label), (decision, _) in zip(queries, results):
+        if decision is None:
+            undecided += 1
+            if fallback is not None:
+                decision = fallback[query]
+            else:
+                continue
+        if decision == label:
+            correct += 1
+        else:
+            print(f"  miss [{name}] {query!r}: got {decision}, expected {label}")
+
+    latencies = [ms for _, ms in results]
+    decided = len(queries) - (undecided if fallback is None else 0)
+    print(
+        f"{name:<22} accuracy {correct}/{decided} ({correct / max(decided, 1):.0%})"
+        f" | undecided {undecided}"
+        f" | median {statistics.median(latencies):.3f} ms | max {max(latencies):.3f} ms"
+    )
+
+
+async def main():
+    queries = LABELLED_QUERIES
+    heuristic_results = run_heuristic(queries)
+    report("heuristic (decided)", queries, heuristic_results)
+
+    if "--llm" not in sys.argv:
+        return
+
+    llm_results = await run_llm(queries)
+    report("llm only (current)", queries, llm_results)
+
+    llm_by_query = {query: decision for (query, _), (decision, _) in zip(queries, llm_results)}
+    combined = [
+        (decision, ms if decision is not None else ms + llm_ms)
+        for (decision, ms), (_, llm_ms) in zip(heuristic_results, llm_results)
+    ]
+    report("heuristic + llm", queries, combined, fallback=llm_by_query)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,11 @@
 import asyncio
 import os
+import time
 
 from dotenv import load_dotenv
 
+import model_health
+
 load_dotenv()
 
 CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY")
@@ -28,37 +31,44 @@ def _get_client():
 
 
 async def call_cerebras(
-	prompt: str,
+	prompt: str | list[dict],
 	model: str = "gpt-oss-120b",
 	temperature: float = 0.2,
 	retries: int = 3,
 ) -> str | None:
 	"""
-	Call Cerebras API for code testing and fixing.
-	Uses gpt-oss-120b by default — intended for code tasks only.
+	Call the Cerebras API: code testing and fixing (gpt-oss-120b by
+	default), and a backup provider for chat models it also hosts (see
+	llm_router.ROUTES).
+	*prompt* may be a single user prompt or a list of chat messages.
 	"""
 	if not CEREBRAS_API_KEY:
 		print("[CEREBRAS] Missing CEREBRAS_API_KEY")
 		return None
 
 	loop = asyncio.get_running_loop()
+	messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
 
 	backoff = 1
 	for attempt in range(1, retries + 1):
+		started = time.perf_counter()
 		try:
 			def _call():
 				client = _get_client()
 				chat = client.chat.completions.create(
-					messages=[{"role": "user", "content": prompt}],
+					messages=messages,
 					model=model,
 					temperature=temperature,
 				)
 				return chat.choices[0].message.content if chat.choices else None
 
-			return await loop.run_in_executor(None, _call)
+			result = await loop.run_in_executor(None, _call)
+			model_health.record_success("cerebras", model, (time.perf_counter() - started) * 1000)
+			return result
 
 		except Exception as e:
 			print(f"[CEREBRAS ERROR] Attempt {attempt}/{retries}: {clean_log(str(e))}")
+			model_health.record_failure("cerebras", model, detail=clean_log(str(e))[:200])
 			if attempt == retries:
 				return None
 			await asyncio.sleep(backoff)
@@ -0,0 +1,198 @@
+"""
+LRU + idle-TTL bounded per-channel state.
+
+ChannelCache behaves like the plain dicts it replaces (get / [] / setdefault /
+pop / in), but keeps at most ``max_resident`` entries and drops entries that
+have not been touched for ``idle_ttl`` seconds. Caches can supply:
+
+    loader(key) -> value | None     rehydrate a cold key on access (e.g. from disk)
+    on_evict(key, value)            spill an evicted value (e.g. to disk)
+    keep(key, value) -> bool        veto eviction of live state (active mutes, chess games)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+
+CHANNEL_CACHE_MAX = int(os.getenv("CHANNEL_CACHE_MAX", "2000"))
+CHANNEL_CACHE_TTL = float(os.getenv("CHANNEL_CACHE_TTL", str(6 * 60 * 60)))
+SWEEP_INTERVAL = 60
+
+_caches: list["ChannelCache"] = []
+
+
+class ChannelCache:
+    def __init__(
+        self,
+        name,
+        max_resident=CHANNEL_CACHE_MAX,
+        idle_ttl=CHANNEL_CACHE_TTL,
+        loader=None,
+        on_evict=None,
+        keep=None,
+        sizer=sys.getsizeof,
+    ):
+        self.name = name
+        self.max_resident = max_resident
+        self.idle_ttl = idle_ttl
+        self.loader = loader
+        self.on_evict = on_evict
+        self.keep = keep
+        self.sizer = sizer
+
+        self._data = OrderedDict()   # key -> value, least recently used first
+        self._touched = {}           # key -> monotonic time of last access
+
+        self.hits = 0
+        self.misses = 0
+        self.hydrations = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        _caches.append(self)
+
+    # ---------------- MAPPING API ----------------
+
+    def get(self, key, default=None):
+        if key in self._data:
+            self.hits += 1
+            self._touch(key)
+            return self._data[key]
+
+        self.misses += 1
+        if self.loader is not None:
+            value = self.loader(key)
+            if value is not None:
+                self.hydrations += 1
+                self._insert(key, value)
+                return value
+        return default
+
+    def __getitem__(self, key):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._data:
+            self._data[key] = value
+            self._touch(key)
+        else:
+            self._insert(key, value)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self._insert(key, default)
+            return default
+        return value
+
+    def pop(self, key, default=None):
+        self._touched.pop(key, None)
+        return self._data.pop(key, default)
+
+    def discard(self, key):
+        """Drop a resident entry without calling on_evict."""
+        self.pop(key)
+
+    def items(self):
+        return list(self._data.items())
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def values(self):
+        return list(self._data.values())
+
+    # ---------------- EVICTION ----------------
+
+    def _touch(self, key):
+        self._data.move_to_end(key)
+        self._touched[key] = time.monotonic()
+
+    def _insert(self, key, value):
+        self._data[key] = value
+        self._touched[key] = time.monotonic()
+        if self.max_resident and len(self._data) > self.max_resident:
+            self._evict_lru(len(self._data) - self.max_resident)
+
+    def _evict(self, key):
+        value = self._data.pop(key)
+        self._touched.pop(key, None)
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"[CACHE] {self.name}: failed to spill {key}: {e}")
+
+    def _evict_lru(self, count):
+        for key in list(self._data):
+            if count <= 0:
+                break
+            if self.keep is not None and self.keep(key, self._data[key]):
+                continue
+            self._evict(key)
+            self.evictions += 1
+            count -= 1
+
+    def sweep(self):
+        """Evict entries idle for longer than idle_ttl."""
+        if not self.idle_ttl:
+            return 0
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = 0
+        for key in list(self._data):
+            if self._touched.get(key, 0) > cutoff:
+                break  # access-ordered: everything after this is fresher
+            if self.keep is not None and self.keep(key, self._data[key]):
+                self._touch(key)
+                continue
+            self._evict(key)
+            expired += 1
+        self.expirations += expired
+        return expired
+
+    # ---------------- METRICS ----------------
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "resident": len(self._data),
+            "max_resident": self.max_resident,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "hydrations": self.hydrations,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "approx_bytes": sum(self.sizer(v) for v in self._data.values()),
+        }
+
+
+_MISSING = object()
+
+
+def all_stats():
+    return {cache.name: cache.stats() for cache in _caches}
+
+
+async def sweep_loop(interval=SWEEP_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        for cache in list(_caches):
+            expired = cache.sweep()
+            if expired:
+                print(f"[CACHE] {cache.name}: expired {expired} idle entries ({len(cache)} resident)")
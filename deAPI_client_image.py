@@ -1,6 +1,7 @@
 import os
 import asyncio
 import aiohttp
+import http_client
 import random
 import logging
 from typing import Optional
@@ -27,7 +28,7 @@ async def warm_webhook_server():
     if not RESULT_URL_BASE:
         return
     try:
-        async with aiohttp.ClientSession() as session:
+        async with http_client.session() as session:
             await session.get(RESULT_URL_BASE, timeout=5)
         print("[Warmup] Webhook server awake.")
     except Exception as e:
@@ -100,7 +101,7 @@ async def generate_image(
 
     headers = {"Authorization": f"Bearer {DEAPI_API_KEY}", "Accept": "application/json"}
 
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with http_client.session(headers=headers) as session:
         await warm_webhook_server()
         request_id = await _submit_job(
             session,
@@ -1,6 +1,7 @@
 import os
 import asyncio
 import aiohttp
+import http_client
 import random
 from typing import List
 
@@ -17,7 +18,7 @@ async def warm_webhook_server():
         return
     for attempt in range(5):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(
                     RESULT_URL_BASE,
                     timeout=aiohttp.ClientTimeout(total=15)
@@ -74,7 +75,7 @@ async def edit_image(image_bytes: bytes, prompt: str = "", steps: int = DEFAULT_
     form.add_field("image", image_bytes, filename="input.jpg", content_type="image/jpeg")
     for k, v in payload.items():
         form.add_field(k, str(v))
-    async with aiohttp.ClientSession() as session:
+    async with http_client.session() as session:
         async with session.post(IMG2IMG_URL, data=form, headers=headers) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -102,7 +103,7 @@ async def merge_images(images: List[bytes], prompt: str = "", steps: int = DEFAU
         form.add_field("images[]", img, filename=f"input_{i}.jpg", content_type="image/jpeg")
     for k, v in payload.items():
         form.add_field(k, str(v))
-    async with aiohttp.ClientSession() as session:
+    async with http_client.session() as session:
         async with session.post(IMG2IMG_URL, data=form, headers=headers) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -1,5 +1,6 @@
 import os
 import aiohttp
+import http_client
 import asyncio
 import time
 
@@ -50,7 +51,7 @@ async def text_to_speech(
     form.add_field("format", format)
     form.add_field("sample_rate", str(sample_rate))
 
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with http_client.session(headers=headers) as session:
         async with session.post(
             TTS_ENDPOINT,
             data=form,
@@ -1,5 +1,6 @@
 import os
 import aiohttp
+import http_client
 import asyncio
 import random
 import logging
@@ -18,7 +19,7 @@ async def warm_webhook_server():
         return
     for attempt in range(5):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(
                     RESULT_URL_BASE,
                     timeout=aiohttp.ClientTimeout(total=15)
@@ -68,7 +69,7 @@ async def generate_video(*, prompt: str, model: str = "Ltx2_19B_Dist_FP8", wait_
 
     headers = {"Authorization": f"Bearer {DEAPI_API_KEY}", "Accept": "application/json"}
 
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with http_client.session(headers=headers) as session:
         await warm_webhook_server()
         request_id, seed = await _submit_job(session, prompt=prompt, model=model)
 
@@ -77,11 +78,13 @@ async def generate_video(*, prompt: str, model: str = "Ltx2_19B_Dist_FP8", wait_
             max_attempts = 60
             delay = 5
 
-            async with aiohttp.ClientSession() as session:
+            # Polls hit our webhook server / the result CDN, not deAPI, so no
+            # auth header; the connection pool is shared with the submit call.
+            async with http_client.session() as poll_session:
                 for attempt in range(max_attempts):
                     await asyncio.sleep(delay)
                     try:
-                        async with session.get(poll_url) as res:
+                        async with poll_session.get(poll_url) as res:
                             if res.status != 200:
                                 logger.info("[VIDEO GEN] Poll attempt %s not ready (HTTP %s)", attempt + 1, res.status)
                                 continue
@@ -93,7 +96,7 @@ async def generate_video(*, prompt: str, model: str = "Ltx2_19B_Dist_FP8", wait_
                             )
                             if result_url:
                                 print("[VIDEO GEN] Result received:", result_url)
-                                async with session.get(result_url) as vresp:
+                                async with poll_session.get(result_url) as vresp:
                                     if vresp.status != 200:
                                         raise Text2VidError(f"Failed to download video (status {vresp.status})")
                                     return await vresp.read()
@@ -1,5 +1,6 @@
 import os
 import aiohttp
+import http_client
 import asyncio
 import time
 
@@ -28,7 +29,7 @@ async def wait_for_transcription_text(
     }
 
     start_time = time.monotonic()
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with http_client.session(headers=headers) as session:
         while True:
             async with session.get(
                 f"{RESULT_ENDPOINT}/{request_id}",
@@ -93,7 +94,7 @@ async def transcribe_video(*, video_url: str, max_minutes: int = 30) -> str:
         "webhook_url": webhook_url,
     }
 
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async with http_client.session(headers=headers) as session:
         async with session.post(
             VIDEO_TO_TEXT_ENDPOINT,
             json=payload,
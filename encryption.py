@@ -1,4 +1,8 @@
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
 from cryptography.fernet import Fernet
 
 _raw_key = os.getenv("ENCRYPTION_KEY", "").strip()
@@ -13,6 +17,16 @@ if not _raw_key:
 
 _fernet = Fernet(_raw_key.encode())
 
+# Chunked container: a magic line followed by one Fernet token per line.
+# Each frame's plaintext is "<index>:<chunk>" and the last frame is
+# "END:<count>", so reordered or truncated files fail to load instead of
+# silently decoding to partial JSON.
+STREAM_MAGIC = b"CODUNOT-FERNET-STREAM/1\n"
+STREAM_CHUNK_CHARS = 64 * 1024
+
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", "2"))
+_executor = ThreadPoolExecutor(max_workers=CRYPTO_WORKERS, thread_name_prefix="crypto")
+
 
 def encrypt_data(data: str) -> bytes:
     return _fernet.encrypt(data.encode("utf-8"))
@@ -22,12 +36,73 @@ def decrypt_data(data: bytes) -> str:
     return _fernet.decrypt(data).decode("utf-8")
 
 
-def save_encrypted(filepath: str, data: str) -> None:
-    encrypted = encrypt_data(data)
+# ---------------- STREAMING CONTAINER ----------------
+
+def _chunks(data: str, size: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def save_encrypted_stream(filepath: str, chunks: Iterable[str]) -> None:
+    """Encrypt and write *chunks* frame by frame; only one ciphertext frame is held at a time."""
+    count = 0
     with open(filepath, "wb") as f:
-        f.write(encrypted)
+        f.write(STREAM_MAGIC)
+        for chunk in chunks:
+            f.write(_fernet.encrypt(f"{count}:".encode() + chunk.encode("utf-8")) + b"\n")
+            count += 1
+        f.write(_fernet.encrypt(f"END:{count}".encode()) + b"\n")
 
 
-def load_encrypted(filepath: str) -> str:
+def iter_decrypted(filepath: str) -> Iterator[str]:
+    """Yield plaintext chunks of an encrypted file (streamed or legacy single-token)."""
     with open(filepath, "rb") as f:
-        return decrypt_data(f.read())
+        head = f.read(len(STREAM_MAGIC))
+        if head != STREAM_MAGIC:
+            # Legacy format: the whole file is one Fernet token.
+            yield decrypt_data(head + f.read())
+            return
+
+        expected = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            plain = _fernet.decrypt(line)
+            prefix, _, body = plain.partition(b":")
+            if prefix == b"END":
+                if int(body) != expected:
+                    raise ValueError(f"{filepath}: stream ended after {expected} of {int(body)} frames")
+                return
+            if int(prefix) != expected:
+                raise ValueError(f"{filepath}: frame {int(prefix)} out of order (expected {expected})")
+            expected += 1
+            yield body.decode("utf-8")
+
+    raise ValueError(f"{filepath}: truncated encrypted stream (no END frame)")
+
+
+# ---------------- FILE API ----------------
+
+def save_encrypted(filepath: str, data: str) -> None:
+    save_encrypted_stream(filepath, _chunks(data))
+
+
+def load_encrypted(filepath: str) -> str:
+    return "".join(iter_decrypted(filepath))
+
+
+# ---------------- ASYNC API ----------------
+
+async def run_crypto(func, *args):
+    """Run a blocking encryption/IO helper on the crypto thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def save_encrypted_async(filepath: str, data: str) -> None:
+    await run_crypto(save_encrypted, filepath, data)
+
+
+async def load_encrypted_async(filepath: str) -> str:
+    return await run_crypto(load_encrypted, filepath)
@@ -0,0 +1,161 @@
+"""
+Bounded worker pool for chat replies.
+
+on_message used to start one task per reply, so a burst in a big server
+put hundreds of LLM calls in flight at once. Replies are now queued here
+and run by GEN_WORKERS workers:
+
+    if not generation.submit(guild_id, chan_id, lambda: generate_and_reply(...)):
+        ...  # shed: the queue is full, answer with a busy line instead
+
+Queues are kept per guild and, inside a guild, per channel. Workers take
+guilds round-robin and channels round-robin within a guild, and a channel
+never has more than one reply running, so replies in a channel stay in
+order and one noisy channel or server cannot take every worker.
+
+submit() refuses work (load shedding) once GEN_MAX_QUEUE jobs are waiting
+overall or GEN_MAX_PER_GUILD in one guild. Jobs run in the context of the
+submitting task, so context variables such as rate_limiter's guild key
+carry over.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+
+GEN_WORKERS = int(os.getenv("GEN_WORKERS", "8"))
+GEN_MAX_QUEUE = int(os.getenv("GEN_MAX_QUEUE", "100"))
+GEN_MAX_PER_GUILD = int(os.getenv("GEN_MAX_PER_GUILD", "20"))
+
+
+class _Job:
+    __slots__ = ("factory", "context", "enqueued")
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.context = contextvars.copy_context()
+        self.enqueued = time.monotonic()
+
+
+class GenerationScheduler:
+    def __init__(self, workers=GEN_WORKERS, max_queue=GEN_MAX_QUEUE, max_per_guild=GEN_MAX_PER_GUILD):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_guild = max_per_guild
+
+        # guild -> channel -> deque[_Job]; both levels rotate after each pick
+        self._guilds: "OrderedDict[str, OrderedDict[str, deque]]" = OrderedDict()
+        self._running_channels: set[str] = set()
+        self._queued = 0
+        self._guild_queued: dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+        self.submitted = 0
+        self.shed = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.waits = deque(maxlen=500)   # seconds from submit to start
+
+    # ---------------- QUEUEING ----------------
+
+    def submit(self, guild, channel, factory) -> bool:
+        """
+        Queue factory() (returning a coroutine) for *channel* in *guild*.
+        Returns False, without queueing, if the job was shed.
+        """
+        guild, channel = str(guild), str(channel)
+        if self._queued >= self.max_queue or self._guild_queued.get(guild, 0) >= self.max_per_guild:
+            self.shed += 1
+            print(f"[GEN QUEUE] Shedding reply for guild {guild} ({self._queued} queued)")
+            return False
+
+        self._ensure_workers()
+        self._guilds.setdefault(guild, OrderedDict()).setdefault(channel, deque()).append(_Job(factory))
+        self._queued += 1
+        self._guild_queued[guild] = self._guild_queued.get(guild, 0) + 1
+        self.submitted += 1
+        self._wakeup.set()
+        return True
+
+    def _next_job(self):
+        """Pop the next runnable (channel, job), rotating guilds and channels; None if nothing can run."""
+        for guild, channels in list(self._guilds.items()):
+            for channel, jobs in list(channels.items()):
+                if channel in self._running_channels:
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    channels.move_to_end(channel)
+                else:
+                    del channels[channel]
+                if channels:
+                    self._guilds.move_to_end(guild)
+                else:
+                    del self._guilds[guild]
+
+                self._queued -= 1
+                self._guild_queued[guild] -= 1
+                if not self._guild_queued[guild]:
+                    del self._guild_queued[guild]
+                return channel, job
+        return None
+
+    # ---------------- WORKERS ----------------
+
+    def _ensure_workers(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+    async def _worker(self):
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            channel, job = picked
+            self.waits.append(time.monotonic() - job.enqueued)
+            self._running_channels.add(channel)
+            try:
+                # The task copies the submitter's context (rate-limit key etc.).
+                await job.context.run(asyncio.ensure_future, job.factory())
+                self.completed += 1
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise   # the worker itself is shutting down
+                self.cancelled += 1   # the job was cancelled (e.g. superseded by a newer message)
+            except Exception as e:
+                self.failed += 1
+                print(f"[GEN QUEUE] Reply failed: {e}")
+            finally:
+                self._running_channels.discard(channel)
+                self._wakeup.set()   # the channel's next job may be runnable now
+
+    # ---------------- METRICS ----------------
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000) if waits else None
+
+        return {
+            "workers": self.workers,
+            "running": len(self._running_channels),
+            "queued": self._queued,
+            "guilds_waiting": len(self._guilds),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "shed": self.shed,
+            "wait_p50_ms": pct(0.5),
+            "wait_p95_ms": pct(0.95),
+            "wait_max_ms": round(waits[-1] * 1000) if waits else None,
+        }
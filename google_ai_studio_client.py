@@ -1,7 +1,9 @@
 import asyncio
 import os
+import time
 
-import aiohttp
+import http_client
+import model_health
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,8 +11,6 @@ load_dotenv()
 GOOGLE_AI_STUDIO_API_KEY = os.getenv("GOOGLE_AI_STUDIO_API_KEY") or os.getenv("GEMINI_API_KEY")
 GOOGLE_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
 
-SESSION: aiohttp.ClientSession | None = None
-
 
 def clean_log(text: str) -> str:
 	if not text:
@@ -21,20 +21,41 @@ def clean_log(text: str) -> str:
 
 
 async def get_session():
-	global SESSION
-	if SESSION is None or SESSION.closed:
-		SESSION = aiohttp.ClientSession()
-	return SESSION
+	return http_client.get_session("llm")
+
+
+def _to_gemini(messages: list[dict]) -> dict:
+	"""
+	Map chat messages onto Gemini's systemInstruction + contents. Gemini
+	calls the assistant "model" and wants turns to alternate, so
+	consecutive same-role messages are merged.
+	"""
+	system = [m["content"] for m in messages if m["role"] == "system"]
+	contents = []
+	for m in messages:
+		if m["role"] == "system":
+			continue
+		role = "model" if m["role"] == "assistant" else "user"
+		if contents and contents[-1]["role"] == role:
+			contents[-1]["parts"].append({"text": m["content"]})
+		else:
+			contents.append({"role": role, "parts": [{"text": m["content"]}]})
+
+	body = {"contents": contents}
+	if system:
+		body["systemInstruction"] = {"parts": [{"text": "\n\n".join(system)}]}
+	return body
 
 
 async def call_google_ai_studio(
-	prompt: str,
+	prompt: str | list[dict],
 	model: str = "gemini-2.5-flash-lite",
 	temperature: float = 0.7,
 	retries: int = 3,
 ) -> str | None:
 	"""
 	Call Google AI Studio Gemini API via generateContent endpoint.
+	*prompt* may be a single user prompt or a list of chat messages.
 	"""
 	if not GOOGLE_AI_STUDIO_API_KEY:
 		print("[GOOGLE AI STUDIO] Missing GOOGLE_AI_STUDIO_API_KEY (or GEMINI_API_KEY)")
@@ -42,8 +63,9 @@ async def call_google_ai_studio(
 
 	session = await get_session()
 	url = f"{GOOGLE_API_BASE}/models/{model}:generateContent?key={GOOGLE_AI_STUDIO_API_KEY}"
+	messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
 	payload = {
-		"contents": [{"role": "user", "parts": [{"text": prompt}]}],
+		**_to_gemini(messages),
 		"generationConfig": {
 			"temperature": temperature,
 		},
@@ -51,11 +73,13 @@ async def call_google_ai_studio(
 
 	backoff = 1
 	for attempt in range(1, retries + 1):
+		started = time.perf_counter()
 		try:
 			async with session.post(url, json=payload, timeout=60) as resp:
 				text = await resp.text()
 
 				if resp.status == 200:
+					model_health.record_success("google", model, (time.perf_counter() - started) * 1000)
 					data = await resp.json()
 					candidates = data.get("candidates") or []
 					if not candidates:
@@ -65,6 +89,9 @@ async def call_google_ai_studio(
 					response_text = "".join(part.get("text", "") for part in parts).strip()
 					return response_text or None
 
+				model_health.record_failure(
+					"google", model, model_health.failure_kind(resp.status), detail=f"HTTP {resp.status}"
+				)
 				print("\n===== GOOGLE AI STUDIO ERROR =====")
 				print(f"Attempt {attempt}/{retries}, Status: {resp.status}")
 				print(clean_log(text))
@@ -80,6 +107,9 @@ async def call_google_ai_studio(
 
 		except Exception as e:
 			print(f"[GOOGLE AI STUDIO ERROR] Attempt {attempt}/{retries}: {clean_log(str(e))}")
+			model_health.record_failure(
+				"google", model, "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+			)
 			if attempt == retries:
 				return None
 			await asyncio.sleep(backoff)
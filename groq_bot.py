@@ -4,11 +4,13 @@ import sys
 import asyncio
 import atexit
 import aiohttp
+import http_client
 import random
 import re
 import time
 from datetime import datetime, timedelta, timezone, date
 from collections import deque
+from contextlib import aclosing
 import urllib.parse
 import html
 
@@ -18,15 +20,33 @@ from discord.ext import commands
 from dotenv import load_dotenv
 
 from memory import MemoryManager
+import channel_cache
+from channel_cache import ChannelCache
+from image_store import ImageStore
+import ttl_cache
+from ttl_cache import TTLCache
 from humanizer import maybe_typo
 from deAPI_client_image import generate_image
 from deAPI_client_image_edit import edit_image, merge_images
 from deAPI_client_text2vid import generate_video as text_to_video_512
 from bot_chess import OnlineChessEngine
-from groq_client import call_groq
+from groq_client import call_groq, stream_groq, key_stats as groq_key_stats
 from replicate_client import call_replicate
 from google_ai_studio_client import call_google_ai_studio
-from slang_normalizer import apply_slang_map
+from slang_normalizer import apply_slang_map, normalize_text
+import search_classifier
+import url_fetcher
+import prompt_builder
+import model_health
+import llm_router
+import rate_limiter
+from generation_scheduler import GenerationScheduler
+import message_coalescer
+import member_index
+import outbox
+import tracing
+from message_coalescer import MessageCoalescer
+from prompt_builder import static_prefix, estimate_tokens, fit_context, history_turns, chat_messages
 
 import chess
 import base64
@@ -34,7 +54,8 @@ from typing import Optional
 from topgg_utils import has_voted
 import json
 
-from encryption import save_encrypted, load_encrypted
+from encryption import load_encrypted
+import persistence
 
 from guild_access_config import (
 	load_guild_chat_config,
@@ -62,8 +83,6 @@ from usage_manager import (
 )
 
 load_dotenv()
-load_usage()
-load_guild_chat_config()
 
 # ---------------- CONFIG ----------------
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -92,36 +111,63 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
+class CodunotBot(commands.AutoShardedBot):
+	async def close(self):
+		await outbox.drain()
+		await super().close()
+		# Pending state first, then the pooled HTTP connections. Memory is
+		# folded into the snapshot: only codunot_memory.json is kept between runs.
+		await persistence.flush_all_async()
+		await memory.close()
+		await http_client.close_all()
+		url_fetcher.shutdown()
+
 # --- ENABLE SHARDING ---
-bot = commands.AutoShardedBot(command_prefix="!", intents=intents, owner_ids=set(OWNER_IDS))
+bot = CodunotBot(command_prefix="!", intents=intents, owner_ids=set(OWNER_IDS))
 
-memory = MemoryManager(limit=15, file_path="codunot_memory.json")
+memory = MemoryManager(limit=MAX_MEMORY, file_path="codunot_memory.json", autoload=False)
 chess_engine = OnlineChessEngine()
 IMAGE_PROCESSING_CHANNELS = set()
 
 # ---------------- STATES ----------------
-message_queue = asyncio.Queue()
-channel_modes = {}
-channel_mutes = {}
-channel_chess = {}
+# Per-channel / per-guild state is LRU + idle-TTL bounded (see channel_cache.py).
+# Modes rehydrate from memory on the next message; live mutes, chess games and
+# guild rate windows that still count are never evicted.
+channel_modes = ChannelCache("channel_modes")
+channel_mutes = ChannelCache(
+	"channel_mutes",
+	keep=lambda _chan, until: until is not None and until > datetime.utcnow(),
+)
+channel_chess = ChannelCache("channel_chess", keep=lambda _chan, active: bool(active))
 channel_images = {}
-channel_memory = {}
-rate_buckets = {}
+rate_buckets = ChannelCache(
+	"rate_buckets",
+	keep=lambda _guild, bucket: bool(bucket) and (datetime.now(timezone.utc) - bucket[-1]).total_seconds() <= 60,
+)
 user_vote_unlocks = {}
-channel_last_images = {}
-channel_last_chess_result = {}
-
-
-def clear_runtime_channel_memory(chan_id: str):
-	channel_memory.pop(chan_id, None)
-
-channel_message_counts = {}
+channel_last_images = ImageStore()
+channel_last_chess_result = ChannelCache("channel_last_chess_result")
+
+channel_message_counts = ChannelCache("channel_message_counts")
+# Chat replies run on a bounded worker pool, fair across guilds and channels.
+generation = GenerationScheduler()
+# Quick consecutive lines from one author become a single turn (see message_coalescer.py).
+chat_turns = MessageCoalescer()
 PROMO_MIN_MESSAGES = 10
 PROMO_MAX_MESSAGES = 25
 
 # ---------------- SETUP SLASH COMMANDS ----------------
+# Started once from setup_hook (on_ready fires again on every reconnect);
+# kept here so the tasks are not garbage-collected.
+background_tasks = []
+
 @bot.event
 async def setup_hook():
+	background_tasks.extend(
+		asyncio.create_task(loop())
+		for loop in (autosave_usage, memory.compaction_loop, channel_cache.sweep_loop)
+	)
+
 	import slash_commands
 	
 	slash_commands.memory = memory
@@ -138,7 +184,6 @@ async def setup_hook():
 	slash_commands.set_server_mode = set_server_mode
 	slash_commands.set_channels_mode = set_channels_mode
 	slash_commands.get_guild_config = get_guild_config
-	slash_commands.clear_runtime_channel_memory = clear_runtime_channel_memory
 	
 	await slash_commands.setup(bot)
 
@@ -213,8 +258,9 @@ async def maybe_send_promo_message(channel, chan_id: str):
 	if should_send:
 		try:
 			embed = build_support_promo_embed()
-			await channel.send(embed=embed)
-			channel_message_counts[chan_id] = 0
+			# Promos are the first thing dropped when the outbox is backed up.
+			if await outbox.send(channel, embed=embed, priority=outbox.PROMO) is not None:
+				channel_message_counts[chan_id] = 0
 		except discord.errors.Forbidden:
 			print(f"[PROMO] Cannot send in channel {chan_id} - Missing Permissions")
 		except Exception as e:
@@ -577,9 +623,9 @@ async def test_llama(ctx: commands.Context, mode: str = "funny", *, message: str
 
 	try:
 		if mode == "roast":
-			prompt = build_roast_prompt("test", message)
+			prompt = build_roast_prompt("test", message, model=IMAGE_REQUIRED_MODEL)
 		else:
-			prompt = build_general_prompt("test", mode, None, False) + f"\nUser says:\n{message}\n\nReply:"
+			prompt = build_general_prompt("test", mode, None, False, model=IMAGE_REQUIRED_MODEL, user_text=message)
 
 		response = await call_groq(
 			prompt=prompt,
@@ -626,66 +672,67 @@ async def test_provider(ctx: commands.Context, provider: str = None, *, message:
 
 # ---------------- MODELS ----------------
 PRIMARY_MODEL = "openai/gpt-oss-120b"
-FALLBACK_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 IMAGE_REQUIRED_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
-PRIMARY_COOLDOWN_UNTIL = None
-PRIMARY_COOLDOWN_DURATION = timedelta(minutes=10)
-
 # ---------------- MODEL HEALTH ----------------
+# Every provider attempt is recorded in model_health (latency, error rate,
+# 429/503 counts). Chat completions go through llm_router, which starts
+# with the requested model's endpoints, hedges slow requests to a second
+# provider and fails over to the healthiest other chat model; endpoints
+# whose breaker is open are skipped.
+
+def chat_model_choices():
+	from slash_commands import MODEL_CHOICES  # lazy import to avoid circular dependency
+	return MODEL_CHOICES
+
+def _prompt_tokens(prompt):
+	if isinstance(prompt, list):
+		return sum(estimate_tokens(m["content"]) for m in prompt)
+	return estimate_tokens(prompt)
+
+def _prompt_for_model(prompt, model):
+	if model != "qwen/qwen3-32b":
+		return prompt
+	no_think = (
+		"\n\nIMPORTANT: Return only the final user-facing answer. "
+		"Do not include chain-of-thought, reasoning, or any <think> tags."
+	)
+	if isinstance(prompt, list):
+		return prompt[:-1] + [{**prompt[-1], "content": prompt[-1]["content"] + no_think}]
+	return f"{prompt}{no_think}"
+
 async def call_groq_with_health(prompt, temperature=0.7, mode: str = "", model_override: str | None = None):
 	"""
-	Handles calling Groq with automatic fallback when primary model is overloaded.
-	Tries PRIMARY_MODEL first, falls back to FALLBACK_MODEL on 503 errors.
+	Complete a chat prompt with the requested model (model_override, else
+	PRIMARY_MODEL) via llm_router, failing over to its other providers and
+	then to MODEL_CHOICES of the same family (llm_router.same_family), so a
+	channel's /model pick is kept. Fallback models whose prompt budget is too
+	small for this prompt are skipped. The reply is sanitized for the model
+	that produced it.
 	"""
-	global PRIMARY_COOLDOWN_UNTIL
-	
-	# Check if Primary model is in cooldown - if yes, use fallback directly
-	if model_override:
-		model = model_override
-	elif PRIMARY_COOLDOWN_UNTIL and datetime.utcnow() < PRIMARY_COOLDOWN_UNTIL:
-		print(f"[GROQ] Primary model in cooldown until {PRIMARY_COOLDOWN_UNTIL.isoformat()}, using fallback")
-		model = FALLBACK_MODEL
-	else:
-		model = PRIMARY_MODEL
-
-	try:
-		if model == "qwen/qwen3-32b":
-			prompt = (
-				f"{prompt}\n\n"
-				"IMPORTANT: Return only the final user-facing answer. "
-				"Do not include chain-of-thought, reasoning, or any <think> tags."
-			)
-		return await call_groq(
-			prompt=prompt,
-			model=model,
-			temperature=temperature,
-		)
-
-	except Exception as e:
-		msg = str(e)
-
-		# Handle Primary model overload - switch to fallback
-		if model == PRIMARY_MODEL and ("503" in msg or "over capacity" in msg):
-			PRIMARY_COOLDOWN_UNTIL = datetime.utcnow() + PRIMARY_COOLDOWN_DURATION
-			print(
-				f"[GROQ] Primary model overloaded — "
-				f"cooling down until {PRIMARY_COOLDOWN_UNTIL.isoformat()}, "
-				f"using fallback model"
-			)
-			
-			# Retry with fallback model
-			try:
-				return await call_groq(
-					prompt=prompt,
-					model=FALLBACK_MODEL,
-					temperature=temperature,
-				)
-			except Exception as fallback_error:
-				print(f"[GROQ] Fallback model also failed: {fallback_error}")
-				raise fallback_error
+	preferred = model_override or PRIMARY_MODEL
+	prompt_tokens = _prompt_tokens(prompt)
+	fallbacks = [
+		model for model in chat_model_choices()
+		if model != preferred
+		and llm_router.same_family(model, preferred)
+		and prompt_builder.prompt_budget(model) >= prompt_tokens
+	]
 
-		raise e
+	result = await llm_router.complete(
+		prompt,
+		preferred,
+		temperature=temperature,
+		fallbacks=fallbacks,
+		prompt_for=lambda model: _prompt_for_model(prompt, model),
+	)
+	if result is None:
+		return None
+	if result.model != preferred:
+		print(f"[ROUTER] {preferred} unavailable; substituted {result.model} via {result.provider}/{result.provider_model}")
+	elif result.provider != "groq":
+		print(f"[ROUTER] {preferred} answered by {result.provider}/{result.provider_model}")
+	return sanitize_model_output(result.text, result.model)
 
 # ---------------- CODUNOT SELF IMAGE PROMPT ----------------
 CODUNOT_SELF_IMAGE_PROMPT = (
@@ -723,10 +770,13 @@ def load_vote_unlocks():
 		user_vote_unlocks = {}
 
 def save_vote_unlocks():
-	try:
-		save_encrypted(VOTE_FILE, json.dumps(user_vote_unlocks))
-	except Exception as e:
-		print(f"[VOTE] Failed to save vote unlocks: {e}")
+	persistence.mark_dirty("vote_unlocks")
+
+persistence.register_store(
+	"vote_unlocks", VOTE_FILE,
+	lambda: json.dumps(user_vote_unlocks),
+	encrypted=True,
+)
 
 def cleanup_expired_votes():
 	now = time.time()
@@ -740,9 +790,6 @@ def cleanup_expired_votes():
 	if expired:
 		save_vote_unlocks()
 
-load_vote_unlocks()
-cleanup_expired_votes()
-
 class VoteView(discord.ui.View):
 	def __init__(self):
 		super().__init__(timeout=None)
@@ -756,6 +803,7 @@ class VoteView(discord.ui.View):
 		)
 
 
+@tracing.traced("vote_check")
 async def require_vote(message) -> None:
 	user_id = message.author.id
 
@@ -819,8 +867,6 @@ async def require_vote(message) -> None:
 	is_dm = isinstance(message.channel, discord.DMChannel)
 	chan_id = f"dm_{message.author.id}" if is_dm else str(message.channel.id)
 	
-	channel_memory.setdefault(chan_id, deque(maxlen=MAX_MEMORY))
-	channel_memory[chan_id].append(f"{BOT_NAME}: {vote_message}")
 	memory.add_message(chan_id, BOT_NAME, vote_message)
 	memory.persist()
 
@@ -839,20 +885,14 @@ def format_duration(num: int, unit: str) -> str:
 	name = units.get(unit, "minute")
 	return f"{num} {name}s" if num > 1 else f"1 {name}"
 
-async def send_long_message(channel, text):
-	max_len = 2000
+def split_message(text, max_len=2000):
+	"""Split text into Discord-sized chunks, preferring newline/space boundaries."""
+	chunks = []
 	remaining = str(text or "")
 
 	while remaining:
 		if len(remaining) <= max_len:
-			try:
-				await channel.send(remaining)
-			except discord.errors.Forbidden:
-				print(f"[PERMISSION ERROR] Cannot send message in channel {channel.id} - Missing Permissions")
-				return
-			except Exception as e:
-				print(f"[SEND ERROR] {e}")
-				return
+			chunks.append(remaining)
 			break
 
 		newline_idx = remaining.rfind("\n", 0, max_len)
@@ -864,26 +904,19 @@ async def send_long_message(channel, text):
 		else:
 			split_at += 1
 
-		chunk = remaining[:split_at]
+		chunks.append(remaining[:split_at])
 		remaining = remaining[split_at:]
-		
-		try:
-			await channel.send(chunk)
-		except discord.errors.Forbidden:
-			print(f"[PERMISSION ERROR] Cannot send message in channel {channel.id} - Missing Permissions")
-			return
-		except Exception as e:
-			print(f"[SEND ERROR] {e}")
-			return
-	
-async def process_queue():
-	while True:
-		channel, content = await message_queue.get()
-		try:
-			await channel.send(content)
-		except Exception as e:
-			print(f"[QUEUE ERROR] {e}")
-		await asyncio.sleep(0.02)
+
+	return chunks
+
+async def send_long_message(channel, text):
+	# All chunks go out as one outbox batch, so nothing lands between them.
+	try:
+		await outbox.send_many(channel, split_message(text))
+	except discord.errors.Forbidden:
+		print(f"[PERMISSION ERROR] Cannot send message in channel {channel.id} - Missing Permissions")
+	except Exception as e:
+		print(f"[SEND ERROR] {e}")
 
 def humanize_and_safeify(text, short=False):
 	if not isinstance(text, str):
@@ -916,7 +949,7 @@ def sanitize_model_output(text: str, model_name: str | None = None) -> str:
 		return _strip_thinking_blocks(text)
 	return text
 	
-async def send_human_reply(channel, reply_text):
+async def _trigger_typing(channel):
 	if hasattr(channel, "trigger_typing"):
 		try:
 			await channel.trigger_typing()
@@ -925,16 +958,19 @@ async def send_human_reply(channel, reply_text):
 		except:
 			pass
 
+def rewrite_mentions(channel, reply_text):
 	if hasattr(channel, "guild") and channel.guild:
 		def replace_mention(match):
-			username = match.group(1).strip().lower()
-			for member in channel.guild.members:
-				if (member.name.lower() == username or
-					member.display_name.lower() == username):
-					return member.mention
-			return match.group(0)
+			member = member_index.lookup(channel.guild, match.group(1).strip())
+			return member.mention if member else match.group(0)
 
 		reply_text = re.sub(r'@([\w][\w\s]*\w|[\w]+)', replace_mention, reply_text)
+	return reply_text
+
+@tracing.traced("send")
+async def send_human_reply(channel, reply_text):
+	await _trigger_typing(channel)
+	reply_text = rewrite_mentions(channel, reply_text)
 
 	try:
 		await send_long_message(channel, reply_text)
@@ -943,6 +979,101 @@ async def send_human_reply(channel, reply_text):
 	except Exception as e:
 		print(f"[SEND ERROR] {e}")
 
+# ---------------- STREAMED REPLIES ----------------
+# Long answers are posted as soon as the first few tokens arrive and then
+# edited in place, at most once per STREAM_EDIT_INTERVAL seconds, splitting
+# into extra messages exactly where send_long_message would.
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1").strip().lower() not in ("0", "false", "no", "off")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+STREAM_FIRST_CHARS = 60
+# Reasoning models emit <think> blocks that are only stripped after the fact.
+NON_STREAMING_MODELS = {"qwen/qwen3-32b"}
+STREAM_CUT_OFF_NOTE = " … *(reply cut off, try asking again)*"
+
+class StreamedReply:
+	def __init__(self, channel):
+		self.channel = channel
+		self.messages = []   # sent discord.Message objects, one per chunk
+		self.rendered = []   # last content sent/edited into each message
+
+	async def render(self, text):
+		chunks = split_message(text)
+		for i, chunk in enumerate(chunks):
+			if i < len(self.messages):
+				if self.rendered[i] != chunk:
+					await outbox.edit(self.messages[i], content=chunk)
+					self.rendered[i] = chunk
+			else:
+				sent = await outbox.send(self.channel, chunk)
+				if sent is None:
+					break
+				self.messages.append(sent)
+				self.rendered.append(chunk)
+		# The finalized text can split into fewer chunks than the raw stream.
+		while len(self.messages) > max(len(chunks), 1):
+			await outbox.delete(self.messages.pop())
+			self.rendered.pop()
+
+async def stream_human_reply(channel, deltas, finalize, retry=None):
+	"""
+	Post a reply progressively from an async iterator of text deltas.
+
+	finalize(raw_text) -> reply text for the last edit (humanize, punctuation).
+	If the stream breaks after part of the reply is posted, await retry() ->
+	raw text (a non-streamed call) is edited in instead; if that fails too,
+	the partial text is marked as cut off.
+	Returns the final reply, None if nothing was posted (caller should fall
+	back to the non-streaming path), or "" if the posted reply is incomplete
+	(nothing to remember).
+	"""
+	await _trigger_typing(channel)
+	reply = StreamedReply(channel)
+	raw = ""
+	last_render = 0.0
+	try:
+		# aclosing: if posting fails, the stream's HTTP response and rate-limit
+		# slot are released now rather than whenever the generator is collected.
+		async with aclosing(deltas):
+			async for delta in deltas:
+				raw += delta
+				now = time.monotonic()
+				if not reply.messages:
+					if len(raw.strip()) < STREAM_FIRST_CHARS:
+						continue
+				elif now - last_render < STREAM_EDIT_INTERVAL:
+					continue
+				await reply.render(raw.lstrip())
+				last_render = now
+	except discord.errors.Forbidden:
+		print(f"[PERMISSION ERROR] Cannot send message in channel {channel.id} - Missing Permissions")
+		return None
+	except Exception as e:
+		print(f"[STREAM ERROR] {e}")
+		if not reply.messages:
+			return None
+		partial = raw
+		try:
+			raw = await retry() if retry else None
+		except Exception as e:
+			print(f"[STREAM ERROR] Retry failed: {e}")
+			raw = None
+		if not raw or not raw.strip():
+			try:
+				await reply.render(partial.strip() + STREAM_CUT_OFF_NOTE)
+			except Exception as e:
+				print(f"[SEND ERROR] {e}")
+			return ""
+
+	if not raw.strip():
+		return None
+
+	final = finalize(raw)
+	try:
+		await reply.render(rewrite_mentions(channel, final))
+	except Exception as e:
+		print(f"[SEND ERROR] {e}")
+	return final
+
 async def build_reply_context(message):
 	"""
 	If the message is a Discord reply, return extra metadata that is appended
@@ -1183,6 +1314,18 @@ PERSONAS = {
 "Max 2000 characters."
 ),
 }
+
+# Persona text and the capabilities blurb never change, so join (and size)
+# them once instead of on every message. They are sent as the system
+# message, which keeps the request prefix identical between turns.
+# Values are (text, tokens).
+PERSONA_PREFIXES = {mode: static_prefix(text, BOT_CAPABILITIES_PROMPT) for mode, text in PERSONAS.items()}
+PERSONA_ONLY_PREFIXES = {mode: static_prefix(text) for mode, text in PERSONAS.items()}
+
+def persona_prefix(mode, default="funny", capabilities=True):
+	table = PERSONA_PREFIXES if capabilities else PERSONA_ONLY_PREFIXES
+	return table.get(mode) or table[default]
+
 # ---------------- FALLBACK VARIANTS ----------------
 
 FALLBACK_VARIANTS = {
@@ -1231,52 +1374,84 @@ FALLBACK_VARIANTS = {
 		"ngl I missed that, what's the situation?",
 		"my social battery died for a moment 😭 again?",
 	],
+	# Sent when the generation queue is full and the reply is shed.
+	"busy": [
+		"too many ppl talking to me rn 😵 try again in a sec?",
+		"my inbox is on fire 🔥 give me a moment and try again",
+		"brb, answering like 50 ppl at once 💀 ask me again in a bit",
+		"I'm a little swamped right now — please try again shortly.",
+	],
 }
 
 def choose_fallback(mode: str = "funny") -> str:
 	variants = FALLBACK_VARIANTS.get(mode, FALLBACK_VARIANTS["funny"])
 	return random.choice(variants)
 
-def build_general_prompt(chan_id, mode, message, include_last_image=False):
-	mem = channel_memory.get(chan_id, deque())
-	history_text = "\n".join(mem) if mem else "No previous messages."
+def rate_limited_reply(error: rate_limiter.RateLimited) -> str:
+	return f"⏳ I'm getting a lot of messages right now, give me about {int(error.retry_after) + 1}s and try again!"
+
+def build_general_prompt(
+	chan_id, mode, message, include_last_image=False, *,
+	model=None, search_context="", url_context="", reply_context="", user_text="",
+):
+	"""
+	Chat messages for a normal reply: the persona as a stable system message,
+	the conversation as separate turns, then this turn's context and the
+	user's message. History, search results and webpage text are trimmed
+	to the model's prompt budget.
+	"""
+	system, system_tokens = persona_prefix(mode)
+	model = model or memory.get_channel_model(chan_id)
 
 	last_img_info = ""
 	if include_last_image:
-		last_img_info = "\nNote: The user has previously requested an image in this conversation."
+		last_img_info = "Note: The user has previously requested an image in this conversation.\n\n"
 
-	persona_text = PERSONAS.get(mode, PERSONAS["funny"])
-	
-	return (
-		f"{persona_text}\n\n"
-		f"{BOT_CAPABILITIES_PROMPT}\n\n"
-		f"=== CONVERSATION HISTORY ===\n"
-		f"{history_text}\n"
-		f"=== END HISTORY ===\n"
-		f"{last_img_info}\n\n"
+	request = (
+		reply_context
+		+ f"{last_img_info}"
 		f"CRITICAL: When user asks 'what did I ask previously' or 'previous question', or anything that refers to previous messages of the user, "
-		f"look at messages NOT labeled '{BOT_NAME}:' in the history above.\n\n"
+		f"look at the earlier user messages in this conversation, not your own replies.\n\n"
+		f"User says:\n{user_text}\n\n"
 		f"Reply as Codunot:"
 	)
 
-def build_roast_prompt(chan_id, user_message, reply_context=""):
-	mem = channel_memory.get(chan_id, deque())
-	history_text = "\n".join(mem) if mem else "No previous messages."
-	
-	return (
-		PERSONAS["roast"] + "\n\n"
-		+ BOT_CAPABILITIES_PROMPT + "\n\n"
-		f"=== CONVERSATION HISTORY ===\n"
-		f"{history_text}\n"
-		f"=== END HISTORY ===\n\n"
-		+ (f"{reply_context}\n" if reply_context else "")
-		+ f"IMPORTANT: Read the conversation history above carefully.\n"
+	mem, context = fit_context(
+		model,
+		system_tokens + estimate_tokens(request) + 64,
+		history=memory.get_recent_flat(chan_id, MAX_MEMORY),
+		search=search_context,
+		url=url_context,
+	)
+	search_context, url_context = context["search"], context["url"]
+
+	return chat_messages(
+		system,
+		history_turns(mem, BOT_NAME),
+		(f"=== WEB SEARCH CONTEXT ===\n{search_context}\n=== END WEB SEARCH CONTEXT ===\n\n" if search_context else "")
+		+ (f"=== WEBPAGE CONTENT ===\n{url_context}\n=== END WEBPAGE CONTENT ===\n\n" if url_context else "")
+		+ request,
+	)
+
+def build_roast_prompt(chan_id, user_message, reply_context="", model=None):
+	system, system_tokens = persona_prefix("roast")
+	model = model or memory.get_channel_model(chan_id)
+
+	request = (
+		(f"{reply_context}\n" if reply_context else "")
+		+ f"IMPORTANT: Read the conversation so far carefully.\n"
 		f"If the user is replying to something, respond to THAT specific thing.\n"
 		f"If the user says 'wdym', 'what', 'huh' etc — roast them FOR being confused, referencing exactly what you said before.\n"
 		f"NEVER break character. NEVER explain yourself normally. ALWAYS stay in roast mode.\n\n"
 		f"User's latest message: '{user_message}'\n"
 		f"Generate ONE savage roast response."
 	)
+	mem, _ = fit_context(
+		model,
+		system_tokens + estimate_tokens(request) + 32,
+		history=memory.get_recent_flat(chan_id, MAX_MEMORY),
+	)
+	return chat_messages(system, history_turns(mem, BOT_NAME), request)
 
 async def handle_roast_mode(chan_id, message, user_message):
 	guild_id = message.guild.id if message.guild else None
@@ -1284,118 +1459,213 @@ async def handle_roast_mode(chan_id, message, user_message):
 		return
 	
 	reply_context = await build_reply_context(message)
-	prompt = build_roast_prompt(chan_id, user_message, reply_context=reply_context)
-	
 	selected_model = memory.get_channel_model(chan_id)
-	raw = await call_groq(prompt, model=selected_model, temperature=1.3)
+	prompt = build_roast_prompt(chan_id, user_message, reply_context=reply_context, model=selected_model)
+	
+	try:
+		raw = await call_groq(prompt, model=selected_model, temperature=1.3)
+	except rate_limiter.RateLimited as e:
+		print(f"[RATE LIMIT] {e}")
+		await send_human_reply(message.channel, rate_limited_reply(e))
+		return
 	raw = sanitize_model_output(raw, selected_model)
 	reply = raw.strip() if raw else choose_fallback("roast")
 	if reply and not reply.endswith(('.', '!', '?')):
 		reply += '.'
 	await send_human_reply(message.channel, reply)
-	channel_memory[chan_id].append(f"{BOT_NAME}: {reply}")
 	memory.add_message(chan_id, BOT_NAME, reply)
 	memory.persist()
 	await maybe_send_promo_message(message.channel, chan_id)
 
-async def handle_rizz_message(chan_id, message, mode):
+@tracing.root("rizz", follow=True)
+async def handle_rizz_message(chan_id, message, mode, content=None):
 	guild_id = message.guild.id if message.guild else None
 	if guild_id is not None and not await can_send_in_guild(guild_id):
 		return
 
-	mem = channel_memory.get(chan_id, deque())
-	history_text = "\n".join(mem) if mem else "No previous messages."
-
-	persona = PERSONAS.get(mode, PERSONAS["rizz_online"])
+	system, system_tokens = persona_prefix(mode, "rizz_online")
+	selected_model = memory.get_channel_model(chan_id)
+	request = f"User says:\n{content or message.content}\n\nReply:"
 
-	prompt = (
-		f"{persona}\n\n"
-		f"{BOT_CAPABILITIES_PROMPT}\n\n"
-		f"=== CONVERSATION HISTORY ===\n"
-		f"{history_text}\n"
-		f"=== END HISTORY ===\n\n"
-		f"User says:\n{message.content}\n\nReply:"
+	mem, _ = fit_context(
+		selected_model,
+		system_tokens + estimate_tokens(request) + 32,
+		history=memory.get_recent_flat(chan_id, MAX_MEMORY),
 	)
+	prompt = chat_messages(system, history_turns(mem, BOT_NAME), request)
 
 	try:
-		selected_model = memory.get_channel_model(chan_id)
-		response = await call_groq_with_health(prompt, temperature=0.85, mode=mode, model_override=selected_model)
+		with tracing.span("llm"):
+			response = await call_groq_with_health(prompt, temperature=0.85, mode=mode, model_override=selected_model)
 		response = sanitize_model_output(response, selected_model)
+	except rate_limiter.RateLimited as e:
+		print(f"[RATE LIMIT] {e}")
+		await send_human_reply(message.channel, rate_limited_reply(e))
+		return
 	except Exception as e:
 		print(f"[RIZZ ERROR] {e}")
 		response = None
 
 	reply = response.strip() if response else choose_fallback(mode)
 
+	message_coalescer.replying()
 	await send_human_reply(message.channel, reply)
 
-	channel_memory.setdefault(chan_id, deque(maxlen=MAX_MEMORY))
-	channel_memory[chan_id].append(f"{BOT_NAME}: {reply}")
 	memory.add_message(chan_id, BOT_NAME, reply)
 	memory.persist()
 	await maybe_send_promo_message(message.channel, chan_id)
 
+# ---------------- CONTEXT GATHERING ----------------
+# Reply context, web search (classification + search) and URL content are
+# independent, so they run concurrently. Each source has its own deadline;
+# a source that fails or times out contributes nothing instead of failing
+# the reply.
+REPLY_CONTEXT_DEADLINE = 3.0
+SEARCH_DEADLINE = 8.0
+URL_FETCH_DEADLINE = 10.0
+CONTEXT_TIMINGS = {name: deque(maxlen=500) for name in ("reply", "classify", "search", "url", "total")}
+
+def _record_timing(name, started, timings):
+	ms = (time.perf_counter() - started) * 1000
+	timings[name] = ms
+	CONTEXT_TIMINGS[name].append(ms)
+
+async def _context_source(name, coro, deadline, timings):
+	started = time.perf_counter()
+	try:
+		return await asyncio.wait_for(coro, timeout=deadline)
+	except asyncio.TimeoutError:
+		print(f"[CONTEXT] {name} missed its {deadline:.0f}s deadline")
+		return ""
+	except Exception as e:
+		print(f"[CONTEXT] {name} failed: {e}")
+		return ""
+	finally:
+		_record_timing(name, started, timings)
+
+async def _search_context_source(content, timings):
+	started = time.perf_counter()
+	try:
+		needs_search = await should_search_web(content)
+	finally:
+		_record_timing("classify", started, timings)
+	if not needs_search:
+		return ""
+	return (
+		await search_web_context(content)
+		or "[Web search attempted but returned no results - use your knowledge base]"
+	)
+
+async def _url_context_source(content):
+	url_match = re.search(r'https?://[^\s<>"\']+', content)
+	if not url_match:
+		return ""
+	from slash_commands import fetch_url_content  # lazy import to avoid circular dependency
+	extracted = await fetch_url_content(url_match.group(0), max_chars=1500)
+	if extracted and not extracted.startswith("❌"):
+		return extracted
+	return ""
+
+@tracing.traced("context")
+async def gather_reply_context(message, content):
+	"""Returns (reply_context, search_context, url_context)."""
+	timings = {}
+	started = time.perf_counter()
+	reply_context, search_context, url_context = await asyncio.gather(
+		_context_source("reply", build_reply_context(message), REPLY_CONTEXT_DEADLINE, timings),
+		_context_source("search", _search_context_source(content, timings), SEARCH_DEADLINE, timings),
+		_context_source("url", _url_context_source(content), URL_FETCH_DEADLINE, timings),
+	)
+	_record_timing("total", started, timings)
+	print("[CONTEXT] " + " · ".join(f"{name} {ms:.0f}ms" for name, ms in timings.items()))
+	return reply_context, search_context, url_context
+
+def context_timing_summary():
+	"""name -> (samples, p50 ms, p95 ms) over the recent window."""
+	summary = {}
+	for name, samples in CONTEXT_TIMINGS.items():
+		if not samples:
+			continue
+		ordered = sorted(samples)
+		summary[name] = (
+			len(ordered),
+			ordered[len(ordered) // 2],
+			ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+		)
+	return summary
+
+def finalize_reply(response, mode):
+	"""Humanize / safeify a model response for the given mode."""
+	if mode == "funny":
+		return humanize_and_safeify(response)
+	reply = response.strip()
+	if reply and not reply.endswith(('.', '!', '?')):
+		reply += '.'
+	return reply
+
+@tracing.root("reply", follow=True)
 async def generate_and_reply(chan_id, message, content, mode):
 	guild_id = message.guild.id if message.guild else None
 	if guild_id is not None and not await can_send_in_guild(guild_id):
 		return
 	
-	# ---------------- CHECK FOR REPLY CONTEXT ----------------
-	reply_context = await build_reply_context(message)
+	# ---------------- GATHER CONTEXT ----------------
+	reply_context, search_context, url_context = await gather_reply_context(message, content)
 
-	search_context = ""
-	if await should_search_web(content):
-		search_context = await search_web_context(content)
+	selected_model = memory.get_channel_model(chan_id)
+	with tracing.span("prompt"):
+		prompt = build_general_prompt(
+			chan_id, mode, message, include_last_image=False,
+			model=selected_model,
+			search_context=search_context,
+			url_context=url_context,
+			reply_context=reply_context,
+			user_text=content,
+		)
 
-		if not search_context:
-			search_context = "[Web search attempted but returned no results - use your knowledge base]"
+	# ---------------- STREAMED RESPONSE ----------------
+	reply = None
+	if (
+		STREAM_REPLIES
+		and selected_model not in NON_STREAMING_MODELS
+		and model_health.available("groq", selected_model)
+	):
+		async def retry():
+			response = await call_groq_with_health(prompt, temperature=0.7, mode=mode, model_override=selected_model)
+			return sanitize_model_output(response, selected_model) if response else None
+
+		message_coalescer.replying()
+		with tracing.span("llm_stream"):
+			reply = await stream_human_reply(
+				message.channel,
+				stream_groq(prompt=prompt, model=selected_model, temperature=0.7),
+				lambda raw: finalize_reply(raw, mode),
+				retry,
+			)
+		if reply == "":
+			return   # cut off mid-stream; don't remember half an answer
 
-	# ---------------- FETCH URL CONTENT IF USER SHARED A LINK ----------------
-	url_context = ""
-	url_match = re.search(r'https?://[^\s<>"\']+', content)
-	if url_match:
-		from slash_commands import fetch_url_content  # lazy import to avoid circular dependency
+	if reply is None:
+		# ---------------- GENERATE RESPONSE ----------------
 		try:
-			extracted = await fetch_url_content(url_match.group(0), max_chars=1500)
-			if extracted and not extracted.startswith("❌"):
-				url_context = extracted
+			with tracing.span("llm"):
+				response = await call_groq_with_health(prompt, temperature=0.7, mode=mode, model_override=selected_model)
+			response = sanitize_model_output(response, selected_model)
+		except rate_limiter.RateLimited as e:
+			print(f"[RATE LIMIT] {e}")
+			await send_human_reply(message.channel, rate_limited_reply(e))
+			return
 		except Exception as e:
-			print(f"[URL FETCH ERROR] {e}")
+			print(f"[API ERROR] {e}")
+			response = None
 
-	prompt = (
-		build_general_prompt(chan_id, mode, message, include_last_image=False)
-		+ (f"\n=== WEB SEARCH CONTEXT ===\n{search_context}\n=== END WEB SEARCH CONTEXT ===\n" if search_context else "")
-		+ (f"\n=== WEBPAGE CONTENT ===\n{url_context}\n=== END WEBPAGE CONTENT ===\n" if url_context else "")
-		+ reply_context
-		+ f"\nUser says:\n{content}\n\nReply:"
-	)
-	
-	# ---------------- GENERATE RESPONSE ----------------
-	try:
-		selected_model = memory.get_channel_model(chan_id)
-		response = await call_groq_with_health(prompt, temperature=0.7, mode=mode, model_override=selected_model)
-		response = sanitize_model_output(response, selected_model)
-	except Exception as e:
-		print(f"[API ERROR] {e}")
-		response = None
-	
-	# ---------------- HUMANIZE / SAFEIFY ----------------
-	if response:
-		if mode == "funny":
-			reply = humanize_and_safeify(response)
-		else:
-			reply = response.strip()
-			if reply and not reply.endswith(('.', '!', '?')):
-				reply += '.'
-	else:
-		reply = choose_fallback(mode)
-	
-	# ---------------- SEND REPLY ----------------
-	await send_human_reply(message.channel, reply)
+		reply = finalize_reply(response, mode) if response else choose_fallback(mode)
+
+		# ---------------- SEND REPLY ----------------
+		message_coalescer.replying()
+		await send_human_reply(message.channel, reply)
 	
 	# ---------------- SAVE TO MEMORY ----------------
-	channel_memory.setdefault(chan_id, deque(maxlen=MAX_MEMORY))
-	channel_memory[chan_id].append(f"{BOT_NAME}: {reply}")
 	memory.add_message(chan_id, BOT_NAME, reply)
 	memory.persist()
 	
@@ -1403,111 +1673,110 @@ async def generate_and_reply(chan_id, message, content, mode):
 	await maybe_send_promo_message(message.channel, chan_id)
 
 async def should_search_web(user_text: str) -> bool:
-	"""Ask the model if fresh web data is likely needed for this user query."""
-	if not user_text.strip():
-		return False
-
-	classifier_prompt = (
-		"You are a strict classifier. Answer ONLY YES or NO.\n"
-		"Should this query use live web search for freshness/current events/factual lookup?\n"
-		"Search is useful for latest news, current leaders, recent updates, rankings, dates, and changing facts.\n"
-		"Search is not needed for opinions, casual chat, coding help, writing, or timeless explanations.\n\n"
-		f"Query: {user_text}\n"
-		"Answer:"
-	)
-
-	try:
-		decision = await call_groq(
-			prompt=classifier_prompt,
-			model="llama-3.3-70b-versatile",
-			temperature=0.0,
-		)
-		return (decision or "").strip().upper().startswith("YES")
-	except Exception as e:
-		print(f"[WEB SEARCH DECIDER ERROR] {e}")
-		return False
-
-
-async def search_web_context(query: str, max_results: int = 5) -> str:
-	"""
-	Fetch web search results using DuckDuckGo Instant Answer API.
-	Returns formatted search results with direct answers and related topics.
-	"""
+	"""Heuristic fast path first; the LLM classifier only sees ambiguous queries."""
+	return await search_classifier.should_search(user_text)
+
+
+# ---------------- WEB SEARCH CACHE ----------------
+# Identical questions ("who won the game last night") within a few minutes
+# share one DuckDuckGo lookup. Keys are slang-normalized queries; empty
+# results are cached briefly, errors are not cached at all.
+SEARCH_CACHE_TTL = 300
+SEARCH_NEGATIVE_TTL = 60
+search_cache = TTLCache("web_search", maxsize=1000, ttl=SEARCH_CACHE_TTL)
+
+async def _fetch_duckduckgo(query: str, max_results: int) -> str:
+	"""One DuckDuckGo Instant Answer lookup; raises on network/HTTP errors."""
+	encoded = urllib.parse.quote_plus(query)
+	api_url = f"https://api.duckduckgo.com/?q={encoded}&format=json&no_html=1&skip_disambig=1"
+
+	async with http_client.session() as session:
+		async with session.get(
+			api_url,
+			timeout=aiohttp.ClientTimeout(total=10)
+		) as resp:
+			if resp.status != 200:
+				raise aiohttp.ClientResponseError(
+					resp.request_info, resp.history, status=resp.status, message="DuckDuckGo API error"
+				)
 
-	try:
-		encoded = urllib.parse.quote_plus(query)
-		api_url = f"https://api.duckduckgo.com/?q={encoded}&format=json&no_html=1&skip_disambig=1"
-
-		async with aiohttp.ClientSession() as session:
-			async with session.get(
-				api_url,
-				timeout=aiohttp.ClientTimeout(total=10)
-			) as resp:
-				if resp.status != 200:
-					print(f"[WEB SEARCH] API returned status {resp.status}")
-					return ""
-
-				data = await resp.json()
-				results = []
-
-				if data.get("Answer"):
-					results.append(
-						f"**Direct Answer:**\n{data['Answer']}"
-					)
+			data = await resp.json()
+			results = []
 
-				if data.get("AbstractText"):
-					abstract = data["AbstractText"]
-					source = data.get("AbstractSource", "Unknown")
-					url = data.get("AbstractURL", "")
+			if data.get("Answer"):
+				results.append(
+					f"**Direct Answer:**\n{data['Answer']}"
+				)
 
-					if len(abstract) > 500:
-						abstract = abstract[:497] + "..."
+			if data.get("AbstractText"):
+				abstract = data["AbstractText"]
+				source = data.get("AbstractSource", "Unknown")
+				url = data.get("AbstractURL", "")
 
-					results.append(
-						f"**{source}:**\n{abstract}\n{url}"
-					)
+				if len(abstract) > 500:
+					abstract = abstract[:497] + "..."
 
-				if data.get("Definition"):
-					results.append(
-						f"**Definition:**\n{data['Definition']}"
-					)
+				results.append(
+					f"**{source}:**\n{abstract}\n{url}"
+				)
 
-				topics_added = 0
-				for topic in data.get("RelatedTopics", []):
-					if topics_added >= max_results:
-						break
+			if data.get("Definition"):
+				results.append(
+					f"**Definition:**\n{data['Definition']}"
+				)
 
-					if isinstance(topic, dict):
-						if "Topics" in topic:
-							for subtopic in topic.get("Topics", []):
-								if topics_added >= max_results:
-									break
-								text = subtopic.get("Text", "").strip()
-								if text and len(text) > 20:
-									results.append(f"• {text}")
-									topics_added += 1
-
-						elif "Text" in topic:
-							text = topic.get("Text", "").strip()
+			topics_added = 0
+			for topic in data.get("RelatedTopics", []):
+				if topics_added >= max_results:
+					break
+
+				if isinstance(topic, dict):
+					if "Topics" in topic:
+						for subtopic in topic.get("Topics", []):
+							if topics_added >= max_results:
+								break
+							text = subtopic.get("Text", "").strip()
 							if text and len(text) > 20:
 								results.append(f"• {text}")
 								topics_added += 1
 
-				for result in data.get("Results", [])[:max_results]:
-					if isinstance(result, dict):
-						text = result.get("Text", "").strip()
-						if text:
+					elif "Text" in topic:
+						text = topic.get("Text", "").strip()
+						if text and len(text) > 20:
 							results.append(f"• {text}")
+							topics_added += 1
 
-				if results:
-					return "\n\n".join(results)
+			for result in data.get("Results", [])[:max_results]:
+				if isinstance(result, dict):
+					text = result.get("Text", "").strip()
+					if text:
+						results.append(f"• {text}")
 
-				print(f"[WEB SEARCH] No results for query: {query}")
-				return ""
+			if results:
+				return "\n\n".join(results)
 
+			print(f"[WEB SEARCH] No results for query: {query}")
+			return ""
+
+async def search_web_context(query: str, max_results: int = 5) -> str:
+	"""
+	Fetch web search results using DuckDuckGo Instant Answer API.
+	Returns formatted search results with direct answers and related topics.
+	"""
+
+	key = (normalize_text(query), max_results)
+	try:
+		return await search_cache.get_or_load(
+			key,
+			lambda: _fetch_duckduckgo(query, max_results),
+			ttl_for=lambda result: SEARCH_CACHE_TTL if result else SEARCH_NEGATIVE_TTL,
+		)
 	except asyncio.TimeoutError:
 		print("[WEB SEARCH] Request timed out")
 		return ""
+	except aiohttp.ClientResponseError as e:
+		print(f"[WEB SEARCH] API returned status {e.status}")
+		return ""
 	except aiohttp.ClientError as e:
 		print(f"[WEB SEARCH] Network error: {e}")
 		return ""
@@ -1542,7 +1811,7 @@ async def extract_image_bytes(message) -> bytes | None:
 
 		if url:
 			try:
-				async with aiohttp.ClientSession() as session:
+				async with http_client.session() as session:
 					async with session.get(url) as resp:
 						if resp.status == 200:
 							return await resp.read()
@@ -1583,7 +1852,7 @@ async def extract_image_bytes(message) -> bytes | None:
 
 				if url:
 					try:
-						async with aiohttp.ClientSession() as session:
+						async with http_client.session() as session:
 							async with session.get(url) as resp:
 								if resp.status == 200:
 									return await resp.read()
@@ -1593,6 +1862,36 @@ async def extract_image_bytes(message) -> bytes | None:
 
 	return None
 
+# ---------------- OCR CACHE ----------------
+# Reposted memes/screenshots skip the OCR round trip. Keyed by model + SHA-256
+# of the image bytes; NO_TEXT verdicts are cached too. Failed calls are not.
+# ocr_cache.json is a local warm-start file (git-ignored, not committed by the
+# workflow); only the OCR_CACHE_PERSIST_MAX most recently used entries are
+# written, at most once per OCR_CACHE_FLUSH_DELAY seconds.
+OCR_CACHE_FILE = "ocr_cache.json"
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 60 * 60)))
+OCR_CACHE_MAX = int(os.getenv("OCR_CACHE_MAX", "5000"))
+OCR_CACHE_PERSIST_MAX = int(os.getenv("OCR_CACHE_PERSIST_MAX", "500"))
+OCR_CACHE_FLUSH_DELAY = 60.0
+ocr_cache = TTLCache("ocr", maxsize=OCR_CACHE_MAX, ttl=OCR_CACHE_TTL)
+
+def load_ocr_cache():
+	if not os.path.exists(OCR_CACHE_FILE):
+		return
+	try:
+		ocr_cache.load(json.loads(load_encrypted(OCR_CACHE_FILE)))
+		print(f"[OCR CACHE] Loaded {len(ocr_cache)} entries")
+	except Exception as e:
+		print(f"[OCR CACHE] Load error: {e}")
+
+persistence.register_store(
+	"ocr_cache", OCR_CACHE_FILE,
+	lambda: json.dumps(ocr_cache.dump(limit=OCR_CACHE_PERSIST_MAX)),
+	encrypted=True,
+	delay=OCR_CACHE_FLUSH_DELAY,
+)
+
+@tracing.traced("image")
 async def handle_image_message(message, mode):
 	"""
 	Handles images sent by the user, including replies.
@@ -1604,23 +1903,21 @@ async def handle_image_message(message, mode):
 	chan_id = f"dm_{message.author.id}" if is_dm else str(message.channel.id)
 
 	# --- Extract image bytes using the helper that supports replies ---
-	image_bytes = await extract_image_bytes(message)
+	with tracing.span("image.download"):
+		image_bytes = await extract_image_bytes(message)
 
 	if not image_bytes:
 		print("[VISION ERROR] No image found in message or replied-to message")
 		return None
 
-	# Save to multi-image buffer
-	channel_last_images.setdefault(chan_id, [])
-	channel_last_images[chan_id].append(image_bytes)
-	# Cap to last 4 images (Flux sweet spot)
-	channel_last_images[chan_id] = channel_last_images[chan_id][-4:]
+	# Save to multi-image buffer (keeps the last 4 per channel, deduped)
+	image_digest = channel_last_images.add(chan_id, image_bytes)
 	
 	channel_id = message.channel.id
 	IMAGE_PROCESSING_CHANNELS.add(channel_id)
 
 	try:
-		persona = PERSONAS.get(mode, PERSONAS["serious"])
+		persona, persona_tokens = persona_prefix(mode, "serious", capabilities=False)
 		selected_model = memory.get_channel_model(chan_id)
 		if selected_model != IMAGE_REQUIRED_MODEL:
 			return (
@@ -1639,14 +1936,23 @@ async def handle_image_message(message, mode):
 			"- If there is no text, reply exactly: NO_TEXT"
 		)
 
-		print(f"[VISION OCR PROMPT] ({channel_id}) {ocr_prompt}")
-
-		extracted_text = await call_groq(
-			prompt=ocr_prompt,
-			model=IMAGE_REQUIRED_MODEL,
-			image_bytes=image_bytes,
-			temperature=0.1
-		)
+		ocr_key = f"{IMAGE_REQUIRED_MODEL}:{image_digest}"
+		extracted_text = ocr_cache.get(ocr_key)
+		if extracted_text is not None:
+			print(f"[VISION OCR CACHE] ({channel_id}) hit {image_digest[:12]}")
+		else:
+			print(f"[VISION OCR PROMPT] ({channel_id}) {ocr_prompt}")
+
+			with tracing.span("image.ocr"):
+				extracted_text = await call_groq(
+					prompt=ocr_prompt,
+					model=IMAGE_REQUIRED_MODEL,
+					image_bytes=image_bytes,
+					temperature=0.1
+				)
+			if extracted_text and extracted_text.strip():
+				ocr_cache.set(ocr_key, extracted_text.strip())
+				persistence.mark_dirty("ocr_cache")
 
 		user_request = (message.content or "").strip()
 		if not user_request:
@@ -1661,22 +1967,27 @@ async def handle_image_message(message, mode):
 
 		# If OCR produced usable text, answer using the selected channel chat model.
 		if extracted_text and extracted_text.upper() != "NO_TEXT":
-			final_prompt = (
-				f"{persona}\n"
+			_, context = fit_context(
+				selected_model,
+				persona_tokens + estimate_tokens(user_request) + 96,
+				ocr=extracted_text,
+			)
+			final_prompt = chat_messages(persona, [], (
 				"The user sent an image. OCR text was extracted below.\n"
 				"Use this extracted text as the primary source and answer the user request directly.\n"
 				"If OCR contains [unclear], mention that limitation clearly.\n\n"
-				f"Extracted OCR text:\n{extracted_text}\n\n"
+				f"Extracted OCR text:\n{context['ocr']}\n\n"
 				f"User request:\n{user_request}\n\n"
 				"Final answer:"
-			)
-
-			response = await call_groq_with_health(
-				prompt=final_prompt,
-				temperature=0.7,
-				mode=mode,
-				model_override=selected_model,
-			)
+			))
+
+			with tracing.span("image.llm"):
+				response = await call_groq_with_health(
+					prompt=final_prompt,
+					temperature=0.7,
+					mode=mode,
+					model_override=selected_model,
+				)
 
 			if response:
 				response = sanitize_model_output(response, selected_model)
@@ -1684,8 +1995,7 @@ async def handle_image_message(message, mode):
 				return response.strip()
 
 		# OCR unavailable / no text detected: fall back to direct vision response.
-		vision_prompt = (
-			persona + "\n"
+		vision_request = (
 			"You are an image analysis model.\n"
 			"Describe ONLY what is visually present in the image.\n"
 			"Do NOT assume identity, personality, or intent.\n"
@@ -1694,13 +2004,14 @@ async def handle_image_message(message, mode):
 			f"User message (for context):\n{user_request}\n\n"
 			"Image analysis:"
 		)
-		print(f"[VISION FALLBACK PROMPT] ({channel_id}) {vision_prompt}")
-		vision_response = await call_groq(
-			prompt=vision_prompt,
-			model=IMAGE_REQUIRED_MODEL,
-			image_bytes=image_bytes,
-			temperature=0.7,
-		)
+		print(f"[VISION FALLBACK PROMPT] ({channel_id}) {vision_request}")
+		with tracing.span("image.vision"):
+			vision_response = await call_groq(
+				prompt=chat_messages(persona, [], vision_request),
+				model=IMAGE_REQUIRED_MODEL,
+				image_bytes=image_bytes,
+				temperature=0.7,
+			)
 
 		if vision_response:
 			print(f"[VISION FALLBACK RESPONSE] {vision_response}")
@@ -1708,6 +2019,10 @@ async def handle_image_message(message, mode):
 
 		return "🤔 I can't interpret this image right now, try again later."
 
+	except rate_limiter.RateLimited as e:
+		print(f"[RATE LIMIT] {e}")
+		return rate_limited_reply(e)
+
 	except Exception as e:
 		print(f"[VISION ERROR] {e}")
 		return "🤔 Something went wrong while analyzing the image."
@@ -1740,6 +2055,7 @@ async def read_text_file(file_bytes, encoding="utf-8"):
 import pdfplumber
 from docx import Document
 
+@tracing.traced("file")
 async def handle_file_message(message, mode):
 	for attachment in message.attachments:
 		if attachment.content_type and attachment.content_type.startswith("image/"):
@@ -1752,7 +2068,8 @@ async def handle_file_message(message, mode):
 		return None
 
 	# Extract file bytes
-	file_bytes, filename = await extract_file_bytes(message)
+	with tracing.span("file.download"):
+		file_bytes, filename = await extract_file_bytes(message)
 	if not file_bytes:
 		return None
 
@@ -1795,22 +2112,27 @@ async def handle_file_message(message, mode):
 		)
 		return None
 
-	persona = PERSONAS.get(mode, PERSONAS["serious"])
-	prompt = (
-		f"{persona}\n"
-		f"The user uploaded a file `{filename}`. Content:\n{text}\n\n"
+	persona, persona_tokens = persona_prefix(mode, "serious", capabilities=False)
+	chan_id = f"dm_{message.author.id}" if isinstance(message.channel, discord.DMChannel) else str(message.channel.id)
+	selected_model = memory.get_channel_model(chan_id)
+	request = (
 		f"The user's specific request is: {message.content}\n"
 		f"Answer ONLY what the user asked. If the user didn't ask anything and just sent the file, just summarize the file, and tell the user what the file is about."
 	)
+	# Long PDFs would otherwise be inlined whole; keep the head that fits the model.
+	_, context = fit_context(selected_model, persona_tokens + estimate_tokens(request) + 32, file=text)
+	prompt = chat_messages(persona, [], (
+		f"The user uploaded a file `{filename}`. Content:\n{context['file']}\n\n"
+		f"{request}"
+	))
 	try:
-		chan_id = f"dm_{message.author.id}" if isinstance(message.channel, discord.DMChannel) else str(message.channel.id)
-		selected_model = memory.get_channel_model(chan_id)
-		response = await call_groq_with_health(
-			prompt=prompt,
-			temperature=0.7,
-			mode=mode,
-			model_override=selected_model,
-		)
+		with tracing.span("file.llm"):
+			response = await call_groq_with_health(
+				prompt=prompt,
+				temperature=0.7,
+				mode=mode,
+				model_override=selected_model,
+			)
 		if response:
 			response = sanitize_model_output(response, selected_model)
 			await send_human_reply(message.channel, response.strip())
@@ -1821,6 +2143,11 @@ async def handle_file_message(message, mode):
 			save_usage()  # save after consuming
 
 			return response.strip()
+	except rate_limiter.RateLimited as e:
+		print(f"[RATE LIMIT] {e}")
+		busy = rate_limited_reply(e)
+		await send_human_reply(message.channel, busy)
+		return busy
 	except Exception as e:
 		print(f"[FILE RESPONSE ERROR] {e}")
 
@@ -1828,6 +2155,7 @@ async def handle_file_message(message, mode):
 
 # ---------------- EDIT OR TEXT DETECTION ----------------
 
+@tracing.traced("decide_image_action")
 async def decide_image_action(user_text: str, image_count: int) -> str:
 	"""
 	Returns one of: 'EDIT' or 'NO'
@@ -2191,6 +2519,30 @@ def clean_chess_input(content: str, bot_id: int) -> str:
 
 	return content.strip()
 
+# ---------------- CHAT TURNS ----------------
+
+def queue_chat_turn(chan_id, guild_id, message, content, handler):
+	"""
+	Add a chat line to the channel's pending turn. Once the turn is complete
+	handler(turn) runs on the generation pool. The message quota is checked
+	and used once per turn, at dispatch (the per-line check in on_message is
+	only an early out), and not again when a superseded turn is redone; a
+	shed turn gets a busy reply.
+	"""
+	def dispatch(turn):
+		if not turn.resubmitted and not check_limit(turn.message, "messages"):
+			chat_turns.finish(turn)
+			asyncio.create_task(deny_limit(turn.message, "messages"))
+			return
+		if generation.submit(guild_id or chan_id, chan_id, lambda: chat_turns.run(turn, lambda: handler(turn))):
+			if not turn.resubmitted:
+				consume(turn.message, "messages")   # a superseded turn's redo was already paid for
+		else:
+			chat_turns.finish(turn)
+			asyncio.create_task(send_human_reply(turn.message.channel, choose_fallback("busy")))
+
+	chat_turns.add(chan_id, message, content, dispatch)
+
 # ---------------- ON MESSAGE ----------------
 
 @bot.event
@@ -2209,14 +2561,14 @@ async def on_message(message: Message):
 		chan_id = f"dm_{message.author.id}" if is_dm else str(message.channel.id)
 		guild_id = message.guild.id if message.guild else None
 		bot_id = bot.user.id
+		# Model calls made for this message queue fairly per guild (see rate_limiter).
+		rate_limiter.bind(guild_id if guild_id is not None else chan_id)
 
 		# ---------- GUILD CHAT ACCESS FILTER ----------
 		if guild_id is not None and not is_channel_allowed(guild_id, message.channel.id):
 			return
 		
 		# ---------- ALWAYS SAVE TO MEMORY ----------
-		channel_memory.setdefault(chan_id, deque(maxlen=MAX_MEMORY))
-		channel_memory[chan_id].append(f"{message.author.display_name}: {content}")
 		memory.add_message(chan_id, message.author.display_name, content)
 
 		# ---------- BOT PING RULE ----------
@@ -2235,6 +2587,9 @@ async def on_message(message: Message):
 			if bot.user not in message.mentions and not is_reply_to_bot:
 				return
 
+		# Addressed to the bot from here on: time each stage (see tracing.py).
+		tracing.start("message", chan=chan_id)
+
 		# ---------- STRIP BOT MENTION ----------
 		content = re.sub(rf"<@!?\s*{bot_id}\s*>", "", message.content).strip()
 		content_lower = content.lower()
@@ -2248,7 +2603,8 @@ async def on_message(message: Message):
 		if content.startswith(bot.command_prefix) and not is_owner_local_cmd:
 			original_content = message.content
 			message.content = content
-			await bot.process_commands(message)
+			with tracing.span("command"):
+				await bot.process_commands(message)
 			message.content = original_content
 			return
 
@@ -2257,7 +2613,8 @@ async def on_message(message: Message):
 		if not is_dm:
 			mod_cog = bot.get_cog("ModerationCog")
 			if mod_cog and hasattr(mod_cog, "_parse_nl_mod_intent"):
-				parsed_mod = await mod_cog._parse_nl_mod_intent(message)
+				with tracing.span("nl_parse"):
+					parsed_mod = await mod_cog._parse_nl_mod_intent(message)
 				if parsed_mod:
 					return
 		
@@ -2340,9 +2697,7 @@ async def on_message(message: Message):
 				)
 				print(f"[DEBUG] edit_image returned bytes length: {len(result)}")
 				
-				channel_last_images.setdefault(chan_id, [])
-				channel_last_images[chan_id].append(result)
-				channel_last_images[chan_id] = channel_last_images[chan_id][-4:]
+				channel_last_images.add(chan_id, result)
 				
 				await message.channel.send(
 					file=discord.File(io.BytesIO(result), filename="edited.png")
@@ -2369,7 +2724,6 @@ async def on_message(message: Message):
 			if image_reply is not None:
 				await send_human_reply(message.channel, image_reply)
 				
-				channel_memory[chan_id].append(f"{BOT_NAME}: {image_reply}")
 				memory.add_message(chan_id, BOT_NAME, image_reply)
 				memory.persist()
 				await maybe_send_promo_message(message.channel, chan_id)
@@ -2619,8 +2973,10 @@ async def on_message(message: Message):
 			if not check_limit(message, "messages"):
 				await deny_limit(message, "messages")
 				return
-			consume(message, "messages")
-			asyncio.create_task(handle_rizz_message(chan_id, message, mode))
+			queue_chat_turn(
+				chan_id, guild_id, message, content,
+				lambda turn: handle_rizz_message(chan_id, turn.message, mode, turn.content),
+			)
 			return
 		
 		# ---------------- GENERAL CHAT ----------------
@@ -2629,15 +2985,183 @@ async def on_message(message: Message):
 			await deny_limit(message, "messages")
 			return
 		
-		consume(message, "messages")
-				
-		asyncio.create_task(generate_and_reply(chan_id, message, content, mode))
+		queue_chat_turn(
+			chan_id, guild_id, message, content,
+			lambda turn: generate_and_reply(chan_id, turn.message, turn.content, mode),
+		)
 		
 	except VoteRequired:
 		return
+	finally:
+		tracing.finish()
+
+@bot.command(name="cachestats")
+async def cache_stats(ctx: commands.Context):
+	"""
+	Show channel-state cache and persistence counters (Owner only).
+	Usage: !cachestats
+	"""
+	if not await is_owner_user(ctx.author):
+		await ctx.send("🚫 Owner only command.")
+		return
+
+	lines = ["**Channel caches**"]
+	for name, s in channel_cache.all_stats().items():
+		hit_rate = f"{s['hit_rate']:.0%}" if s["hit_rate"] is not None else "n/a"
+		lines.append(
+			f"`{name}` resident {s['resident']}/{s['max_resident']} · hit {hit_rate} · "
+			f"hydrated {s['hydrations']} · evicted {s['evictions']} · expired {s['expirations']} · "
+			f"~{s['approx_bytes'] / 1024:.0f} KiB"
+		)
+	lines.append("**TTL caches**")
+	for name, s in ttl_cache.all_stats().items():
+		hit_rate = f"{s['hit_rate']:.0%}" if s["hit_rate"] is not None else "n/a"
+		lines.append(
+			f"`{name}` {s['size']}/{s['maxsize']} · hit {hit_rate} ({s['hits']}/{s['hits'] + s['misses']}) · "
+			f"evicted {s['evictions']} · expired {s['expirations']} · coalesced {s['coalesced']}"
+		)
+	images = channel_last_images.stats()
+	lines.append(
+		f"**Image store** {images['blobs']} blobs in {images['channels']} channels · "
+		f"{images['resident_bytes'] / 1048576:.1f}/{images['budget_bytes'] / 1048576:.0f} MiB resident · "
+		f"{images['spilled_blobs']} spilled ({images['spilled_bytes'] / 1048576:.1f} MiB) · "
+		f"dedup {images['dedup_hits']} · dropped {images['drops']}"
+	)
+	decider = search_classifier.get_stats()
+	lines.append(
+		f"**Search decider** table {decider['table']} · heuristic yes/no "
+		f"{decider['heuristic_yes']}/{decider['heuristic_no']} · llm {decider['llm']} "
+		f"({decider['llm_ms']} ms total, errors {decider['llm_errors']})"
+	)
+	urls = url_fetcher.get_stats()
+	lines.append(
+		f"**URL fetcher** downloads {urls['downloads']} · fresh hits {urls['fresh_hits']} · "
+		f"revalidated {urls['revalidated']} · capped {urls['truncated']} · blocked {urls['blocked']}"
+	)
+	members = member_index.get_stats()
+	lines.append(
+		f"**Member index** guilds {members['guilds']} · names {members['names']} · builds {members['builds']} · "
+		f"lookups {members['lookups']} (resolved {members['hits']})"
+	)
+	prompts = prompt_builder.get_stats()
+	lines.append(
+		f"**Prompt budget** prompts {prompts['prompts']} · trimmed {prompts['trimmed']} · "
+		f"~{prompts['tokens_cut']} tokens cut · largest ~{prompts['largest']} tokens"
+	)
+	timing = context_timing_summary()
+	if timing:
+		lines.append("**Context gathering** " + " · ".join(
+			f"{name} p50 {p50:.0f}ms p95 {p95:.0f}ms" for name, (_, p50, p95) in timing.items()
+		))
+	lines.append("**HTTP pools**")
+	for name, s in http_client.get_stats().items():
+		lines.append(
+			f"`{name}` requests {s['requests']} · new connections {s['connections']} "
+			f"({s['connections_per_request']}/req) · reused {s['reused']} · "
+			f"dns hit/miss {s['dns_hits']}/{s['dns_misses']} · errors {s['errors']}"
+		)
+	lines.append("**Persistence**")
+	for name, s in persistence.get_stats().items():
+		lines.append(
+			f"`{name}` writes {s['writes']} · coalesced {s['saved']} · errors {s['errors']} · "
+			f"last {s['last_write_ms']} ms"
+		)
+	await send_long_message(ctx.channel, "\n".join(lines))
+
+@bot.command(name="modelhealth")
+async def model_health_stats(ctx: commands.Context):
+	"""
+	Show per-model latency, error rates and circuit breaker state (Owner only).
+	Usage: !modelhealth
+	"""
+	if not await is_owner_user(ctx.author):
+		await ctx.send("🚫 Owner only command.")
+		return
+
+	rows = sorted(model_health.snapshot(), key=lambda r: (r["provider"], r["model"]))
+
+	icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+	lines = ["**Model health**"]
+	for r in rows:
+		latency = f"p50 {r['p50_ms']}ms p95 {r['p95_ms']}ms" if r["p50_ms"] is not None else "no latency data"
+		state = f"open {r['open_for']:.0f}s" if r["state"] == "open" else r["state"].replace("_", "-")
+		lines.append(
+			f"{icons[r['state']]} `{r['provider']}/{r['model']}` {state} · {r['calls']} calls · "
+			f"errors {r['error_rate']:.0%} · {latency} · 429 {r['rate_limited']} · 503 {r['overloaded']} · "
+			f"timeouts {r['timeouts']}"
+			+ (f" · last: {r['last_error']}" if r["last_error"] else "")
+		)
+	limits = rate_limiter.all_stats()
+	if limits:
+		lines.append("**Groq rate limiter**")
+	for model, l in limits.items():
+		lines.append(
+			f"`{model}` granted {l['granted']} · queued {l['queued']} (avg wait {l['avg_wait_ms']}ms, "
+			f"{l['waiting']} waiting) · rejected {l['rejected']} · 429s {l['throttled_429']} · "
+			f"tokens {l['tokens_left'] if l['tpm'] else '?'}/{l['tpm'] or '?'} · "
+			f"requests {l['requests_left'] if l['request_limit'] else '?'}/{l['request_limit'] or '?'}"
+			+ (f" · blocked {l['blocked_for']}s" if l["blocked_for"] else "")
+		)
+	gen = generation.stats()
+	lines.append(
+		f"**Generation queue** running {gen['running']}/{gen['workers']} · queued {gen['queued']} "
+		f"({gen['guilds_waiting']} guilds) · done {gen['completed']} · failed {gen['failed']} · shed {gen['shed']} · "
+		f"superseded {gen['cancelled']} · "
+		f"wait p50 {gen['wait_p50_ms']}ms / p95 {gen['wait_p95_ms']}ms / max {gen['wait_max_ms']}ms"
+	)
+	turns = chat_turns.stats()
+	lines.append(
+		f"**Chat turns** {turns['messages']} messages → {turns['turns']} turns · merged {turns['merged']} · "
+		f"superseded {turns['cancelled']} · pending {turns['pending']}"
+	)
+	sends = outbox.stats()
+	queued = " / ".join(f"{lane} {n}" for lane, n in sends["queued"].items())
+	lines.append(
+		f"**Outbox** queued {queued} (max {sends['max_depth']}) · in flight {sends['in_flight']} · "
+		f"sent {sends['sent']} · failed {sends['failed']} · "
+		f"promos dropped {sends['dropped']} · throttled {sends['throttled']} · "
+		f"wait p50 {sends['wait_p50_ms']}ms / p95 {sends['wait_p95_ms']}ms"
+	)
+	keys = groq_key_stats()
+	if keys:
+		lines.append("**Groq keys**")
+	for k in keys:
+		lines.append(
+			f"`{k['key']}` (…{k['suffix']}) requests {k['requests']} · ok {k['ok']} · in flight {k['in_flight']} · "
+			f"429s {k['rate_limited']} · errors {k['errors']}"
+			+ (f" · disabled {k['disabled_for']}s" if k["disabled_for"] else "")
+		)
+	router = llm_router.get_stats()
+	wins = ", ".join(f"{provider} {n}" for provider, n in router["wins"].items()) or "none"
+	lines.append(
+		f"**Router** providers {', '.join(router['providers'])} · calls {router['calls']} · "
+		f"hedges {router['hedges']} (won {router['hedge_wins']}) · failovers {router['failovers']} · "
+		f"exhausted {router['exhausted']} · wins: {wins}"
+	)
+	await send_long_message(ctx.channel, "\n".join(lines))
 		
+@bot.command(name="latency")
+async def latency_stats(ctx: commands.Context):
+	"""
+	Show per-stage message latency and the slowest recent requests (Owner only).
+	Usage: !latency
+	"""
+	if not await is_owner_user(ctx.author):
+		await ctx.send("🚫 Owner only command.")
+		return
+
+	lines = ["**Stage latency** (count · p50 / p95 · histogram ms)"]
+	for stage, s in tracing.summary().items():
+		buckets = " ".join(f"{bound}:{n}" for bound, n in s["buckets"].items() if n)
+		lines.append(f"`{stage}` {s['count']} · {s['p50_ms']} / {s['p95_ms']}ms · {buckets}")
+	slow = tracing.slow_traces()
+	if slow:
+		lines.append(f"**Slow requests** (≥{tracing.SLOW_TRACE_MS:.0f}ms, newest last)")
+		lines.extend(f"• {line}" for line in slow[-5:])
+	await send_long_message(ctx.channel, "\n".join(lines))
+
 # ---------------- EVENTS ----------------
-bot.event
+@bot.event
 async def on_ready():
 	await bot.change_presence(
 		activity=discord.CustomActivity(
@@ -2646,14 +3170,46 @@ async def on_ready():
 		status=discord.Status.online
 	)
 	print(f"{BOT_NAME} is ready!")
-	asyncio.create_task(process_queue())
-	asyncio.create_task(autosave_usage())
 
 	print("Shard mapping of all servers:")
 	for guild in bot.guilds:
 		print(f"Guild: {guild.name} (ID: {guild.id}) | Shard ID: {guild.shard_id} | Member count: {guild.member_count}")
+
+# Keep the mention index (member_index.py) in step with the member cache.
+@bot.event
+async def on_member_join(member):
+	member_index.member_joined(member)
+
+@bot.event
+async def on_member_update(before, after):
+	member_index.member_updated(before, after)
+
+@bot.event
+async def on_member_remove(member):
+	member_index.member_left(member)
+
+@bot.event
+async def on_user_update(before, after):
+	member_index.user_updated(before, after)
+
+@bot.event
+async def on_guild_remove(guild):
+	member_index.guild_left(guild)
 		
 # ---------------- RUN ----------------
+def load_state():
+	"""
+	Read the persisted state files. Only the bot process itself calls this:
+	url_fetcher's extraction workers re-import this module as __mp_main__,
+	and must not load (or rewrite) any of them.
+	"""
+	load_usage()
+	load_guild_chat_config()
+	memory.load()
+	load_vote_unlocks()
+	cleanup_expired_votes()
+	load_ocr_cache()
+
 def run():
 	if not DISCORD_TOKEN:
 		print("ERROR: DISCORD_TOKEN environment variable is not set. Cannot start the bot.")
@@ -2668,8 +3224,15 @@ def run():
 		sys.exit(1)
 		
 if __name__ == "__main__":
+	load_state()
+	# atexit runs in reverse order: the save_* calls below only mark stores
+	# dirty, and this final flush writes them.
+	atexit.register(persistence.flush_all)
 	atexit.register(save_usage)
 	atexit.register(save_vote_unlocks)
 	atexit.register(save_guild_chat_config)
 	atexit.register(playlist_manager.save)
+	atexit.register(memory.persist)
+	atexit.register(memory.compact)   # runs before persist; the journal is not kept between runs
+	atexit.register(channel_last_images.close)
 	run()
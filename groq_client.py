@@ -1,15 +1,103 @@
 import aiohttp
+import http_client
 import os
 import asyncio
 import base64
+import hashlib
+import json
+import random
+import time
+from typing import AsyncIterator
+
+import model_health
+import rate_limiter
+from ttl_cache import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+KEY_DISABLE_SECONDS = 3600   # a key rejected with 401 is left out this long
+KEY_BACKOFF_SECONDS = 60     # ... or only this long if it is the last key still enabled
+
+# Near-deterministic calls (classifiers, prompt boosters) share one upstream
+# request and reuse the answer while it is fresh.
+GROQ_CACHE_MAX_TEMPERATURE = float(os.getenv("GROQ_CACHE_MAX_TEMPERATURE", "0.2"))
+GROQ_CACHE_TTL = float(os.getenv("GROQ_CACHE_TTL", "600"))
+_responses = TTLCache("groq_responses", maxsize=2000, ttl=GROQ_CACHE_TTL)
+
+
+def _load_keys() -> list[str]:
+    """GROQ_API_KEY (comma-separated for several) plus GROQ_API_KEY_2, as in tts_text_polisher."""
+    keys = [k.strip() for k in os.getenv("GROQ_API_KEY", "").split(",") if k.strip()]
+    k2 = os.getenv("GROQ_API_KEY_2", "").strip()
+    if k2 and k2 not in keys:
+        keys.append(k2)
+    return keys
+
+
+class GroqKey:
+    """One API key: its own rate limits (a rate_limiter entry per model) and counters."""
+
+    def __init__(self, index: int, key: str):
+        self.key = key
+        self.label = f"key{index}"
+        self.in_flight = 0
+        self.requests = 0
+        self.ok = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.disabled_until = 0.0
+
+    def limiter(self, model: str) -> str:
+        """Groq limits each key (organization) per model."""
+        return f"{model}@{self.label}"
+
+    def enabled(self) -> bool:
+        return time.monotonic() >= self.disabled_until
+
+    def ready(self, model: str) -> bool:
+        return self.enabled() and rate_limiter.get(self.limiter(model)).blocked_until <= time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "key": self.label,
+            "suffix": self.key[-4:],
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "ok": self.ok,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "disabled_for": round(max(0.0, self.disabled_until - time.monotonic())),
+        }
+
 
-SESSION: aiohttp.ClientSession | None = None
+GROQ_KEYS = [GroqKey(i, key) for i, key in enumerate(_load_keys(), start=1)]
+GROQ_API_KEY = GROQ_KEYS[0].key if GROQ_KEYS else None
+
+
+def _pick_key(model: str, prompt_tokens: int) -> GroqKey | None:
+    """
+    Least-loaded enabled key for *model*: shortest rate-limiter wait, then
+    fewest requests in flight, then fewest requests overall.
+    """
+    cost = prompt_tokens + rate_limiter.COMPLETION_ESTIMATE
+    candidates = [key for key in GROQ_KEYS if key.enabled()]
+    if not candidates:
+        return None
+    return min(
+        candidates,
+        key=lambda k: (rate_limiter.get(k.limiter(model)).expected_wait(cost), k.in_flight, k.requests),
+    )
+
+
+def _spare_key(model: str, used: GroqKey) -> bool:
+    """True if another key can still serve *model* (so a 429 on *used* is not the model's fault)."""
+    return any(key is not used and key.ready(model) for key in GROQ_KEYS)
+
+
+def key_stats() -> list[dict]:
+    return [key.stats() for key in GROQ_KEYS]
 
 
 def _max_tokens_for_model(model: str) -> int:
@@ -22,26 +110,113 @@ def _max_tokens_for_model(model: str) -> int:
 def clean_log(text: str) -> str:
     if not text:
         return text
-    if GROQ_API_KEY:
-        text = text.replace(GROQ_API_KEY, "***")
+    for key in GROQ_KEYS:
+        text = text.replace(key.key, "***")
     return text
 
 async def get_session():
-    global SESSION
-    if SESSION is None or SESSION.closed:
-        SESSION = aiohttp.ClientSession()
-    return SESSION
+    return http_client.get_session("llm")
 
 async def close_session():
-    """Close the aiohttp session properly"""
-    global SESSION
-    if SESSION and not SESSION.closed:
-        await SESSION.close()
-        SESSION = None
+    """Close the shared HTTP pools (see http_client.close_all)."""
+    await http_client.close_all()
+
+def _build_payload(prompt, model, temperature, image_bytes=None, stream=False) -> dict:
+    # A plain string is one user turn; a list is passed through as chat
+    # messages so a stable system prefix can be served from the provider cache.
+    messages = list(prompt) if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+
+    if image_bytes is not None:
+        b64 = base64.b64encode(image_bytes).decode("utf-8")
+        last = messages[-1]
+        messages[-1] = {
+            **last,
+            "content": [
+                {"type": "text", "text": last["content"]},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/png;base64,{b64}"
+                    }
+                },
+            ],
+        }
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": _max_tokens_for_model(model)
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+def _estimate_tokens(payload) -> int:
+    """Rough prompt size for the rate limiter (~4 characters per token; images not counted)."""
+    chars = 0
+    for message in payload["messages"]:
+        content = message["content"]
+        if isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content)
+        else:
+            chars += len(content)
+    return chars // 4
+
+def _headers(key: GroqKey) -> dict:
+    return {
+        "Authorization": f"Bearer {key.key}",
+        "Content-Type": "application/json",
+    }
+
+def _jittered(backoff: float) -> float:
+    """Pause before retrying after a 429, so a burst does not land on the next key all at once."""
+    return backoff * random.uniform(0.5, 1.5)
+
+def _retry_after(resp) -> float | None:
+    try:
+        return float(resp.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _record_status(model, key, resp):
+    if resp.status == 429:
+        key.rate_limited += 1
+        if _spare_key(model, key):
+            return  # this key is throttled, not the model; the next attempt uses another key
+    else:
+        key.errors += 1
+    if resp.status == 401:
+        # Never shut out the last usable key for an hour over what may be a blip.
+        last = not any(k is not key and k.enabled() for k in GROQ_KEYS)
+        seconds = KEY_BACKOFF_SECONDS if last else KEY_DISABLE_SECONDS
+        key.disabled_until = time.monotonic() + seconds
+        print(f"[GROQ] {key.label} rejected (401); leaving it out for {seconds}s")
+    model_health.record_failure(
+        "groq", model, model_health.failure_kind(resp.status), _retry_after(resp), f"HTTP {resp.status}"
+    )
+
+def _record_exception(model, key, e):
+    key.errors += 1
+    kind = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+    model_health.record_failure("groq", model, kind, detail=clean_log(str(e))[:200])
+
+def _log_error(attempt, retries, status, model, text):
+    print("\n===== GROQ ERROR =====")
+    print(f"Attempt {attempt}/{retries}, Status: {status}")
+    print(f"Model: {model}")
+    print(clean_log(text))
+    print("================================\n")
+
+def _cache_key(prompt, model, temperature) -> str:
+    digest = hashlib.sha256(
+        json.dumps([prompt, temperature], ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"{model}:{digest}"
 
 # ---------------- UNIFIED CLIENT ----------------
 async def call_groq(
-    prompt: str,
+    prompt: str | list[dict],
     model: str = "llama-3.3-70b-versatile",
     temperature: float = 1.0,
     image_bytes: bytes | None = None,
@@ -49,64 +224,77 @@ async def call_groq(
 ) -> str | None:
     """
     Unified Groq client for both text and vision requests.
+    *prompt* is a single user prompt or a list of chat messages
+    ({"role": "system" | "user" | "assistant", "content": str}); images
+    attach to the last message.
+    Text calls at temperature <= GROQ_CACHE_MAX_TEMPERATURE are coalesced
+    and cached by (model, prompt) for GROQ_CACHE_TTL seconds; empty
+    results are not kept.
+    """
+    if image_bytes is None and temperature <= GROQ_CACHE_MAX_TEMPERATURE:
+        return await _responses.get_or_load(
+            _cache_key(prompt, model, temperature),
+            lambda: _call_groq(prompt, model, temperature, None, retries),
+            ttl_for=lambda text: GROQ_CACHE_TTL if text else 0,
+        )
+    return await _call_groq(prompt, model, temperature, image_bytes, retries)
+
+
+async def _call_groq(prompt, model, temperature, image_bytes, retries) -> str | None:
+    """
+    Each attempt goes out on the least-loaded key (see _pick_key), waits for
+    that key's rate_limiter capacity first and raises
+    rate_limiter.RateLimited if that wait would be too long. A 429 or 401
+    moves the next attempt to another key.
     """
-    if not GROQ_API_KEY:
+    if not GROQ_KEYS:
         print("Missing GROQ API Key")
         return None
 
     session = await get_session()
-
-    # Build content
-    content = [{"type": "text", "text": prompt}]
-
-    if image_bytes is not None:
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
-        content.append({
-            "type": "image_url",
-            "image_url": {
-                "url": f"data:image/png;base64,{b64}"
-            }
-        })
-
-    payload = {
-        "model": model,
-        "messages": [
-            {
-                "role": "user",
-                "content": content
-            }
-        ],
-        "temperature": temperature,
-        "max_tokens": _max_tokens_for_model(model)
-    }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    payload = _build_payload(prompt, model, temperature, image_bytes)
+    prompt_tokens = _estimate_tokens(payload)
 
     backoff = 1
+    pause = 0.0
     for attempt in range(1, retries + 1):
+        if pause:
+            await asyncio.sleep(pause)
+            pause = 0.0
+        key = _pick_key(model, prompt_tokens)
+        if key is None:
+            print("[GROQ] Every API key is disabled")
+            return None
+        await rate_limiter.acquire(key.limiter(model), prompt_tokens)
+        started = time.perf_counter()
+        recorded = False
+        key.requests += 1
+        key.in_flight += 1
         try:
-            async with session.post(GROQ_URL, headers=headers, json=payload, timeout=60) as resp:
+            async with session.post(GROQ_URL, headers=_headers(key), json=payload, timeout=60) as resp:
+                rate_limiter.update(key.limiter(model), resp.headers, resp.status)
                 text = await resp.text()
                 
                 if resp.status == 200:
                     data = await resp.json()
                     response_text = data["choices"][0]["message"]["content"]
+                    key.ok += 1
+                    model_health.record_success("groq", model, (time.perf_counter() - started) * 1000)
                     return response_text
 
-                print("\n===== GROQ ERROR =====")
-                print(f"Attempt {attempt}/{retries}, Status: {resp.status}")
-                print(f"Model: {model}")
-                print(clean_log(text))
-                print("================================\n")
+                _log_error(attempt, retries, resp.status, model, text)
+                _record_status(model, key, resp)
+                recorded = True
+
+                if resp.status == 401 and any(k.enabled() for k in GROQ_KEYS):
+                    continue
 
                 if resp.status in (401, 403):
                     return None
                 
                 if resp.status == 429:
-                    await asyncio.sleep(backoff)
+                    # The limiter holds this key until retry-after; back off before the next key.
+                    pause = _jittered(backoff)
                     backoff = min(backoff * 2, 8)
                     continue
                 
@@ -115,12 +303,109 @@ async def call_groq(
 
         except Exception as e:
             error_msg = clean_log(str(e))
-            print(f"[GROQ ERROR] Attempt {attempt}/{retries}: {error_msg}")
+            print(f"[GROQ ERROR] Attempt {attempt}/{retries} ({key.label}): {error_msg}")
+            if not recorded:
+                _record_exception(model, key, e)
             
             if attempt == retries:
                 raise e
             
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 8)
+        finally:
+            key.in_flight -= 1
 
     return None
+
+
+# ---------------- STREAMING ----------------
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=60)
+
+async def stream_groq(
+    prompt: str | list[dict],
+    model: str = "llama-3.3-70b-versatile",
+    temperature: float = 1.0,
+    image_bytes: bytes | None = None,
+    retries: int = 2
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of call_groq (SSE, ``stream: true``): yields content
+    deltas as they arrive. Retries like call_groq until the first delta has
+    been yielded; after that, errors propagate to the caller.
+    """
+    if not GROQ_KEYS:
+        print("Missing GROQ API Key")
+        return
+
+    session = await get_session()
+    payload = _build_payload(prompt, model, temperature, image_bytes, stream=True)
+    prompt_tokens = _estimate_tokens(payload)
+
+    backoff = 1
+    pause = 0.0
+    for attempt in range(1, retries + 1):
+        if pause:
+            await asyncio.sleep(pause)
+            pause = 0.0
+        key = _pick_key(model, prompt_tokens)
+        if key is None:
+            print("[GROQ] Every API key is disabled")
+            return
+        await rate_limiter.acquire(key.limiter(model), prompt_tokens)
+        yielded = False
+        recorded = False
+        key.requests += 1
+        key.in_flight += 1
+        try:
+            async with session.post(GROQ_URL, headers=_headers(key), json=payload, timeout=STREAM_TIMEOUT) as resp:
+                rate_limiter.update(key.limiter(model), resp.headers, resp.status)
+                if resp.status != 200:
+                    _log_error(attempt, retries, resp.status, model, await resp.text())
+                    _record_status(model, key, resp)
+                    recorded = True
+
+                    if resp.status == 401 and any(k.enabled() for k in GROQ_KEYS):
+                        continue
+
+                    if resp.status in (401, 403):
+                        return
+
+                    if resp.status == 429:
+                        pause = _jittered(backoff)
+                        backoff = min(backoff * 2, 8)
+                        continue
+
+                    if resp.status == 503:
+                        raise Exception(f"503 service overloaded - model {model} over capacity")
+                    continue
+
+                async for raw_line in resp.content:
+                    line = raw_line.decode("utf-8", errors="replace").strip()
+                    if not line.startswith("data:"):
+                        continue  # blank keep-alives and ": comment" lines
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yielded = True
+                        yield delta
+                # Streams are not timed: total duration depends on reply length.
+                key.ok += 1
+                model_health.record_success("groq", model)
+                return
+
+        except Exception as e:
+            error_msg = clean_log(str(e))
+            print(f"[GROQ STREAM ERROR] Attempt {attempt}/{retries} ({key.label}): {error_msg}")
+            if not recorded:
+                _record_exception(model, key, e)
+
+            if yielded or attempt == retries:
+                raise e
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 8)
+        finally:
+            key.in_flight -= 1
@@ -2,6 +2,8 @@ import json
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from persistence import register_store, mark_dirty
+
 CONFIG_FILE = Path("guild_chat_config.json")
 DEFAULT_MODE = "server"
 
@@ -49,20 +51,22 @@ def load_guild_chat_config() -> None:
         _guild_chat_config = {}
 
 
-def save_guild_chat_config() -> None:
-    try:
-        serialized = {
-            str(gid): {
-                "mode": data.get("mode", DEFAULT_MODE),
-                "channels": [str(ch) for ch in data.get("channels", [])],
-            }
-            for gid, data in _guild_chat_config.items()
+def _serialize_guild_chat_config() -> str:
+    serialized = {
+        str(gid): {
+            "mode": data.get("mode", DEFAULT_MODE),
+            "channels": [str(ch) for ch in data.get("channels", [])],
         }
+        for gid, data in _guild_chat_config.items()
+    }
+    return json.dumps(serialized, indent=2)
 
-        with CONFIG_FILE.open("w", encoding="utf-8") as f:
-            json.dump(serialized, f, indent=2)
-    except Exception as e:
-        print(f"[CONFIG] Failed to save guild chat config: {e}")
+
+register_store("guild_chat_config", str(CONFIG_FILE), _serialize_guild_chat_config)
+
+
+def save_guild_chat_config() -> None:
+    mark_dirty("guild_chat_config")
 
 
 def set_server_mode(guild_id: int, channel_ids: Optional[List[int]] = None) -> None:
@@ -0,0 +1,143 @@
+"""
+Process-wide pooled HTTP client layer.
+
+Every outbound call goes through a shared aiohttp TCPConnector per pool, so
+connections (and their TLS sessions) are kept alive and reused across calls,
+DNS answers are cached, and per-host concurrency is capped.
+
+    async with http_client.session(headers=...) as session:   # per-call headers
+        ...
+    session = http_client.get_session("llm")                     # long-lived
+
+session() returns a cheap ClientSession bound to the shared connector;
+closing it (e.g. leaving the ``async with``) leaves the pool open. Call
+close_all() once on shutdown.
+"""
+
+import asyncio
+import os
+
+import aiohttp
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "30"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "300"))
+
+# aiohttp's own default (300 s total), which the long deAPI video and image
+# calls rely on. The connect limit covers the socket only, not the wait for
+# a free connection in the pool.
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT)
+
+_pools: dict[str, dict] = {}
+
+
+def _new_stats() -> dict:
+    return {"requests": 0, "connections": 0, "reused": 0, "dns_hits": 0, "dns_misses": 0, "errors": 0}
+
+
+def _trace_config(stats: dict) -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(_session, _ctx, _params):
+        stats["requests"] += 1
+
+    async def on_request_exception(_session, _ctx, _params):
+        stats["errors"] += 1
+
+    async def on_connection_create_end(_session, _ctx, _params):
+        # A new TCP (and for https, TLS) connection; reuse avoids this.
+        stats["connections"] += 1
+
+    async def on_connection_reuseconn(_session, _ctx, _params):
+        stats["reused"] += 1
+
+    async def on_dns_cache_hit(_session, _ctx, _params):
+        stats["dns_hits"] += 1
+
+    async def on_dns_cache_miss(_session, _ctx, _params):
+        stats["dns_misses"] += 1
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_exception.append(on_request_exception)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+
+def _pool(name: str) -> dict:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(name)
+    if pool is not None and not pool["connector"].closed and pool["loop"] is loop:
+        return pool
+
+    stats = pool["stats"] if pool is not None else _new_stats()
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE,
+        use_dns_cache=True,
+        ttl_dns_cache=HTTP_DNS_TTL,
+    )
+    pool = {
+        "loop": loop,
+        "connector": connector,
+        "session": None,
+        "stats": stats,
+        "trace": _trace_config(stats),
+    }
+    _pools[name] = pool
+    return pool
+
+
+def session(
+    *,
+    headers: dict | None = None,
+    timeout: aiohttp.ClientTimeout | None = None,
+    pool: str = "default",
+) -> aiohttp.ClientSession:
+    """A ClientSession on the shared pool; safe to close, the pool stays open."""
+    p = _pool(pool)
+    return aiohttp.ClientSession(
+        connector=p["connector"],
+        connector_owner=False,
+        headers=headers,
+        timeout=timeout or DEFAULT_TIMEOUT,
+        trace_configs=[p["trace"]],
+    )
+
+
+def get_session(pool: str = "default") -> aiohttp.ClientSession:
+    """The pool's long-lived session, for clients that keep one module-level session."""
+    p = _pool(pool)
+    if p["session"] is None or p["session"].closed:
+        p["session"] = session(pool=pool)
+    return p["session"]
+
+
+async def close_all() -> None:
+    """Close every pool's long-lived session and connector (graceful shutdown)."""
+    for name, p in list(_pools.items()):
+        try:
+            if p["session"] is not None and not p["session"].closed:
+                await p["session"].close()
+            if not p["connector"].closed:
+                await p["connector"].close()
+        except Exception as e:
+            print(f"[HTTP] Error closing pool {name}: {e}")
+    # Give SSL transports a moment to shut down cleanly.
+    await asyncio.sleep(0.25)
+
+
+def get_stats() -> dict[str, dict]:
+    """Per-pool counters; connections_per_request well below 1 means keep-alive is working."""
+    result = {}
+    for name, p in _pools.items():
+        s = dict(p["stats"])
+        s["connections_per_request"] = round(s["connections"] / s["requests"], 3) if s["requests"] else None
+        result[name] = s
+    return result
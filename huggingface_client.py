@@ -1,4 +1,5 @@
 import aiohttp
+import http_client
 import os
 import asyncio
 
@@ -16,7 +17,7 @@ async def call_hf(prompt: str, retry_delay=2):
 
     for attempt in range(3):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.post(HF_URL, headers=headers, json=payload) as resp:
                     if resp.status == 200:
                         data = await resp.json()
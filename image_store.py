@@ -0,0 +1,245 @@
+"""
+Byte-budgeted store for the recent images each channel has seen.
+
+Blobs are keyed by SHA-256 of their content, so the same attachment
+referenced from several messages or channels is held once (refcounted).
+Resident blobs are LRU-ordered under IMAGE_STORE_BUDGET_MB; blobs pushed out
+of the budget are spilled to IMAGE_SPILL_DIR (a temp dir by default) and read
+back on demand, or dropped when spilling is disabled or the disk budget is
+full. Inside the event loop spill writes run in a worker thread; until one
+lands the blob is still served from memory. Spilled files are a cache, not
+persistence: close() removes them.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict, deque
+
+from channel_cache import ChannelCache
+
+IMAGES_PER_CHANNEL = 4   # Flux sweet spot for multi-image edits
+IMAGE_STORE_BUDGET = int(os.getenv("IMAGE_STORE_BUDGET_MB", "256")) * 1024 * 1024
+IMAGE_SPILL_BUDGET = int(os.getenv("IMAGE_SPILL_BUDGET_MB", "2048")) * 1024 * 1024
+IMAGE_SPILL_ENABLED = os.getenv("IMAGE_SPILL", "1").strip().lower() not in ("0", "false", "no", "off")
+IMAGE_SPILL_DIR = os.getenv("IMAGE_SPILL_DIR", "").strip() or None
+
+
+class ImageStore:
+    def __init__(
+        self,
+        budget=IMAGE_STORE_BUDGET,
+        spill_budget=IMAGE_SPILL_BUDGET,
+        spill=IMAGE_SPILL_ENABLED,
+        spill_dir=IMAGE_SPILL_DIR,
+        per_channel=IMAGES_PER_CHANNEL,
+    ):
+        self.budget = budget
+        self.spill_budget = spill_budget
+        self.spill = spill
+        self.per_channel = per_channel
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = spill_dir is None
+
+        self._blobs = OrderedDict()     # digest -> bytes, least recently used first
+        self._spilled = OrderedDict()   # digest -> size on disk, oldest first
+        self._spilling = {}             # digest -> bytes whose spill write is in flight
+        self._spill_tasks = set()
+        self._refs = {}                 # digest -> number of channel slots holding it
+        self._resident_bytes = 0
+        self._spilled_bytes = 0
+
+        # Channel -> deque of digests; idle/LRU channels release their images.
+        self._channels = ChannelCache("channel_last_images", on_evict=self._release_channel)
+
+        self.dedup_hits = 0
+        self.spills = 0
+        self.spill_reads = 0
+        self.drops = 0
+
+    # ---------------- CHANNEL API ----------------
+
+    def add(self, channel_id, data: bytes) -> str:
+        """Remember *data* as the newest image for *channel_id*; returns its digest."""
+        digest = self._put(data)
+        slots = self._channels.setdefault(channel_id, deque())
+        slots.append(digest)
+        while len(slots) > self.per_channel:
+            self._release(slots.popleft())
+        return digest
+
+    def recent(self, channel_id) -> list[bytes]:
+        """The channel's images, oldest first; blobs lost to the budget are skipped."""
+        slots = self._channels.get(channel_id)
+        if not slots:
+            return []
+        images = (self.get(digest) for digest in slots)
+        return [data for data in images if data is not None]
+
+    def latest(self, channel_id):
+        slots = self._channels.get(channel_id)
+        return self.get(slots[-1]) if slots else None
+
+    def clear(self, channel_id) -> None:
+        slots = self._channels.pop(channel_id)
+        if slots:
+            self._release_channel(channel_id, slots)
+
+    # ---------------- BLOBS ----------------
+
+    def get(self, digest):
+        data = self._blobs.get(digest)
+        if data is not None:
+            self._blobs.move_to_end(digest)
+            return data
+        if digest in self._spilling:
+            return self._spilling[digest]
+        if digest in self._spilled:
+            return self._read_spilled(digest)
+        return None
+
+    def _put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._refs:
+            self.dedup_hits += 1
+            self._refs[digest] += 1
+            if digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                return digest
+            if digest in self._spilled:
+                return digest
+            # Dropped under budget pressure while still referenced: keep the
+            # fresh copy.
+        else:
+            self._refs[digest] = 1
+        self._blobs[digest] = bytes(data)
+        self._resident_bytes += len(data)
+        self._enforce_budget()
+        return digest
+
+    def _release(self, digest) -> None:
+        refs = self._refs.get(digest, 0) - 1
+        if refs > 0:
+            self._refs[digest] = refs
+            return
+        self._refs.pop(digest, None)
+        data = self._blobs.pop(digest, None)
+        if data is not None:
+            self._resident_bytes -= len(data)
+        if digest in self._spilled:
+            self._unlink(digest)
+
+    def _release_channel(self, _channel_id, slots) -> None:
+        for digest in slots:
+            self._release(digest)
+
+    def _enforce_budget(self) -> None:
+        while self._resident_bytes > self.budget and len(self._blobs) > 1:
+            digest, data = self._blobs.popitem(last=False)
+            self._resident_bytes -= len(data)
+            if not (self.spill and self._spill_blob(digest, data)):
+                self.drops += 1
+
+    # ---------------- DISK SPILL ----------------
+
+    def _path(self, digest) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="codunot-images-")
+        return os.path.join(self._spill_dir, digest)
+
+    def _spill_blob(self, digest, data) -> bool:
+        while self._spilled and self._spilled_bytes + len(data) > self.spill_budget:
+            oldest = next(iter(self._spilled))
+            self._unlink(oldest)
+            self.drops += 1
+        if len(data) > self.spill_budget:
+            return False
+        path = self._path(digest)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                self._write_blob(path, data)
+            except OSError as e:
+                print(f"[IMAGE STORE] Spill failed for {digest[:12]}: {e}")
+                return False
+        else:
+            self._spilling[digest] = data
+            task = loop.create_task(self._spill_async(digest, path, data))
+            self._spill_tasks.add(task)
+            task.add_done_callback(self._spill_tasks.discard)
+        self._spilled[digest] = len(data)
+        self._spilled_bytes += len(data)
+        self.spills += 1
+        return True
+
+    @staticmethod
+    def _write_blob(path, data) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _spill_async(self, digest, path, data) -> None:
+        try:
+            await asyncio.to_thread(self._write_blob, path, data)
+        except OSError as e:
+            print(f"[IMAGE STORE] Spill failed for {digest[:12]}: {e}")
+            if self._spilling.get(digest) is data:
+                self._unlink(digest)
+                self.drops += 1
+            return
+        if self._spilling.get(digest) is data:
+            del self._spilling[digest]
+        elif digest not in self._spilled:
+            # Released while the write was in flight.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _read_spilled(self, digest):
+        try:
+            with open(self._path(digest), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print(f"[IMAGE STORE] Spilled image {digest[:12]} unreadable: {e}")
+            self._unlink(digest)
+            return None
+        self.spill_reads += 1
+        return data
+
+    def _unlink(self, digest) -> None:
+        self._spilling.pop(digest, None)
+        self._spilled_bytes -= self._spilled.pop(digest, 0)
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Remove spilled blobs (and the spill dir if we created it)."""
+        for digest in list(self._spilled):
+            self._unlink(digest)
+        if self._owns_spill_dir and self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    # ---------------- METRICS ----------------
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "blobs": len(self._refs),
+            "resident_bytes": self._resident_bytes,
+            "budget_bytes": self.budget,
+            "spilled_blobs": len(self._spilled),
+            "spilled_bytes": self._spilled_bytes,
+            "dedup_hits": self.dedup_hits,
+            "spills": self.spills,
+            "spill_reads": self.spill_reads,
+            "drops": self.drops,
+        }
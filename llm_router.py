@@ -0,0 +1,280 @@
+"""
+Multi-provider chat completion router.
+
+    result = await llm_router.complete(messages, "openai/gpt-oss-120b", fallbacks=[...])
+    result.text, result.model, result.provider
+
+Logical model names (the ids users pick with /model) map to one or more
+provider endpoints in ROUTES; only providers with an API key configured
+(and listed in LLM_ROUTER_PROVIDERS, if set) are used. For each call:
+
+  * endpoints are tried in order: the requested model's routes first, then
+    the fallback models' routes, healthiest first (model_health.score);
+    callers keep fallbacks within the requested model's family
+    (same_family), so a model picked with /model is never silently swapped
+    for an unrelated one;
+    endpoints whose breaker is open are skipped;
+  * a failure (exception, empty reply, rate limit after retries) moves on to
+    the next endpoint straight away;
+  * if the first request is still running after its endpoint's p95 latency
+    (clamped to HEDGE_MIN_DELAY..HEDGE_MAX_DELAY), a backup request is sent
+    to the next endpoint on a *different* provider, and whichever answers
+    first wins; the other is cancelled.
+"""
+
+import asyncio
+import os
+from typing import NamedTuple
+
+import model_health
+from cerebras_client import CEREBRAS_API_KEY, call_cerebras
+from google_ai_studio_client import GOOGLE_AI_STUDIO_API_KEY, call_google_ai_studio
+from groq_client import GROQ_API_KEY, call_groq
+from openrouter_client import OPENROUTER_API_KEY, call_openrouter
+from replicate_client import REPLICATE_API_TOKEN, call_replicate
+
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.5"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "10"))
+HEDGE_DEFAULT_DELAY = 4.0   # no latency samples yet
+MAX_ATTEMPTS = int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", "4"))
+
+# logical model -> [(provider, provider model id)], preferred first
+ROUTES = {
+    "openai/gpt-oss-120b": [
+        ("groq", "openai/gpt-oss-120b"),
+        ("cerebras", "gpt-oss-120b"),
+        ("openrouter", "openai/gpt-oss-120b"),
+        ("replicate", "prunaai/gpt-oss-120b-fast:e994aeeb46519a8ed196fe72650b4d522280dabd2b67129580d164088133f8ff"),
+    ],
+    "moonshotai/kimi-k2-instruct": [
+        ("groq", "moonshotai/kimi-k2-instruct"),
+        ("openrouter", "moonshotai/kimi-k2"),
+    ],
+    "allam-2-7b": [
+        ("groq", "allam-2-7b"),
+    ],
+    "qwen/qwen3-32b": [
+        ("groq", "qwen/qwen3-32b"),
+        ("cerebras", "qwen-3-32b"),
+        ("openrouter", "qwen/qwen3-32b"),
+    ],
+    "llama-3.3-70b-versatile": [
+        ("groq", "llama-3.3-70b-versatile"),
+        ("cerebras", "llama-3.3-70b"),
+        ("openrouter", "meta-llama/llama-3.3-70b-instruct"),
+    ],
+    "meta-llama/llama-4-scout-17b-16e-instruct": [
+        ("groq", "meta-llama/llama-4-scout-17b-16e-instruct"),
+        ("openrouter", "meta-llama/llama-4-scout"),
+    ],
+    "llama-3.1-8b-instant": [
+        ("groq", "llama-3.1-8b-instant"),
+        ("cerebras", "llama3.1-8b"),
+        ("openrouter", "meta-llama/llama-3.1-8b-instruct"),
+    ],
+    "gemini-2.5-flash-lite": [
+        ("google", "gemini-2.5-flash-lite"),
+    ],
+}
+
+
+# Logical models that can stand in for each other; a model not listed is a
+# family of its own (its ROUTES entry already covers the other providers).
+FAMILIES = {
+    "llama-3.3-70b-versatile": "llama",
+    "meta-llama/llama-4-scout-17b-16e-instruct": "llama",
+    "llama-3.1-8b-instant": "llama",
+}
+
+
+def same_family(a: str, b: str) -> bool:
+    return FAMILIES.get(a, a) == FAMILIES.get(b, b)
+
+
+def _flatten(prompt) -> tuple[str, str | None]:
+    """(prompt, system prompt) for providers that only take plain text."""
+    if not isinstance(prompt, list):
+        return prompt, None
+    system = "\n\n".join(m["content"] for m in prompt if m["role"] == "system") or None
+    turns = [
+        m["content"] if m["role"] == "user" else f"Assistant: {m['content']}"
+        for m in prompt if m["role"] != "system"
+    ]
+    return "\n\n".join(turns), system
+
+
+async def _replicate(prompt, model, temperature, retries):
+    text, system = _flatten(prompt)
+    return await call_replicate(text, model=model, temperature=temperature, system_prompt=system)
+
+
+async def _cerebras(prompt, model, temperature, retries):
+    return await call_cerebras(prompt, model=model, temperature=temperature, retries=retries)
+
+
+async def _openrouter(prompt, model, temperature, retries):
+    return await call_openrouter(prompt, model=model, temperature=temperature, retries=retries)
+
+
+async def _google(prompt, model, temperature, retries):
+    return await call_google_ai_studio(prompt, model=model, temperature=temperature, retries=retries)
+
+
+async def _groq(prompt, model, temperature, retries):
+    return await call_groq(prompt, model=model, temperature=temperature, retries=retries)
+
+
+BACKENDS = {
+    "groq": (_groq, GROQ_API_KEY),
+    "openrouter": (_openrouter, OPENROUTER_API_KEY),
+    "cerebras": (_cerebras, CEREBRAS_API_KEY),
+    "google": (_google, GOOGLE_AI_STUDIO_API_KEY),
+    "replicate": (_replicate, REPLICATE_API_TOKEN),
+}
+
+_enabled_env = {p.strip() for p in os.getenv("LLM_ROUTER_PROVIDERS", "").split(",") if p.strip()}
+ENABLED_PROVIDERS = {
+    provider for provider, (_, key) in BACKENDS.items()
+    if key and (not _enabled_env or provider in _enabled_env)
+}
+
+_stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "exhausted": 0, "wins": {}}
+
+
+class Completion(NamedTuple):
+    text: str
+    model: str          # logical model that answered
+    provider: str
+    provider_model: str
+
+
+def routes(model: str) -> list[tuple[str, str]]:
+    """Enabled (provider, provider model) endpoints for a logical model."""
+    return [(p, m) for p, m in ROUTES.get(model, [("groq", model)]) if p in ENABLED_PROVIDERS]
+
+
+def plan(model: str, fallbacks=()) -> list[tuple[str, str, str]]:
+    """
+    (logical model, provider, provider model) endpoints to try, in order.
+    Open breakers are left out.
+    """
+    def usable(logical):
+        return [(logical, p, m) for p, m in routes(logical) if model_health.available(p, m)]
+
+    def best(endpoints):
+        return min(model_health.score(p, m) for _, p, m in endpoints)
+
+    ordered = usable(model)
+    others = [eps for eps in (usable(f) for f in fallbacks if f != model) if eps]
+    for endpoints in sorted(others, key=best):
+        ordered.extend(endpoints)
+    return ordered
+
+
+def hedge_delay(provider: str, provider_model: str) -> float:
+    p95 = model_health.get(provider, provider_model).percentile(0.95)
+    if p95 is None:
+        return HEDGE_DEFAULT_DELAY
+    return min(max(p95 / 1000, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+
+async def complete(
+    prompt: str | list[dict],
+    model: str,
+    temperature: float = 0.7,
+    fallbacks=(),
+    prompt_for=None,
+    hedge: bool = True,
+) -> Completion | None:
+    """
+    Complete *prompt* with the logical *model*, failing over to its other
+    providers and then to *fallbacks*. prompt_for(logical_model) may adapt
+    the prompt per model. Returns None if every endpoint came back empty;
+    re-raises the last error if every endpoint failed with one.
+    """
+    _stats["calls"] += 1
+    queue = plan(model, fallbacks)
+    forced = not queue
+    if forced:
+        # Every breaker is open; trying the requested model beats failing outright.
+        print(f"[ROUTER] No healthy endpoint for {model}, trying it anyway")
+        queue = [(model, p, m) for p, m in routes(model)][:1]
+    # A single endpoint keeps the clients' own retries; with alternatives, fail over instead.
+    retries = 2 if len(queue) == 1 else 1
+
+    pending: dict[asyncio.Task, tuple[str, str, str]] = {}
+    attempts = 0
+    hedged = False
+    last_error = None
+
+    def launch(index=0):
+        """Start the first claimable endpoint from queue[index:]; returns its task or None."""
+        nonlocal attempts
+        while index < len(queue):
+            logical, provider, provider_model = endpoint = queue.pop(index)
+            if forced or model_health.allow(provider, provider_model):
+                request = prompt_for(logical) if prompt_for else prompt
+                backend = BACKENDS[provider][0]
+                task = asyncio.ensure_future(backend(request, provider_model, temperature, retries))
+                pending[task] = endpoint
+                attempts += 1
+                return task
+        return None
+
+    def hedge_target():
+        """Index of the next queued endpoint on a different provider, or None."""
+        running = {provider for _, provider, _ in pending.values()}
+        for i, (_, provider, _) in enumerate(queue):
+            if provider not in running:
+                return i
+        return None
+
+    hedge_task = None
+    launch()
+    try:
+        while pending:
+            timeout = None
+            if hedge and not hedged and len(pending) == 1 and attempts < MAX_ATTEMPTS and hedge_target() is not None:
+                _, provider, provider_model = next(iter(pending.values()))
+                timeout = hedge_delay(provider, provider_model)
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                hedged = True
+                hedge_task = launch(hedge_target())
+                if hedge_task is not None:
+                    _stats["hedges"] += 1
+                    _, provider, provider_model = pending[hedge_task]
+                    print(f"[ROUTER] {model}: no reply after {timeout:.1f}s, hedging to {provider}/{provider_model}")
+                continue
+
+            for task in done:
+                logical, provider, provider_model = pending.pop(task)
+                try:
+                    text = task.result()
+                except Exception as e:
+                    print(f"[ROUTER] {provider}/{provider_model} failed: {e}")
+                    last_error = e
+                    text = None
+                if text:
+                    if task is hedge_task:
+                        _stats["hedge_wins"] += 1
+                    _stats["wins"][provider] = _stats["wins"].get(provider, 0) + 1
+                    return Completion(text, logical, provider, provider_model)
+
+            if not pending and queue and attempts < MAX_ATTEMPTS:
+                _stats["failovers"] += 1
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    _stats["exhausted"] += 1
+    if last_error is not None:
+        raise last_error
+    return None
+
+
+def get_stats() -> dict:
+    return {**_stats, "wins": dict(_stats["wins"]), "providers": sorted(ENABLED_PROVIDERS)}
@@ -6,7 +6,7 @@ import json
 import time
 import hmac
 import hashlib
-import httpx
+import http_client
 from pathlib import Path
 
 app = FastAPI()
@@ -19,6 +19,11 @@ VOTE_DURATION_SECONDS = 60 * 60 * 12
 
 PENDING_TRANSCRIPTIONS: dict[str, dict] = {}
 
+
+@app.on_event("shutdown")
+async def close_http_pools():
+    await http_client.close_all()
+
 def load_votes():
     if not VOTE_FILE.exists():
         return {}
@@ -53,9 +58,10 @@ async def send_discord_message(channel_id: int, content: str):
         chunks.append(content[:split_at])
         content = content[split_at:].lstrip()
 
-    async with httpx.AsyncClient() as client:
+    async with http_client.session(headers=headers) as client:
         for chunk in chunks:
-            await client.post(url, headers=headers, json={"content": chunk})
+            async with client.post(url, json={"content": chunk}):
+                pass
 
 
 async def send_discord_dm(user_id: int, content: str):
@@ -63,17 +69,16 @@ async def send_discord_dm(user_id: int, content: str):
         "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
         "Content-Type": "application/json",
     }
-    async with httpx.AsyncClient() as client:
-        dm_resp = await client.post(
+    async with http_client.session(headers=headers) as client:
+        async with client.post(
             "https://discord.com/api/v10/users/@me/channels",
-            headers=headers,
             json={"recipient_id": str(user_id)},
-        )
-        if dm_resp.status_code >= 300:
-            print(f"[Webhook] Failed to create DM channel for user {user_id}: {dm_resp.status_code}")
-            return
+        ) as dm_resp:
+            if dm_resp.status >= 300:
+                print(f"[Webhook] Failed to create DM channel for user {user_id}: {dm_resp.status}")
+                return
 
-        dm_channel_id = dm_resp.json().get("id")
+            dm_channel_id = (await dm_resp.json()).get("id")
         if not dm_channel_id:
             print(f"[Webhook] DM channel missing for user {user_id}")
             return
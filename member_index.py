@@ -0,0 +1,116 @@
+"""
+Per-guild lowercase name -> member index for mention rewriting.
+
+rewrite_mentions turns "@name" in a reply into a real mention. Scanning
+guild.members for every match is O(matches x members), which hurts in
+large guilds, so each guild gets a dict from lowercased username and
+display name to member ids:
+
+    member = member_index.lookup(guild, "some name")
+
+An index is built on a guild's first lookup and then kept current from the
+member join / update / leave events (see the EVENTS section of groq_bot).
+An index built before the guild finished chunking is rebuilt, at most once
+per INDEX_REBUILD_INTERVAL seconds, until the guild reports chunked.
+"""
+
+import time
+
+INDEX_REBUILD_INTERVAL = 60.0
+
+
+class _GuildIndex:
+    def __init__(self, guild):
+        self.by_name: dict[str, dict[int, None]] = {}   # name -> member ids, first indexed first
+        self.names: dict[int, tuple[str, ...]] = {}    # member id -> its indexed names
+        self.complete = guild.chunked
+        self.built = time.monotonic()
+        for member in guild.members:
+            self.add(member)
+
+    def add(self, member):
+        self.remove(member.id)
+        names = tuple({member.name.lower(), member.display_name.lower()})
+        self.names[member.id] = names
+        for name in names:
+            self.by_name.setdefault(name, {})[member.id] = None
+
+    def remove(self, member_id: int):
+        for name in self.names.pop(member_id, ()):
+            ids = self.by_name.get(name)
+            if ids is not None:
+                ids.pop(member_id, None)
+                if not ids:
+                    del self.by_name[name]
+
+    def lookup(self, name: str) -> int | None:
+        ids = self.by_name.get(name)
+        return next(iter(ids)) if ids else None
+
+
+_guilds: dict[int, _GuildIndex] = {}
+_stats = {"builds": 0, "lookups": 0, "hits": 0}
+
+
+def _index(guild) -> _GuildIndex:
+    index = _guilds.get(guild.id)
+    stale = index is not None and not index.complete and time.monotonic() - index.built > INDEX_REBUILD_INTERVAL
+    if index is None or stale:
+        index = _guilds[guild.id] = _GuildIndex(guild)
+        _stats["builds"] += 1
+    return index
+
+
+def lookup(guild, name: str):
+    """Member of *guild* whose username or display name is *name* (case-insensitive), or None."""
+    _stats["lookups"] += 1
+    member_id = _index(guild).lookup(name.lower())
+    if member_id is None:
+        return None
+    member = guild.get_member(member_id)
+    if member is not None:
+        _stats["hits"] += 1
+    return member
+
+
+# ---------------- EVENTS ----------------
+# Only guilds that already have an index are touched; the rest build on demand.
+
+def member_joined(member):
+    index = _guilds.get(member.guild.id)
+    if index is not None:
+        index.add(member)
+
+
+def member_updated(before, after):
+    if before.name != after.name or before.display_name != after.display_name:
+        member_joined(after)
+
+
+def member_left(member):
+    index = _guilds.get(member.guild.id)
+    if index is not None:
+        index.remove(member.id)
+
+
+def user_updated(before, after):
+    """A username / global name change applies to every guild the user is in."""
+    for index in _guilds.values():
+        if after.id in index.names:
+            index.remove(after.id)
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member is not None:
+            member_joined(member)
+
+
+def guild_left(guild):
+    _guilds.pop(guild.id, None)
+
+
+def get_stats() -> dict:
+    return {
+        **_stats,
+        "guilds": len(_guilds),
+        "names": sum(len(index.by_name) for index in _guilds.values()),
+    }
@@ -1,121 +1,465 @@
 import os
 import json
-from datetime import datetime
-from encryption import save_encrypted, load_encrypted
+import re
+import sys
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from encryption import load_encrypted, encrypt_data, decrypt_data, run_crypto
+from channel_cache import ChannelCache
+import persistence
+
+# Snapshot + append-only journal:
+#   <file_path>            full encrypted snapshot (rewritten only on compaction),
+#                          cold channels included, so it is all a restart needs
+#   <file_path>.journal    one Fernet token per line, one record per mutation
+#   <file_path>.cold/      one encrypted file per channel evicted from the LRU
+JOURNAL_SUFFIX = ".journal"
+COMPACTING_SUFFIX = ".compacting"
+COLD_SUFFIX = ".cold"
+COMPACT_EVERY = 500          # journal records before a background snapshot rewrite
+COMPACT_INTERVAL = 300       # seconds between compaction checks
+
+DEFAULT_MODEL = "openai/gpt-oss-120b"
+
+
+def _to_epoch(ts):
+    """Older snapshots/journals stored naive UTC isoformat strings."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        try:
+            return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class ChannelState:
+    """
+    Per-channel history ring buffer plus channel settings.
+
+    messages/timestamps are fixed-capacity deques, so appends never
+    reallocate; timestamps are epoch floats so snapshots serialize them as-is.
+    seq is the last journal record applied, so replay never double-applies a
+    record to state that was already spilled to or rehydrated from a cold file.
+    """
+    __slots__ = ("messages", "timestamps", "roast_target", "mode", "model", "seq")
+
+    def __init__(self, limit, roast_target=None, mode="funny", model=DEFAULT_MODEL, seq=0):
+        self.messages = deque(maxlen=limit)
+        self.timestamps = deque(maxlen=limit)
+        self.roast_target = roast_target
+        self.mode = mode
+        self.model = model
+        self.seq = seq
+
+    def append(self, entry, ts):
+        self.messages.append(entry)
+        self.timestamps.append(ts)
+
+    def clear(self):
+        self.messages.clear()
+        self.timestamps.clear()
+
+    def to_dict(self):
+        return {
+            "messages":     list(self.messages),
+            "timestamps":   list(self.timestamps),
+            "roast_target": self.roast_target,
+            "mode":         self.mode,
+            "model":        self.model,
+            "seq":          self.seq,
+        }
+
+    def approx_bytes(self):
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.messages) + sys.getsizeof(self.timestamps)
+            + sum(sys.getsizeof(m) for m in self.messages)
+            + 24 * len(self.timestamps)
+        )
+
+    @classmethod
+    def from_dict(cls, data, limit):
+        state = cls(
+            limit,
+            roast_target=data.get("roast_target"),
+            mode=data.get("mode", "funny"),
+            model=data.get("model", DEFAULT_MODEL),
+            seq=data.get("seq", 0),
+        )
+        state.messages.extend(data.get("messages", []))
+        state.timestamps.extend(_to_epoch(t) for t in data.get("timestamps", []))
+        return state
 
 
 class MemoryManager:
-    def __init__(self, limit=15, file_path=None):
+    def __init__(self, limit=15, file_path=None, compact_every=COMPACT_EVERY, autoload=True):
         self.limit = limit
         self.file_path = file_path
-        self.memory = {}
+        self.compact_every = compact_every
         self.flags = {}
+        # Resident channels are LRU/idle bounded; cold ones live in cold_dir
+        # and are rehydrated on the next access.
+        self.memory = ChannelCache(
+            "memory",
+            loader=self._load_cold if file_path else None,
+            on_evict=self._spill if file_path else None,
+            sizer=ChannelState.approx_bytes,
+        )
+        self.cold_dir = f"{file_path}{COLD_SUFFIX}" if file_path else None
+        self._cold_ids = set()     # _cold_key()s with a file in cold_dir
+        self._cold_pending = {}     # chan_id -> state spilled but not yet on disk
+
+        self.journal_path = f"{file_path}{JOURNAL_SUFFIX}" if file_path else None
+        self._pending = []          # records applied in memory but not yet on disk
+        self._seq = 0               # sequence number of the last applied record
+        self._journal_records = 0   # records currently in the journal file
+        self._compacting = False
+        self._covered = []          # pending records folded into an in-flight snapshot
+        self._loading = False
 
         if self.file_path:
-            self._load()
+            self._store_name = f"memory:{os.path.basename(self.file_path)}"
+            persistence.register_store(
+                self._store_name, self.journal_path,
+                self._take_pending, writer=self._append_frames, encrypted=True,
+            )
+            if autoload:
+                self.load()
 
     # ---------------- LOAD / SAVE ----------------
 
+    def load(self):
+        """Read the snapshot and replay the journal; call once, before any mutation."""
+        self._loading = True
+        try:
+            self._load()
+        finally:
+            self._loading = False
+
     def _load(self):
-        if not self.file_path or not os.path.exists(self.file_path):
-            return
+        snapshot_seq = 0
+        if os.path.isdir(self.cold_dir):
+            self._cold_ids = {
+                name[:-len(".bin")] for name in os.listdir(self.cold_dir) if name.endswith(".bin")
+            }
+        if os.path.exists(self.file_path):
+            try:
+                raw = load_encrypted(self.file_path)
+                data = json.loads(raw)
+                for chan_id, chan in data.get("memory", {}).items():
+                    self.memory[chan_id] = ChannelState.from_dict(chan, self.limit)
+                self._restore_cold(data.get("cold", {}))
+                self.flags = data.get("flags", {})
+                snapshot_seq = data.get("seq", 0)
+            except Exception as e:
+                print(f"[MEMORY] Load error: {e}")
+                for chan_id in self.memory.keys():
+                    self.memory.discard(chan_id)
+                self.flags = {}
+
+        self._seq = snapshot_seq
+        # A leftover .compacting file means we crashed mid-compaction; its
+        # records are older than the live journal, so replay it first.
+        for path in (self.journal_path + COMPACTING_SUFFIX, self.journal_path):
+            replayed = self._replay(path, snapshot_seq)
+            if path == self.journal_path:
+                self._journal_records = replayed
+
+    def _replay(self, path, snapshot_seq):
+        if not os.path.exists(path):
+            return 0
+        count = 0
         try:
-            raw = load_encrypted(self.file_path)
-            data = json.loads(raw)
-            self.memory = data.get("memory", {})
-            self.flags = data.get("flags", {})
+            with open(path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(decrypt_data(line))
+                    except Exception as e:
+                        # A torn final frame from a crash mid-append; everything
+                        # before it is intact.
+                        print(f"[MEMORY] Journal replay stopped at corrupt frame: {e}")
+                        break
+                    count += 1
+                    seq = record.get("n", 0)
+                    if seq <= snapshot_seq:
+                        continue
+                    self._apply(record)
+                    self._seq = max(self._seq, seq)
         except Exception as e:
-            print(f"[MEMORY] Load error: {e}")
-            self.memory = {}
-            self.flags = {}
+            print(f"[MEMORY] Journal load error: {e}")
+        return count
 
     def persist(self):
-        if not self.file_path:
+        """Schedule the pending mutation records for a (coalesced) journal append."""
+        if not self.file_path or not self._pending:
+            return
+        persistence.mark_dirty(self._store_name)
+
+    def _take_pending(self):
+        records, self._pending = self._pending, []
+        return records
+
+    def _append_frames(self, records):
+        if not records:
             return
+        frames = b"".join(
+            encrypt_data(json.dumps(r, separators=(",", ":"))) + b"\n"
+            for r in records
+        )
+        with open(self.journal_path, "ab") as f:
+            f.write(frames)
+        self._journal_records += len(records)
+
+    def _snapshot(self):
+        """Resident channels (and spills not on disk yet), plus the cold keys to read back in."""
+        serializable = {chan_id: state.to_dict() for chan_id, state in self._cold_pending.items()}
+        serializable.update((chan_id, state.to_dict()) for chan_id, state in self.memory.items())
+        resident = {self._cold_key(chan_id) for chan_id in serializable}
+        data = {"memory": serializable, "flags": self.flags, "seq": self._seq}
+        return data, sorted(self._cold_ids - resident)
+
+    def _begin_compaction(self):
+        """
+        Runs on the caller's thread: capture the snapshot and rotate the
+        journal so new appends go to a fresh file. Records still pending (or
+        mid-append in a worker thread) are covered by the snapshot's seq and
+        skipped on replay.
+        """
+        self._covered = self._take_pending()
+        data, cold_keys = self._snapshot()
+        rotated = None
+        if os.path.exists(self.journal_path):
+            rotated = self.journal_path + COMPACTING_SUFFIX
+            os.replace(self.journal_path, rotated)
+        self._journal_records = 0
+        return data, cold_keys, rotated
+
+    def _finish_compaction(self, data, cold_keys, rotated):
+        # The cold directory is not kept between deploys, so cold channels are
+        # folded back into the snapshot (read here, off the event loop).
+        cold = {}
+        for key in cold_keys:
+            try:
+                cold[key] = json.loads(load_encrypted(os.path.join(self.cold_dir, f"{key}.bin")))
+            except Exception as e:
+                print(f"[MEMORY] Cold read error for {key}: {e}")
+        data["cold"] = cold
+        persistence.atomic_write(self.file_path, json.dumps(data), encrypted=True)
+        if rotated and os.path.exists(rotated):
+            os.remove(rotated)
+
+    def compact(self):
+        """Rewrite the snapshot and drop the journal (blocking)."""
+        if not self.file_path or self._compacting:
+            return
+        self._compacting = True
         try:
-            # timestamps are datetime objects in memory — convert to strings for JSON
-            serializable = {}
-            for chan_id, data in self.memory.items():
-                serializable[chan_id] = {
-                    "messages":     data.get("messages", []),
-                    "timestamps":   [
-                        t.isoformat() if isinstance(t, datetime) else t
-                        for t in data.get("timestamps", [])
-                    ],
-                    "roast_target": data.get("roast_target"),
-                    "mode":         data.get("mode", "funny"),
-                    "model":        data.get("model", "openai/gpt-oss-120b"),
-                }
-            save_encrypted(self.file_path, json.dumps({"memory": serializable, "flags": self.flags}))
+            self._finish_compaction(*self._begin_compaction())
         except Exception as e:
-            print(f"[MEMORY] Save error: {e}")
+            print(f"[MEMORY] Compaction error: {e}")
+            self._requeue_covered()
+        finally:
+            self._compacting = False
+
+    async def compact_async(self):
+        """Rewrite the snapshot with encryption and file IO off the event loop."""
+        if not self.file_path or self._compacting:
+            return
+        self._compacting = True
+        try:
+            await run_crypto(self._finish_compaction, *self._begin_compaction())
+            print(f"[MEMORY] Compacted journal into snapshot (seq={self._seq})")
+        except Exception as e:
+            print(f"[MEMORY] Compaction error: {e}")
+            self._requeue_covered()
+        finally:
+            self._compacting = False
+
+    def _requeue_covered(self):
+        # The snapshot never landed, so records it would have covered must
+        # still reach the journal.
+        self._pending = self._covered + self._pending
+        self._covered = []
+        self.persist()
+
+    async def compaction_loop(self, interval=COMPACT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            if self._journal_records + len(self._pending) >= self.compact_every:
+                await self.compact_async()
+
+    # ---------------- COLD CHANNELS ----------------
+
+    @staticmethod
+    def _cold_key(channel_id):
+        return re.sub(r"[^\w-]", "_", str(channel_id))
+
+    def _cold_path(self, channel_id):
+        return os.path.join(self.cold_dir, f"{self._cold_key(channel_id)}.bin")
+
+    def _load_cold(self, channel_id):
+        state = self._cold_pending.get(channel_id)
+        if state is not None:
+            return state
+        if self._cold_key(channel_id) not in self._cold_ids:
+            return None
+        try:
+            data = json.loads(load_encrypted(self._cold_path(channel_id)))
+            return ChannelState.from_dict(data, self.limit)
+        except Exception as e:
+            print(f"[MEMORY] Cold load error for {channel_id}: {e}")
+            return None
+
+    def _restore_cold(self, cold):
+        """Write the snapshot's cold channels back out, e.g. on a fresh checkout without cold_dir."""
+        for key, chan in cold.items():
+            if key in self._cold_ids:
+                continue   # the file on disk is at least as new
+            try:
+                self._write_cold(key, json.dumps(chan))
+                self._cold_ids.add(key)
+            except Exception as e:
+                print(f"[MEMORY] Cold restore error for {key}: {e}")
+
+    def _spill(self, channel_id, state):
+        self._cold_pending[channel_id] = state
+        payload = json.dumps(state.to_dict())
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_cold(channel_id, payload)
+            self._finish_spill(channel_id, state)
+            return
+        loop.create_task(self._spill_async(channel_id, state, payload))
+
+    async def _spill_async(self, channel_id, state, payload):
+        try:
+            await run_crypto(self._write_cold, channel_id, payload)
+        except Exception as e:
+            print(f"[MEMORY] Cold write error for {channel_id}: {e}")
+            return
+        self._finish_spill(channel_id, state)
+
+    def _write_cold(self, channel_id, payload):
+        os.makedirs(self.cold_dir, exist_ok=True)
+        persistence.atomic_write(self._cold_path(channel_id), payload, encrypted=True)
+
+    def _finish_spill(self, channel_id, state):
+        if self._cold_pending.get(channel_id) is state:
+            del self._cold_pending[channel_id]
+        self._cold_ids.add(self._cold_key(channel_id))
+        # Only journal the eviction if the channel was not rehydrated while the
+        # write was in flight; otherwise replay must keep it resident. Evictions
+        # during replay are not journaled: the records are already on disk.
+        if channel_id not in self.memory and not self._loading:
+            self._record("evict", c=channel_id)
+            self.persist()
+
+    # ---------------- JOURNAL RECORDS ----------------
+
+    def _record(self, op, **fields):
+        self._seq += 1
+        record = {"n": self._seq, "op": op, **fields}
+        # Queue before applying: applying can evict another channel, whose
+        # "evict" record must land after this one.
+        if self.file_path:
+            self._pending.append(record)
+        self._apply(record)
+
+    def _apply(self, record):
+        op = record.get("op")
+
+        if op == "flag":
+            self.flags[record["k"]] = True
+            return
+        if op == "evict":
+            # Live evictions already left memory; on replay the cold file
+            # holds the state as of this record.
+            self.memory.discard(record.get("c"))
+            return
+
+        state = self._ensure_channel(record.get("c"))
+        seq = record.get("n", 0)
+        if seq and seq <= state.seq:
+            return
+        state.seq = seq
+        if op == "msg":
+            state.append(record["e"], _to_epoch(record.get("t")))
+        elif op == "roast":
+            state.roast_target = record.get("v")
+        elif op == "mode":
+            state.mode = record.get("v")
+        elif op == "model":
+            state.model = record.get("v")
+        elif op == "clear":
+            state.clear()
 
     # ---------------- MESSAGE LOGGING ----------------
 
     def add_message(self, channel_id, user, message):
-        self._ensure_channel(channel_id)
         entry = f"{user}: {message}"
-        self.memory[channel_id]["messages"].append(entry)
-        self.memory[channel_id]["messages"] = self.memory[channel_id]["messages"][-self.limit:]
-        self.memory[channel_id]["timestamps"].append(datetime.utcnow())
-        self.memory[channel_id]["timestamps"] = self.memory[channel_id]["timestamps"][-self.limit:]
+        self._record("msg", c=channel_id, e=entry, t=time.time())
 
     def get_recent_flat(self, channel_id, n):
-        if channel_id in self.memory:
-            return self.memory[channel_id]["messages"][-n:]
-        return []
+        state = self.memory.get(channel_id)
+        if state is None or n <= 0:
+            return []
+        messages = state.messages
+        if n >= len(messages):
+            return list(messages)
+        return [messages[i] for i in range(len(messages) - n, len(messages))]
 
     def get_last_timestamp(self, channel_id):
-        if channel_id in self.memory and self.memory[channel_id]["timestamps"]:
-            return self.memory[channel_id]["timestamps"][-1]
+        state = self.memory.get(channel_id)
+        if state is not None and state.timestamps:
+            return state.timestamps[-1]
         return None
 
     # ---------------- ROAST TARGET ----------------
 
     def set_roast_target(self, channel_id, target_name):
-        self._ensure_channel(channel_id)
-        self.memory[channel_id]["roast_target"] = target_name
+        self._record("roast", c=channel_id, v=target_name)
 
     def get_roast_target(self, channel_id):
-        if channel_id in self.memory:
-            return self.memory[channel_id]["roast_target"]
-        return None
+        state = self.memory.get(channel_id)
+        return state.roast_target if state is not None else None
 
     def remove_roast_target(self, channel_id):
-        if channel_id in self.memory:
-            self.memory[channel_id]["roast_target"] = None
+        if self.memory.get(channel_id) is not None:
+            self._record("roast", c=channel_id, v=None)
 
     # ---------------- CHANNEL MODE ----------------
 
     def save_channel_mode(self, channel_id, mode):
-        self._ensure_channel(channel_id)
-        self.memory[channel_id]["mode"] = mode
+        self._record("mode", c=channel_id, v=mode)
 
     def get_channel_mode(self, channel_id):
-        if channel_id in self.memory:
-            return self.memory[channel_id].get("mode")
-        return None
+        state = self.memory.get(channel_id)
+        return state.mode if state is not None else None
 
     # ---------------- CHANNEL MODEL ----------------
 
     def save_channel_model(self, channel_id, model):
-        self._ensure_channel(channel_id)
-        self.memory[channel_id]["model"] = model
+        self._record("model", c=channel_id, v=model)
 
     def get_channel_model(self, channel_id):
-        if channel_id in self.memory:
-            return self.memory[channel_id].get("model", "openai/gpt-oss-120b")
-        return "openai/gpt-oss-120b"
+        state = self.memory.get(channel_id)
+        return state.model if state is not None else DEFAULT_MODEL
 
     def clear_channel_messages(self, channel_id):
-        self._ensure_channel(channel_id)
-        self.memory[channel_id]["messages"] = []
-        self.memory[channel_id]["timestamps"] = []
+        self._record("clear", c=channel_id)
 
     # ---------------- FLAGS ----------------
 
     def set_flag(self, key):
-        self.flags[key] = True
+        self._record("flag", k=key)
 
     def get_flag(self, key):
         return self.flags.get(key, False)
@@ -123,14 +467,11 @@ class MemoryManager:
     # ---------------- INTERNAL ----------------
 
     def _ensure_channel(self, channel_id):
-        if channel_id not in self.memory:
-            self.memory[channel_id] = {
-                "messages":     [],
-                "timestamps":   [],
-                "roast_target": None,
-                "mode":         "funny",
-                "model":        "openai/gpt-oss-120b",
-            }
+        state = self.memory.get(channel_id)
+        if state is None:
+            state = self.memory[channel_id] = ChannelState(self.limit)
+        return state
 
     async def close(self):
-        self.persist()
+        """Fold the journal into the snapshot, which is the only file kept between runs."""
+        await self.compact_async()
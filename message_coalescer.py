@@ -0,0 +1,148 @@
+"""
+Per-channel debounce for chat turns.
+
+People often send a thought as several quick lines ("yo", "codunot",
+"what's 2+2"). Instead of one reply per line, lines from the same author
+in a channel are collected until COALESCE_WINDOW seconds pass without a new
+one (at most COALESCE_MAX_DELAY after the first, or COALESCE_MAX_MESSAGES
+lines), then handed on as one turn:
+
+    coalescer.add(chan_id, message, content, dispatch)   # dispatch(turn) once the window closes
+    ...
+    await coalescer.run(turn, lambda: generate_and_reply(chan_id, turn.message, turn.content, mode))
+
+If the author adds a line while the previous turn's reply is still being
+prepared, that reply is cancelled and its lines are merged into the new
+turn (turn.resubmitted is set, so callers can skip per-turn charges they
+already made). Reply handlers call replying() right before they start sending;
+from then on the turn is left alone and the new line becomes a turn of its
+own.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "1.0"))
+COALESCE_MAX_DELAY = float(os.getenv("COALESCE_MAX_DELAY", "4"))
+COALESCE_MAX_MESSAGES = int(os.getenv("COALESCE_MAX_MESSAGES", "6"))
+
+current_turn = contextvars.ContextVar("chat_turn", default=None)
+
+
+class Turn:
+    """One author's burst of messages in a channel."""
+
+    def __init__(self, chan_id, message, lines, dispatch):
+        self.chan_id = chan_id
+        self.author_id = message.author.id
+        self.message = message          # the latest one; replies and reply context use it
+        self.lines = list(lines)
+        self.dispatch = dispatch
+        self.started = time.monotonic()
+        self.timer = None
+        self.task = None
+        self.replying = False
+        self.superseded = False
+        self.resubmitted = False        # carries the lines of a superseded turn that was already dispatched
+
+    @property
+    def content(self) -> str:
+        return "\n".join(self.lines)
+
+
+def replying() -> None:
+    """Mark the current turn as sending; newer messages no longer cancel it."""
+    turn = current_turn.get()
+    if turn is not None:
+        turn.replying = True
+
+
+class MessageCoalescer:
+    def __init__(self, window=COALESCE_WINDOW, max_delay=COALESCE_MAX_DELAY, max_messages=COALESCE_MAX_MESSAGES):
+        self.window = window
+        self.max_delay = max_delay
+        self.max_messages = max_messages
+
+        self._pending: dict[str, Turn] = {}   # waiting for the window to close
+        self._active: dict[str, Turn] = {}    # dispatched, reply not sending yet
+
+        self.messages = 0
+        self.turns = 0
+        self.merged = 0
+        self.cancelled = 0
+
+    def add(self, chan_id, message, content, dispatch):
+        """Queue *content* from *message*; dispatch(turn) is called once the turn is complete."""
+        self.messages += 1
+        lines = [content]
+        resubmitted = False
+
+        active = self._active.get(chan_id)
+        if active and active.author_id == message.author.id and not active.replying and not active.superseded:
+            # The earlier reply has not been sent yet: redo it with every line.
+            active.superseded = True
+            if active.task is not None:
+                active.task.cancel()
+            self.cancelled += 1
+            lines = active.lines + lines
+            resubmitted = True
+
+        pending = self._pending.get(chan_id)
+        if pending and pending.author_id == message.author.id:
+            pending.lines.extend(lines)
+            pending.message = message
+            pending.dispatch = dispatch
+            pending.resubmitted = pending.resubmitted or resubmitted
+            self.merged += 1
+            pending.timer.cancel()
+            if len(pending.lines) >= self.max_messages:
+                self._flush(chan_id)
+            else:
+                self._arm(pending)
+            return
+
+        if pending:
+            self._flush(chan_id)   # someone else spoke; their turn goes first
+        turn = self._pending[chan_id] = Turn(chan_id, message, lines, dispatch)
+        turn.resubmitted = resubmitted
+        self._arm(turn)
+
+    def _arm(self, turn: Turn):
+        delay = min(self.window, max(0.0, turn.started + self.max_delay - time.monotonic()))
+        turn.timer = asyncio.get_running_loop().call_later(delay, self._flush, turn.chan_id)
+
+    def _flush(self, chan_id):
+        turn = self._pending.pop(chan_id, None)
+        if turn is None:
+            return
+        turn.timer.cancel()
+        self.turns += 1
+        self._active[chan_id] = turn
+        turn.dispatch(turn)
+
+    async def run(self, turn: Turn, handler):
+        """Run handler() as *turn*'s reply, unless a newer turn has already replaced it."""
+        if turn.superseded:
+            return
+        turn.task = asyncio.current_task()
+        current_turn.set(turn)
+        try:
+            await handler()
+        finally:
+            self.finish(turn)
+
+    def finish(self, turn: Turn):
+        """Forget *turn* once its reply is done (or was never scheduled)."""
+        if self._active.get(turn.chan_id) is turn:
+            del self._active[turn.chan_id]
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "turns": self.turns,
+            "merged": self.merged,
+            "cancelled": self.cancelled,
+            "pending": len(self._pending),
+        }
@@ -7,6 +7,8 @@ from collections import defaultdict, deque
 from typing import Literal, Optional
 from dataclasses import dataclass, field
 from encryption import save_encrypted, load_encrypted
+from persistence import register_store, mark_dirty
+import outbox
 
 MOD_DATA_FILE = "mod_data.json"
 
@@ -837,12 +839,17 @@ class ModerationCog(commands.Cog, name="ModerationCog"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.mod_data = load_mod_data()
+        register_store(
+            "mod_data", MOD_DATA_FILE,
+            lambda: json.dumps(self.mod_data, indent=2),
+            encrypted=True,
+        )
 
     async def cog_load(self):
         asyncio.create_task(self._process_pending_unbans())
 
     def _save(self):
-        save_mod_data(self.mod_data)
+        mark_dirty("mod_data")
 
     def _cfg(self, guild_id: int) -> dict:
         return _guild_cfg(self.mod_data, guild_id)
@@ -872,12 +879,12 @@ class ModerationCog(commands.Cog, name="ModerationCog"):
         if cfg.get("log_everywhere") and action_channel_id:
             ch = guild.get_channel(action_channel_id)
             if ch:
-                try: await ch.send(embed=embed); return
+                try: await outbox.send(ch, embed=embed, priority=outbox.MODERATION); return
                 except Exception: pass
         for cid in cfg.get("log_channels", []):
             ch = guild.get_channel(int(cid))
             if ch:
-                try: await ch.send(embed=embed)
+                try: await outbox.send(ch, embed=embed, priority=outbox.MODERATION)
                 except Exception as e: print(f"[MOD LOG] {e}")
 
     def _has_base_perms(self, member: discord.Member) -> bool:
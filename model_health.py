@@ -0,0 +1,201 @@
+"""
+Per-(provider, model) health registry with circuit breakers.
+
+Clients record the outcome of every HTTP attempt:
+
+    model_health.record_success("groq", model, latency_ms)
+    model_health.record_failure("groq", model, "rate_limited", retry_after=2.0)
+
+and callers that can pick between endpoints (llm_router) skip the ones
+that are not available() and prefer the lowest score().
+
+Breakers follow the usual closed -> open -> half-open cycle. A model opens
+after HEALTH_FAILURE_THRESHOLD consecutive failures, when its recent error
+rate passes HEALTH_ERROR_RATE, or at once on 503 (over capacity) and on 429
+with a retry-after. While open it is skipped. After the open period one
+probe request is let through (half-open): success closes the breaker,
+failure re-opens it for twice as long, up to HEALTH_MAX_OPEN seconds.
+
+Inspect with snapshot() (the !modelhealth command).
+"""
+
+import os
+import time
+from collections import deque
+
+HEALTH_WINDOW = int(os.getenv("HEALTH_WINDOW", "50"))
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+HEALTH_ERROR_RATE = float(os.getenv("HEALTH_ERROR_RATE", "0.5"))
+HEALTH_MIN_SAMPLES = 10
+HEALTH_BASE_OPEN = float(os.getenv("HEALTH_BASE_OPEN", "30"))
+HEALTH_MAX_OPEN = float(os.getenv("HEALTH_MAX_OPEN", "600"))
+PROBE_TIMEOUT = 90.0   # a half-open probe that never reports back stops blocking after this
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Failure kinds that count against the breaker. "client" errors (bad
+# request, auth) say nothing about the model's health.
+FAILURE_KINDS = ("error", "timeout", "rate_limited", "overloaded", "client")
+
+
+class ModelHealth:
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+
+        self.latencies = deque(maxlen=200)      # ms, successful calls only
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)  # True = ok
+
+        self.calls = 0
+        self.failures = {kind: 0 for kind in FAILURE_KINDS}
+
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.open_seconds = HEALTH_BASE_OPEN
+        self.consecutive_failures = 0
+        self.probe_started = None
+        self.last_error = None
+
+    # ---------------- RECORDING ----------------
+
+    def success(self, latency_ms: float | None = None):
+        self.calls += 1
+        self.outcomes.append(True)
+        if latency_ms is not None:
+            self.latencies.append(latency_ms)
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            print(f"[HEALTH] {self.provider}/{self.model} recovered; breaker closed")
+        self.state = CLOSED
+        self.open_seconds = HEALTH_BASE_OPEN
+        self.probe_started = None
+
+    def failure(self, kind: str = "error", retry_after: float | None = None, detail: str | None = None):
+        self.calls += 1
+        self.failures[kind] = self.failures.get(kind, 0) + 1
+        self.last_error = f"{kind}: {detail}" if detail else kind
+        if kind == "client":
+            return
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+
+        if self.state == HALF_OPEN:
+            self._open(self.open_seconds * 2, reason="probe failed")
+        elif kind == "overloaded":
+            self._open(max(self.open_seconds, retry_after or 0), reason="over capacity")
+        elif kind == "rate_limited" and retry_after:
+            self._open(retry_after, reason="rate limited")
+        elif self.consecutive_failures >= HEALTH_FAILURE_THRESHOLD:
+            self._open(self.open_seconds, reason=f"{self.consecutive_failures} failures in a row")
+        elif len(self.outcomes) >= HEALTH_MIN_SAMPLES and self.error_rate() >= HEALTH_ERROR_RATE:
+            self._open(self.open_seconds, reason=f"error rate {self.error_rate():.0%}")
+
+    def _open(self, seconds: float, reason: str):
+        seconds = min(seconds, HEALTH_MAX_OPEN)
+        self.state = OPEN
+        self.open_until = time.monotonic() + seconds
+        self.open_seconds = min(max(seconds, HEALTH_BASE_OPEN), HEALTH_MAX_OPEN)
+        self.probe_started = None
+        print(f"[HEALTH] {self.provider}/{self.model} breaker open for {seconds:.0f}s ({reason})")
+
+    # ---------------- ADMISSION ----------------
+
+    def available(self) -> bool:
+        """True unless the breaker is open (or a half-open probe is already out). Does not claim the probe."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            return now >= self.open_until
+        if self.state == HALF_OPEN:
+            return self.probe_started is None or now - self.probe_started > PROBE_TIMEOUT
+        return True
+
+    def allow(self) -> bool:
+        """available(), and if this call is the half-open probe, claim it."""
+        if not self.available():
+            return False
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self.probe_started = time.monotonic()
+        return True
+
+    # ---------------- METRICS ----------------
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, pct: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "state": self.state,
+            "open_for": max(0.0, round(self.open_until - time.monotonic(), 1)) if self.state == OPEN else 0.0,
+            "calls": self.calls,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(p50) if p50 is not None else None,
+            "p95_ms": round(p95) if p95 is not None else None,
+            "rate_limited": self.failures["rate_limited"],
+            "overloaded": self.failures["overloaded"],
+            "timeouts": self.failures["timeout"],
+            "errors": self.failures["error"],
+            "last_error": self.last_error,
+        }
+
+
+_registry: dict[tuple[str, str], ModelHealth] = {}
+
+
+def get(provider: str, model: str) -> ModelHealth:
+    key = (provider, model)
+    health = _registry.get(key)
+    if health is None:
+        health = _registry[key] = ModelHealth(provider, model)
+    return health
+
+
+def record_success(provider: str, model: str, latency_ms: float | None = None):
+    get(provider, model).success(latency_ms)
+
+
+def record_failure(provider: str, model: str, kind: str = "error", retry_after: float | None = None, detail: str | None = None):
+    get(provider, model).failure(kind, retry_after, detail)
+
+
+def failure_kind(status: int) -> str:
+    """Map an HTTP status to a failure kind."""
+    if status == 429:
+        return "rate_limited"
+    if status in (503, 529):
+        return "overloaded"
+    if status in (408, 504):
+        return "timeout"
+    if 400 <= status < 500:
+        return "client"
+    return "error"
+
+
+def allow(provider: str, model: str) -> bool:
+    return get(provider, model).allow()
+
+
+def available(provider: str, model: str) -> bool:
+    return get(provider, model).available()
+
+
+def score(provider: str, model: str) -> tuple[float, float]:
+    """Sort key, lower is healthier: recent error rate (to 10%), then median latency (unknown sorts last)."""
+    health = get(provider, model)
+    p50 = health.percentile(0.5)
+    return (round(health.error_rate(), 1), p50 if p50 is not None else float("inf"))
+
+
+def snapshot() -> list[dict]:
+    return [health.snapshot() for health in _registry.values()]
@@ -1,15 +1,16 @@
-import aiohttp
+import http_client
 import os
 import asyncio
+import time
 from dotenv import load_dotenv
 
+import model_health
+
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 
-SESSION: aiohttp.ClientSession | None = None
-
 def clean_log(text: str) -> str:
     if not text:
         return text
@@ -18,12 +19,9 @@ def clean_log(text: str) -> str:
     return text
 
 async def get_session():
-    global SESSION
-    if SESSION is None or SESSION.closed:
-        SESSION = aiohttp.ClientSession()
-    return SESSION
+    return http_client.get_session("llm")
 
-async def call_openrouter(prompt: str, model: str, temperature: float = 1.0, retries: int = 4) -> str | None:
+async def call_openrouter(prompt: str | list[dict], model: str, temperature: float = 1.0, retries: int = 4) -> str | None:
     if not OPENROUTER_API_KEY:
         print("Missing OpenRouter API Key")
         return None
@@ -31,7 +29,7 @@ async def call_openrouter(prompt: str, model: str, temperature: float = 1.0, ret
     session = await get_session()
     payload = {
         "model": model,
-        "messages": [{"role": "user", "content": prompt}],
+        "messages": prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}],
         "temperature": temperature,
     }
     headers = {
@@ -43,13 +41,19 @@ async def call_openrouter(prompt: str, model: str, temperature: float = 1.0, ret
 
     backoff = 1
     for attempt in range(1, retries + 1):
+        started = time.perf_counter()
         try:
             async with session.post(OPENROUTER_URL, headers=headers, json=payload, timeout=60) as resp:
                 text = await resp.text()
                 if resp.status == 200:
                     data = await resp.json()
+                    model_health.record_success("openrouter", model, (time.perf_counter() - started) * 1000)
                     return data["choices"][0]["message"]["content"]
 
+                model_health.record_failure(
+                    "openrouter", model, model_health.failure_kind(resp.status), detail=f"HTTP {resp.status}"
+                )
+
                 print("\n===== OPENROUTER ERROR =====")
                 print(f"Attempt {attempt}, Status: {resp.status}")
                 print(clean_log(text))
@@ -65,6 +69,9 @@ async def call_openrouter(prompt: str, model: str, temperature: float = 1.0, ret
 
         except Exception as e:
             print(f"Exception on attempt {attempt}: {clean_log(str(e))}")
+            model_health.record_failure(
+                "openrouter", model, "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            )
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, 8)
 
@@ -0,0 +1,253 @@
+"""
+Outbound Discord message dispatcher.
+
+Every bot message that goes to a channel (chat replies, streamed reply
+chunks, promos, moderation logs, now-playing embeds) is queued here instead
+of calling channel.send directly, and so are the streaming edits and deletes
+of those messages:
+
+    message = await outbox.send(channel, "hi")                       # waits until sent
+    await outbox.send(channel, embed=embed, priority=outbox.PROMO)   # None if dropped
+    messages = await outbox.send_many(channel, split_message(text))  # one batch, in order
+    await outbox.edit(message, content="hi again")
+    await outbox.delete(message)
+
+  ordering   each channel has its own queue; a channel has one send in
+             flight at a time, so chunks and replies arrive in order
+  lanes      MODERATION before REPLY before PROMO, per channel and when
+             picking which channel goes next
+  budgets    a global bucket (SEND_GLOBAL_RPS) and a per-channel bucket
+             (Discord's 5 messages / 5 s per channel route) are spent before
+             each request (sends, edits and deletes alike), so bursts queue
+             here instead of hitting 429s
+  batching   send_many() parts go out back to back as one job; separate
+             send() calls are never merged, since each caller gets (and may
+             later edit) its own Message
+  pressure   promos are dropped while more than PROMO_MAX_BACKLOG sends are
+             waiting; stats() reports depth per lane and queue wait times
+
+Errors from channel.send (Forbidden, HTTPException, ...) are raised to the
+caller of send() / send_many().
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from token_bucket import TokenBucket
+
+MODERATION, REPLY, PROMO = 0, 1, 2
+LANES = ("moderation", "reply", "promo")
+
+SEND_GLOBAL_RPS = float(os.getenv("SEND_GLOBAL_RPS", "40"))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "16"))
+CHANNEL_BURST = 5
+CHANNEL_PERIOD = 5.0
+PROMO_MAX_BACKLOG = int(os.getenv("PROMO_MAX_BACKLOG", "25"))
+
+
+class _Job:
+    __slots__ = ("parts", "priority", "future", "enqueued")
+
+    def __init__(self, parts, priority):
+        self.parts = parts                  # kwargs for channel.send, or a coroutine factory (edit / delete)
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+
+class _Channel:
+    def __init__(self, channel):
+        self.channel = channel
+        self.lanes = [deque() for _ in LANES]
+        self.bucket = TokenBucket(CHANNEL_BURST, CHANNEL_PERIOD)
+        self.busy = False
+
+    def head(self):
+        for lane in self.lanes:
+            if lane:
+                return lane[0]
+        return None
+
+
+_channels: dict[int, _Channel] = {}
+_global = TokenBucket(SEND_GLOBAL_RPS, 1.0)
+_wakeup = asyncio.Event()
+_dispatcher = None
+_in_flight = 0
+
+_waits = deque(maxlen=500)
+_stats = {"sent": 0, "failed": 0, "dropped": 0, "throttled": 0, "max_depth": 0}
+
+
+def _depth() -> list[int]:
+    return [sum(len(state.lanes[i]) for state in _channels.values()) for i in range(len(LANES))]
+
+
+# ---------------- QUEUEING ----------------
+
+def _enqueue(channel, parts, priority):
+    depth = sum(_depth())
+    if priority == PROMO and depth > PROMO_MAX_BACKLOG:
+        _stats["dropped"] += 1
+        return None
+
+    state = _channels.get(channel.id)
+    if state is None:
+        state = _channels[channel.id] = _Channel(channel)
+    job = _Job(parts, priority)
+    state.lanes[priority].append(job)
+    _stats["max_depth"] = max(_stats["max_depth"], depth + 1)
+
+    global _dispatcher
+    if _dispatcher is None or _dispatcher.done():
+        _dispatcher = asyncio.ensure_future(_dispatch())
+    _wakeup.set()
+    return job.future
+
+
+async def send(channel, content=None, *, priority=REPLY, **kwargs):
+    """Queue one message to *channel* and wait until it is sent. Returns the Message, or None if dropped."""
+    parts = {"content": content, **kwargs} if content is not None else kwargs
+    future = _enqueue(channel, [parts], priority)
+    if future is None:
+        return None
+    return (await future)[0]
+
+
+async def send_many(channel, contents, priority=REPLY) -> list:
+    """Send several text messages back to back, with nothing else in between in that channel."""
+    contents = [c for c in contents if c]
+    if not contents:
+        return []
+    future = _enqueue(channel, [{"content": c} for c in contents], priority)
+    return await future if future is not None else []
+
+
+async def edit(message, *, priority=REPLY, **kwargs):
+    """Queue message.edit(**kwargs) behind the channel's other requests; returns the edited Message."""
+    future = _enqueue(message.channel, [lambda: message.edit(**kwargs)], priority)
+    return (await future)[0] if future is not None else None
+
+
+async def delete(message, *, priority=REPLY) -> None:
+    """Queue message.delete() behind the channel's other requests."""
+    future = _enqueue(message.channel, [message.delete], priority)
+    if future is not None:
+        await future
+
+
+# ---------------- DISPATCH ----------------
+
+def _pick():
+    """The next (state, job) to send: highest lane first, then oldest; None if nothing is ready."""
+    now = time.monotonic()
+    best = None
+    for state in _channels.values():
+        if state.busy:
+            continue
+        job = state.head()
+        if job is None or state.bucket.wait_time(1, now) > 0:
+            continue
+        if best is None or (job.priority, job.enqueued) < (best[1].priority, best[1].enqueued):
+            best = (state, job)
+    return best
+
+
+def _next_wake() -> float:
+    now = time.monotonic()
+    waits = [
+        state.bucket.wait_time(1, now)
+        for state in _channels.values()
+        if not state.busy and state.head() is not None
+    ]
+    return min(waits) if waits else None
+
+
+async def _spend(state):
+    """Wait for one request's worth of the channel and global budgets, then take it."""
+    while True:
+        now = time.monotonic()
+        wait = max(state.bucket.wait_time(1, now), _global.wait_time(1, now))
+        if wait <= 0:
+            break
+        _stats["throttled"] += 1
+        await asyncio.sleep(wait)
+    state.bucket.take(1)
+    _global.take(1)
+
+
+async def _run(state, job):
+    global _in_flight
+    messages = []
+    try:
+        for parts in job.parts:
+            await _spend(state)
+            messages.append(await (parts() if callable(parts) else state.channel.send(**parts)))
+        _stats["sent"] += len(messages)
+        if not job.future.done():
+            job.future.set_result(messages)
+    except Exception as e:
+        _stats["failed"] += 1
+        if not job.future.done():
+            job.future.set_exception(e)
+    finally:
+        state.busy = False
+        _in_flight -= 1
+        _wakeup.set()
+
+
+async def _dispatch():
+    global _in_flight
+    while True:
+        saturated = _in_flight >= SEND_CONCURRENCY
+        picked = None if saturated else _pick()
+        if picked is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=None if saturated else _next_wake())
+            except asyncio.TimeoutError:
+                pass
+            _prune()
+            continue
+
+        state, job = picked
+        state.lanes[job.priority].popleft()
+        _waits.append(time.monotonic() - job.enqueued)
+        state.busy = True
+        _in_flight += 1
+        asyncio.ensure_future(_run(state, job))
+
+
+def _prune():
+    """Forget idle channels whose budget has fully refilled."""
+    now = time.monotonic()
+    for channel_id, state in list(_channels.items()):
+        if not state.busy and state.head() is None and state.bucket.wait_time(CHANNEL_BURST, now) == 0:
+            del _channels[channel_id]
+
+
+async def drain(timeout: float = 5.0):
+    """Wait (up to *timeout*) for queued messages to go out, e.g. before shutdown."""
+    deadline = time.monotonic() + timeout
+    while (_in_flight or sum(_depth())) and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+# ---------------- METRICS ----------------
+
+def stats() -> dict:
+    waits = sorted(_waits)
+
+    def pct(p):
+        return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000) if waits else None
+
+    return {
+        **_stats,
+        "queued": dict(zip(LANES, _depth())),
+        "in_flight": _in_flight,
+        "channels": len(_channels),
+        "wait_p50_ms": pct(0.5),
+        "wait_p95_ms": pct(0.95),
+    }
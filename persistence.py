@@ -0,0 +1,181 @@
+"""
+Shared dirty-tracking flush scheduler for the bot's JSON / encrypted state files.
+
+Stores register once with a ``serialize`` callable (runs on the event loop so it
+sees a consistent snapshot of in-memory state) and optionally a custom
+``writer`` (runs in a worker thread). Callers then ``mark_dirty(name)`` as often
+as they like; writes within FLUSH_DELAY seconds are coalesced into one atomic
+temp-file + rename write performed off the event loop.
+
+Outside a running event loop (startup, atexit, scripts) mark_dirty writes
+synchronously, so behaviour matches the old save_* functions.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from encryption import save_encrypted, run_crypto
+
+FLUSH_DELAY = float(os.getenv("PERSIST_FLUSH_DELAY", "2.0"))
+
+_stores: dict[str, dict] = {}
+_flush_tasks: set[asyncio.Task] = set()   # strong refs, so a flush is not collected mid-write
+
+
+def atomic_write(path: str, text: str, encrypted: bool = False) -> None:
+    """Write *text* to *path* via a temp file and os.replace so readers never see a partial file."""
+    # A unique temp file per write, so concurrent writers (an atexit flush, a
+    # worker process) never share one.
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        if encrypted:
+            os.close(fd)
+            save_encrypted(tmp_path, text)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def register_store(name, path, serialize, *, encrypted=False, writer=None, delay=None) -> None:
+    """
+    Register a persisted store.
+
+    serialize() -> payload           called on the event loop when the store is flushed
+    writer(payload) -> None          called in a worker thread; defaults to atomic_write(path, payload)
+
+    encrypted stores are written on the encryption module's crypto pool.
+    """
+    if writer is None:
+        def writer(payload, _path=path, _encrypted=encrypted):
+            atomic_write(_path, payload, encrypted=_encrypted)
+
+    _stores[name] = {
+        "path": path,
+        "encrypted": encrypted,
+        "serialize": serialize,
+        "writer": writer,
+        "delay": FLUSH_DELAY if delay is None else delay,
+        "dirty": False,
+        "handle": None,
+        "lock": None,
+        "marks": 0,
+        "writes": 0,
+        "errors": 0,
+        "last_write_ms": 0.0,
+    }
+
+
+def mark_dirty(name: str) -> None:
+    store = _stores.get(name)
+    if store is None:
+        print(f"[PERSIST] Unknown store: {name}")
+        return
+
+    store["marks"] += 1
+    store["dirty"] = True
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _flush_sync(name, store)
+        return
+
+    if store["handle"] is None:
+        store["handle"] = loop.call_later(store["delay"], _start_flush, loop, name, store)
+
+
+def _start_flush(loop, name: str, store: dict) -> None:
+    task = loop.create_task(_flush_async(name, store))
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+
+
+def _write(name: str, store: dict, payload) -> None:
+    started = time.perf_counter()
+    try:
+        store["writer"](payload)
+        store["writes"] += 1
+    except Exception as e:
+        store["errors"] += 1
+        print(f"[PERSIST] Write error for {name}: {e}")
+    store["last_write_ms"] = (time.perf_counter() - started) * 1000
+
+
+def _flush_sync(name: str, store: dict) -> None:
+    if store["handle"] is not None:
+        store["handle"].cancel()
+        store["handle"] = None
+    if not store["dirty"]:
+        return
+    store["dirty"] = False
+    try:
+        payload = store["serialize"]()
+    except Exception as e:
+        store["errors"] += 1
+        print(f"[PERSIST] Serialize error for {name}: {e}")
+        return
+    _write(name, store, payload)
+
+
+async def _flush_async(name: str, store: dict) -> None:
+    store["handle"] = None
+    if store["lock"] is None:
+        store["lock"] = asyncio.Lock()
+
+    # One writer per file at a time; marks that land while we write schedule
+    # another flush via a fresh timer.
+    async with store["lock"]:
+        if not store["dirty"]:
+            return
+        store["dirty"] = False
+        try:
+            payload = store["serialize"]()
+        except Exception as e:
+            store["errors"] += 1
+            print(f"[PERSIST] Serialize error for {name}: {e}")
+            return
+        if store["encrypted"]:
+            # Fernet work shares the bounded crypto pool with other encrypted IO.
+            await run_crypto(_write, name, store, payload)
+        else:
+            await asyncio.to_thread(_write, name, store, payload)
+
+
+def flush_all() -> None:
+    """Synchronously write every dirty store (for atexit / shutdown)."""
+    for name, store in list(_stores.items()):
+        _flush_sync(name, store)
+
+
+async def flush_all_async() -> None:
+    for name, store in list(_stores.items()):
+        if store["handle"] is not None:
+            store["handle"].cancel()
+        await _flush_async(name, store)
+
+
+def get_stats() -> dict[str, dict]:
+    """Per-store counters; ``saved`` is the number of writes avoided by coalescing."""
+    return {
+        name: {
+            "marks": s["marks"],
+            "writes": s["writes"],
+            "saved": max(s["marks"] - s["writes"] - int(s["dirty"]), 0),
+            "errors": s["errors"],
+            "dirty": s["dirty"],
+            "last_write_ms": round(s["last_write_ms"], 2),
+        }
+        for name, s in _stores.items()
+    }
@@ -3,7 +3,8 @@ import os
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
-from encryption import save_encrypted, load_encrypted
+from encryption import load_encrypted
+from persistence import register_store, mark_dirty
 
 PLAYLIST_FILE = "playlists.json"
 MAX_TRACKS_PER_PLAYLIST = 50
@@ -26,11 +27,12 @@ def load() -> None:
         _data = {"playlists": {}}
 
 
+def _serialize() -> str:
+    return json.dumps(_data, indent=2, ensure_ascii=False)
+
+
 def save() -> None:
-    try:
-        save_encrypted(PLAYLIST_FILE, json.dumps(_data, indent=2, ensure_ascii=False))
-    except Exception as e:
-        print(f"[PLAYLIST] Save error: {e}")
+    mark_dirty("playlists")
 
 
 def get_guild_playlists(guild_id: int) -> dict[str, dict]:
@@ -107,4 +109,5 @@ def remove_track(guild_id: int, playlist_id: str, index: int) -> bool:
     return True
 
 
+register_store("playlists", PLAYLIST_FILE, _serialize, encrypted=True)
 load()
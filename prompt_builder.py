@@ -0,0 +1,166 @@
+"""
+Prompt size budgeting.
+
+Prompts are built from a static system message (persona + capabilities), a
+few fixed lines (instructions, the user's message) and context that can grow
+without bound: conversation history, web search results, webpage text,
+uploaded files. fit_context() trims that context so the whole prompt stays
+inside the model's input budget instead of being rejected (413) or burning
+the per-minute token allowance (429).
+
+    system, system_tokens = static_prefix(PERSONAS[mode], BOT_CAPABILITIES_PROMPT)
+    history, ctx = fit_context(model, fixed_tokens, history=lines, web=search_text)
+    messages = chat_messages(system, history_turns(history, BOT_NAME), user_text)
+
+The system message comes first and is byte-identical for every turn in a
+persona, and earlier turns are sent unchanged, so providers with prefix
+caching can reuse the leading part of the request.
+
+Token counts are estimated (no tokenizer dependency); the estimate errs on
+the high side for chatty, emoji-heavy text.
+"""
+
+import os
+from functools import lru_cache
+
+from groq_client import _max_tokens_for_model
+
+PROMPT_TOKEN_CAP = int(os.getenv("PROMPT_TOKEN_CAP", "6000"))
+DEFAULT_CONTEXT_WINDOW = 8192
+TRUNCATION_MARK = " …[truncated]"
+
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-120b": 131072,
+    "moonshotai/kimi-k2-instruct": 131072,
+    "allam-2-7b": 4096,
+    "qwen/qwen3-32b": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "meta-llama/llama-4-scout-17b-16e-instruct": 131072,
+    "llama-3.1-8b-instant": 131072,
+}
+
+_stats = {"prompts": 0, "trimmed": 0, "tokens_cut": 0, "largest": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    # BPE vocabularies average ~4 bytes of English per token; short words,
+    # slang and punctuation push that up, so take the larger estimate.
+    return max(len(text.encode("utf-8")) // 4, len(text.split()) * 4 // 3) + 1
+
+
+@lru_cache(maxsize=128)
+def static_prefix(*parts: str, sep: str = "\n\n") -> tuple[str, int]:
+    """Join static prompt parts once; returns (text, estimated tokens)."""
+    text = sep.join(parts)
+    return text, estimate_tokens(text)
+
+
+def history_turns(lines: list[str], bot_name: str) -> list[dict]:
+    """
+    Flat "Name: text" memory lines as chat turns: the bot's lines become
+    assistant turns, everyone else's stay user turns with their name kept
+    (channels have several speakers).
+    """
+    bot_label = f"{bot_name}: "
+    turns = []
+    for line in lines:
+        if line.startswith(bot_label):
+            turns.append({"role": "assistant", "content": line[len(bot_label):]})
+        else:
+            turns.append({"role": "user", "content": line})
+    return turns
+
+
+def chat_messages(system: str, turns: list[dict], user: str) -> list[dict]:
+    return [{"role": "system", "content": system}, *turns, {"role": "user", "content": user}]
+
+
+def prompt_budget(model: str) -> int:
+    """Input tokens allowed for *model*: its window minus the completion reserve, capped."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    reserve = min(_max_tokens_for_model(model), window // 2)
+    return min(PROMPT_TOKEN_CAP, window - reserve)
+
+
+def trim_lines(lines: list[str], max_tokens: int) -> list[str]:
+    """Newest lines that fit in *max_tokens*, in their original order."""
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Head of *text* that fits in *max_tokens*, marked as truncated."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens < 16:
+        return ""
+    cut = max_tokens * 4
+    while cut > 0 and estimate_tokens(text[:cut]) + 4 > max_tokens:
+        cut = cut * 9 // 10
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+def _allocate(budget: int, sizes: dict[str, int]) -> dict[str, int]:
+    """Split *budget* across sections: small ones keep everything, large ones share the rest equally."""
+    shares = {}
+    pending = sorted(sizes, key=sizes.get)
+    while pending:
+        fair = budget // len(pending)
+        name = pending[0]
+        if sizes[name] > fair:
+            for name in pending:
+                shares[name] = fair
+            break
+        shares[name] = sizes[name]
+        budget -= sizes[name]
+        pending.pop(0)
+    return shares
+
+
+def fit_context(model: str, fixed_tokens: int, history: list[str] | None = None, **sections: str):
+    """
+    Trim *history* (oldest lines first) and the free-text *sections* so that
+    fixed_tokens + context fits prompt_budget(model).
+    Returns (history_lines, {section: text}).
+    """
+    history = history or []
+    budget = prompt_budget(model)
+    available = max(0, budget - fixed_tokens)
+
+    sizes = {name: estimate_tokens(text) for name, text in sections.items() if text}
+    sizes["history"] = sum(estimate_tokens(line) + 1 for line in history)
+    total = sum(sizes.values())
+
+    _stats["prompts"] += 1
+    _stats["largest"] = max(_stats["largest"], fixed_tokens + total)
+    if total <= available:
+        return history, sections
+
+    shares = _allocate(available, sizes)
+    history = trim_lines(history, shares["history"])
+    sections = {
+        name: trim_text(text, shares[name]) if text else text
+        for name, text in sections.items()
+    }
+
+    kept = sum(estimate_tokens(line) + 1 for line in history) + sum(
+        estimate_tokens(text) for text in sections.values() if text
+    )
+    _stats["trimmed"] += 1
+    _stats["tokens_cut"] += total - kept
+    print(f"[PROMPT] {model}: context trimmed ~{total} → ~{kept} tokens (budget {budget}, fixed {fixed_tokens})")
+    return history, sections
+
+
+def get_stats() -> dict:
+    return dict(_stats)
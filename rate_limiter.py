@@ -0,0 +1,261 @@
+"""
+Client-side rate limiting for Groq, driven by its rate-limit headers.
+
+Each limiter name (groq_client uses "model@keyN", since Groq limits every
+API key per model) gets a request bucket (requests per day, from
+x-ratelimit-limit-requests) and a token bucket (tokens per minute, from
+x-ratelimit-limit-tokens). Both are learned from the first response; until
+then nothing is enforced, except GROQ_RPM / GROQ_TPM if they are set to
+pin per-minute limits by hand. Every response resyncs the buckets with
+x-ratelimit-remaining-*, and a 429's retry-after blocks the model until it
+passes.
+
+    await rate_limiter.acquire(model, estimated_tokens)   # may raise RateLimited
+    rate_limiter.update(model, resp.headers, resp.status)
+
+Waiting callers are queued per key (the guild, bound with
+rate_limiter.bind() for the current task) and served round-robin, so one
+busy server cannot starve the others. A caller whose expected wait is over
+LIMITER_MAX_WAIT is rejected at once with RateLimited (carrying
+retry_after) instead of queueing behind a wall of retries.
+"""
+
+import asyncio
+import contextvars
+import os
+import re
+import time
+from collections import OrderedDict, deque
+
+from token_bucket import TokenBucket
+
+GROQ_RPM = int(os.getenv("GROQ_RPM", "0"))   # 0: learn from the headers
+GROQ_TPM = int(os.getenv("GROQ_TPM", "0"))
+REQUESTS_PERIOD = 86400.0   # Groq's request headers count per day
+LIMITER_MAX_WAIT = float(os.getenv("LIMITER_MAX_WAIT", "20"))
+COMPLETION_ESTIMATE = 400   # tokens reserved for the reply when estimating a request's cost
+
+current_key = contextvars.ContextVar("rate_limit_key", default="global")
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+class RateLimited(Exception):
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"rate limited on {model}; retry in {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def bind(key) -> None:
+    """Queue this task's (and its child tasks') model calls under *key*, e.g. the guild id."""
+    current_key.set(str(key) if key is not None else "global")
+
+
+def parse_duration(value) -> float | None:
+    """Groq reset headers look like "7.66s", "2m59.56s" or "120ms"."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+
+def _bucket_wait(bucket, amount: float, now: float) -> float:
+    return bucket.wait_time(amount, now) if bucket is not None else 0.0
+
+
+def _learn(bucket, period: float, limit, remaining):
+    """Create or resize *bucket* from a limit-* / remaining-* header pair; unchanged if they are missing."""
+    try:
+        limit = float(limit) if limit else None
+        remaining = float(remaining) if remaining is not None else None
+    except ValueError:
+        return bucket
+    if bucket is None:
+        if not limit:
+            return None
+        bucket = TokenBucket(limit, period)
+    if remaining is not None:
+        bucket.sync(remaining, limit)
+    elif limit:
+        bucket.capacity = limit
+    return bucket
+
+
+class ModelLimiter:
+    def __init__(self, model: str):
+        self.model = model
+        # None until a limit is known (an env override or the first response's headers).
+        self.requests = TokenBucket(GROQ_RPM) if GROQ_RPM else None
+        self.tokens = TokenBucket(GROQ_TPM) if GROQ_TPM else None
+        self.blocked_until = 0.0
+
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()   # key -> deque[(future, cost)]
+        self._pump_task = None
+
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _wait_time(self, cost: float) -> float:
+        now = time.monotonic()
+        return max(
+            self.blocked_until - now,
+            _bucket_wait(self.requests, 1, now),
+            _bucket_wait(self.tokens, cost, now),
+        )
+
+    def _backlog(self) -> tuple[int, float]:
+        waiting = [cost for queue in self._queues.values() for _, cost in queue]
+        return len(waiting), sum(waiting)
+
+    def expected_wait(self, cost: float) -> float:
+        """Rough time until a new request of *cost* tokens would be granted, counting the queue ahead."""
+        count, tokens = self._backlog()
+        now = time.monotonic()
+        return max(
+            self.blocked_until - now,
+            _bucket_wait(self.requests, count + 1, now),
+            _bucket_wait(self.tokens, tokens + cost, now),
+        )
+
+    async def acquire(self, cost: float, key: str, max_wait: float):
+        if not self._queues and self._wait_time(cost) == 0:
+            self._grant(cost)
+            return
+
+        wait = self.expected_wait(cost)
+        if wait > max_wait:
+            self.rejected += 1
+            raise RateLimited(self.model, wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((future, cost))
+        self.queued += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump())
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()   # the pump skips cancelled waiters
+                self.rejected += 1
+                raise RateLimited(self.model, self._wait_time(cost)) from None
+            # Granted in the same tick as the timeout; keep the slot.
+        except BaseException:
+            future.cancel()
+            raise
+        self.waited += time.monotonic() - started
+
+    def _grant(self, cost: float):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(cost)
+        self.granted += 1
+
+    async def _pump(self):
+        """Grant queued waiters as capacity allows, one key at a time in rotation."""
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            while queue and queue[0][0].done():
+                queue.popleft()   # gave up waiting
+            if not queue:
+                del self._queues[key]
+                continue
+
+            future, cost = queue[0]
+            wait = self._wait_time(cost)
+            if wait > 0:
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+
+            queue.popleft()
+            self._grant(cost)
+            future.set_result(None)
+            # Next turn goes to the next key; this one rejoins at the back.
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+
+    def update(self, headers, status: int):
+        if not GROQ_RPM:
+            self.requests = _learn(
+                self.requests, REQUESTS_PERIOD,
+                headers.get("x-ratelimit-limit-requests"), headers.get("x-ratelimit-remaining-requests"),
+            )
+        if not GROQ_TPM:
+            self.tokens = _learn(
+                self.tokens, 60.0,
+                headers.get("x-ratelimit-limit-tokens"), headers.get("x-ratelimit-remaining-tokens"),
+            )
+
+        # Block outright once the day's requests run out, until they reset.
+        if headers.get("x-ratelimit-remaining-requests") == "0":
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._block(reset)
+
+        if status == 429:
+            self.throttled += 1
+            retry_after = parse_duration(headers.get("retry-after")) or parse_duration(
+                headers.get("x-ratelimit-reset-tokens")
+            )
+            self._block(retry_after or 5.0)
+
+    def _block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        count, _ = self._backlog()
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.refill(now)
+        return {
+            "granted": self.granted,
+            "queued": self.queued,
+            "waiting": count,
+            "rejected": self.rejected,
+            "throttled_429": self.throttled,
+            "avg_wait_ms": round(self.waited / self.queued * 1000) if self.queued else 0,
+            "requests_left": round(self.requests.level) if self.requests else None,
+            "request_limit": round(self.requests.capacity) if self.requests else None,
+            "tokens_left": round(self.tokens.level) if self.tokens else None,
+            "tpm": round(self.tokens.capacity) if self.tokens else None,
+            "blocked_for": round(max(0.0, self.blocked_until - now), 1),
+        }
+
+
+_limiters: dict[str, ModelLimiter] = {}
+
+
+def get(model: str) -> ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = _limiters[model] = ModelLimiter(model)
+    return limiter
+
+
+async def acquire(model: str, prompt_tokens: int, max_wait: float = LIMITER_MAX_WAIT):
+    """Wait for room to send one request to *model*; raises RateLimited if that would take too long."""
+    await get(model).acquire(prompt_tokens + COMPLETION_ESTIMATE, current_key.get(), max_wait)
+
+
+def update(model: str, headers, status: int):
+    get(model).update(headers, status)
+
+
+def all_stats() -> dict[str, dict]:
+    return {model: limiter.stats() for model, limiter in _limiters.items()}
@@ -1,7 +1,11 @@
+import asyncio
 import os
+import time
 import replicate
 from dotenv import load_dotenv
 
+import model_health
+
 load_dotenv()
 
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
@@ -21,6 +25,7 @@ async def call_replicate(
         print("[REPLICATE ERROR] Missing REPLICATE_API_TOKEN in .env")
         return None
     
+    started = time.perf_counter()
     try:
         os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
         
@@ -35,16 +40,20 @@ async def call_replicate(
         
         print(f"[REPLICATE] Calling {model} with prompt: {prompt[:100]}...")
         
-        output = replicate.run(model, input=input_data)
-        
-        if hasattr(output, '__iter__'):
-            response = "".join(output)
-        else:
-            response = str(output)
+        def _run():
+            output = replicate.run(model, input=input_data)
+            if hasattr(output, '__iter__'):
+                return "".join(output)
+            return str(output)
+
+        # replicate.run blocks until the prediction finishes; keep it off the event loop.
+        response = await asyncio.to_thread(_run)
         
         print(f"[REPLICATE] Response length: {len(response)} chars")
+        model_health.record_success("replicate", model, (time.perf_counter() - started) * 1000)
         return response.strip()
     
     except Exception as e:
         print(f"[REPLICATE ERROR] {e}")
+        model_health.record_failure("replicate", model, detail=str(e)[:200])
         return None
@@ -0,0 +1,169 @@
+"""
+Decides whether a chat message needs live web search.
+
+Obvious cases are answered locally by a keyword/regex score over the
+slang-normalized text; only ambiguous queries fall back to the LLM
+classifier. Every decision is remembered in a small table keyed on the
+normalized text, so repeated questions never pay for a second call.
+
+Run bench_search_classifier.py to compare against the LLM-only behaviour.
+"""
+
+import re
+import time
+
+from groq_client import call_groq
+from slang_normalizer import apply_slang_map, normalize_text
+from ttl_cache import TTLCache
+
+CLASSIFIER_MODEL = "llama-3.3-70b-versatile"
+YES_THRESHOLD = 2
+NO_THRESHOLD = -1
+
+_decisions = TTLCache("search_decisions", maxsize=5000, ttl=24 * 60 * 60)
+
+_stats = {"table": 0, "heuristic_yes": 0, "heuristic_no": 0, "llm": 0, "llm_errors": 0, "llm_ms": 0.0}
+
+
+def _patterns(*words):
+    return re.compile(r"\b(?:" + "|".join(words) + r")\b")
+
+
+_THIS_YEAR = time.gmtime().tm_year
+
+# (pattern, weight, label); text is lowercased, punctuation-free, slang-expanded.
+_SIGNALS = [
+    # Freshness / changing facts
+    (_patterns(r"latest", r"newest", r"recent(?:ly)?", r"currently", r"current", r"nowadays", r"right now",
+               r"as of now", r"this (?:week|month|year|season)", r"today", r"tonight", r"yesterday",
+               r"last night", r"upcoming", r"so far"), 2, "freshness"),
+    (_patterns(r"news", r"headlines?", r"breaking", r"update[sd]?", r"announce(?:d|ment)", r"released?",
+               r"launch(?:ed)?", r"patch notes"), 2, "news"),
+    (_patterns(r"scores?", r"standings", r"rankings?", r"leaderboard", r"who won", r"winners?", r"results?",
+               r"fixtures?", r"schedule", r"match(?:es)?", r"election", r"polls?"), 2, "events"),
+    (_patterns(r"price(?: of)?", r"stock(?: price)?", r"market cap", r"exchange rate", r"how much (?:is|does|do)",
+               r"cost(?:s)?", r"worth", r"bitcoin", r"btc", r"eth", r"weather", r"forecast", r"temperature in"),
+     2, "live data"),
+    (re.compile(r"\bwho (?:is|s) (?:the )?(?:current |new )?(?:president|prime minister|pm|ceo|king|queen|"
+                r"chancellor|leader|owner|coach|captain|champion|head)\b"), 3, "office holder"),
+    (re.compile(r"\bwhen (?:is|does|will|did) .+\b(?:release|come out|start|end|happen|launch|drop|air)\b"),
+     2, "dates"),
+    (re.compile(r"\b(?:is|did) .+ (?:dead|alive|still|married|retired|arrested|banned)\b"), 2, "status"),
+    (re.compile(r"\b(?:latest|newest|current) (?:version|release|update|model|patch)\b"), 2, "versions"),
+    (re.compile(r"\b20[0-9]{2}\b"), 0, "year"),  # weighted below by recency
+    (_patterns(r"search", r"look up", r"google", r"find out", r"on the internet", r"online"), 2, "explicit"),
+
+    # Timeless / not a lookup
+    (_patterns(r"code", r"python", r"javascript", r"typescript", r"java", r"rust", r"html", r"css",
+               r"sql", r"regex", r"function", r"class", r"bug", r"debug", r"error", r"exception", r"compile",
+               r"script", r"algorithm", r"variable", r"loop", r"array"), -3, "coding"),
+    (_patterns(r"write", r"poem", r"story", r"essay", r"joke", r"roast", r"rap", r"song", r"haiku", r"rewrite",
+               r"paraphrase", r"translate", r"summari[sz]e", r"draw", r"imagine", r"pretend", r"roleplay"),
+     -3, "creative"),
+    (_patterns(r"what do you think", r"do you (?:like|love|hate|think|know me)", r"your (?:favorite|favourite|opinion)",
+               r"would you rather", r"should i", r"rate my", r"are you", r"can you", r"who are you",
+               r"what are you doing", r"how are you"), -2, "chat"),
+    (_patterns(r"explain", r"define", r"definition", r"meaning of", r"difference between", r"how does .+ work",
+               r"why (?:is|do|does|are)", r"what is an?", r"solve", r"calculate", r"equation", r"formula",
+               r"prove", r"derivative", r"integral"), -2, "timeless"),
+    (_patterns(r"hi", r"thanks", r"thank you", r"lol", r"lmao", r"ok", r"okay", r"good ?night", r"good morning",
+               r"bye", r"goodbye", r"yes", r"no", r"for real", r"bro", r"bruh"), -1, "smalltalk"),
+]
+
+_MATH = re.compile(r"^[\d\s+\-*/^().=x]+$")
+
+
+def normalize(text: str) -> str:
+    """Decision-table key: lowercased, punctuation-free, slang expanded."""
+    return apply_slang_map(normalize_text(text or ""))
+
+
+def heuristic(text: str) -> tuple[bool | None, int, list[str]]:
+    """
+    Score an already-normalized query. Returns (decision, score, reasons)
+    where decision is None when the query is ambiguous.
+    """
+    if not text:
+        return False, 0, ["empty"]
+    if _MATH.match(text):
+        return False, -3, ["math"]
+
+    score = 0
+    reasons = []
+    for pattern, weight, label in _SIGNALS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if label == "year":
+            year = int(match.group(0))
+            weight = 2 if year >= _THIS_YEAR - 1 else 0
+            if not weight:
+                continue
+        score += weight
+        reasons.append(label)
+
+    words = len(text.split())
+    if not reasons and words <= 3:
+        return False, score, ["short"]
+    if score >= YES_THRESHOLD:
+        return True, score, reasons
+    if score <= NO_THRESHOLD:
+        return False, score, reasons
+    return None, score, reasons
+
+
+async def llm_should_search(user_text: str) -> bool:
+    """The original LLM classifier (one llama-3.3-70b call)."""
+    classifier_prompt = (
+        "You are a strict classifier. Answer ONLY YES or NO.\n"
+        "Should this query use live web search for freshness/current events/factual lookup?\n"
+        "Search is useful for latest news, current leaders, recent updates, rankings, dates, and changing facts.\n"
+        "Search is not needed for opinions, casual chat, coding help, writing, or timeless explanations.\n\n"
+        f"Query: {user_text}\n"
+        "Answer:"
+    )
+    decision = await call_groq(
+        prompt=classifier_prompt,
+        model=CLASSIFIER_MODEL,
+        temperature=0.0,
+    )
+    return (decision or "").strip().upper().startswith("YES")
+
+
+async def should_search(user_text: str) -> bool:
+    if not user_text.strip():
+        return False
+
+    key = normalize(user_text)
+    cached = _decisions.get(key)
+    if cached is not None:
+        _stats["table"] += 1
+        return cached
+
+    decision, score, reasons = heuristic(key)
+    if decision is not None:
+        _stats["heuristic_yes" if decision else "heuristic_no"] += 1
+        print(f"[WEB SEARCH DECIDER] {'YES' if decision else 'NO'} (heuristic score={score} {','.join(reasons)})")
+        _decisions.set(key, decision)
+        return decision
+
+    started = time.perf_counter()
+    try:
+        decision = await llm_should_search(user_text)
+    except Exception as e:
+        _stats["llm_errors"] += 1
+        print(f"[WEB SEARCH DECIDER ERROR] {e}")
+        return False
+    _stats["llm"] += 1
+    _stats["llm_ms"] += (time.perf_counter() - started) * 1000
+    _decisions.set(key, decision)
+    return decision
+
+
+def get_stats() -> dict:
+    decided = _stats["table"] + _stats["heuristic_yes"] + _stats["heuristic_no"] + _stats["llm"]
+    return {
+        **_stats,
+        "llm_ms": round(_stats["llm_ms"], 1),
+        "llm_share": round(_stats["llm"] / decided, 3) if decided else None,
+    }
@@ -8,6 +8,8 @@ import time
 import io
 import json
 import aiohttp
+import http_client
+import outbox
 import asyncio
 import random
 import traceback
@@ -18,8 +20,6 @@ from typing import Optional
 from collections import deque
 from urllib.parse import urlparse, quote_plus, parse_qs
 
-from bs4 import BeautifulSoup
-import trafilatura
 
 import wavelink
 import yt_dlp
@@ -475,7 +475,6 @@ save_vote_unlocks = None
 set_server_mode = None
 set_channels_mode = None
 get_guild_config = None
-clear_runtime_channel_memory = None
 pending_transcriptions: dict[str, int] = {}
 guild_history: dict[int, list] = {}
 guild_now_message: dict[int, dict] = {}
@@ -1082,7 +1081,7 @@ MEME_SOURCES = [
 
 
 async def fetch_bytes(url: str) -> bytes:
-	async with aiohttp.ClientSession() as session:
+	async with http_client.session() as session:
 		async with session.get(url) as resp:
 			if resp.status != 200:
 				raise Exception(f"Failed to fetch: HTTP {resp.status}")
@@ -1323,81 +1322,8 @@ async def run_python_code(code: str) -> dict:
 
 # ── URL Browser / Web Scraper ─────────────────────────────────────────────────
 
-import ipaddress
-
-def _is_private_url(url: str) -> bool:
-	"""Return True if the URL points to a private/internal IP range."""
-	try:
-		hostname = urlparse(url).hostname or ""
-		import socket
-		addr = socket.getaddrinfo(hostname, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
-		for family, _, _, _, sockaddr in addr:
-			ip = ipaddress.ip_address(sockaddr[0])
-			if ip.is_private or ip.is_loopback or ip.is_reserved or ip.is_link_local:
-				return True
-	except Exception:
-		pass
-	return False
-
-async def fetch_url_content(url: str, max_chars: int = 2000) -> str:
-	"""
-	Fetch a webpage and extract its main text content.
-	Uses trafilatura first; falls back to BeautifulSoup.
-	Returns extracted text truncated to *max_chars*.
-	Blocks private/internal IP ranges to prevent SSRF.
-	"""
-	parsed = urlparse(url)
-	if parsed.scheme not in ("http", "https"):
-		return "❌ Only http and https URLs are supported."
-	if _is_private_url(url):
-		return "❌ Cannot access internal/private network addresses."
-	headers = {
-		"User-Agent": (
-			"Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-			"AppleWebKit/537.36 (KHTML, like Gecko) "
-			"Chrome/120.0.0.0 Safari/537.36"
-		)
-	}
-	try:
-		async with aiohttp.ClientSession() as session:
-			async with session.get(
-				url,
-				headers=headers,
-				timeout=aiohttp.ClientTimeout(total=15),
-				allow_redirects=True,
-			) as resp:
-				if resp.status != 200:
-					return f"❌ Could not fetch URL (HTTP {resp.status})."
-				html = await resp.text(errors="replace")
-	except asyncio.TimeoutError:
-		return "❌ URL request timed out."
-	except aiohttp.ClientError as e:
-		return f"❌ Network error: {e}"
-	except Exception as e:
-		return f"❌ Failed to fetch URL: {e}"
-
-	# Try trafilatura first (best for articles/news)
-	loop = asyncio.get_running_loop()
-	text = await loop.run_in_executor(
-		None, lambda: trafilatura.extract(html, include_links=False, include_comments=False) or ""
-	)
-
-	# Fallback to BeautifulSoup
-	if not text.strip():
-		def _bs_extract():
-			soup = BeautifulSoup(html, "html.parser")
-			for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-				tag.decompose()
-			return soup.get_text(separator="\n", strip=True)
-		text = await loop.run_in_executor(None, _bs_extract)
-
-	if not text.strip():
-		return "❌ Could not extract readable text from this page."
-
-	if len(text) > max_chars:
-		text = text[:max_chars - 3] + "..."
-	return text
-
+# Download, extraction and caching live in url_fetcher.
+from url_fetcher import fetch_url_content
 
 # ── Playlist Modals ───────────────────────────────────────────────────────────
 
@@ -2124,7 +2050,7 @@ class Codunot(commands.Cog):
 			if channel_id:
 				try:
 					channel = guild.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
-					message = await channel.send(embed=embed, view=view)
+					message = await outbox.send(channel, embed=embed, view=view)
 					guild_now_message[guild_id] = {
 						"channel_id": channel.id, "message_id": message.id,
 						"title": embed.description or "Unknown"
@@ -2327,7 +2253,7 @@ class Codunot(commands.Cog):
 		if artist and artist.lower() != "unknown":
 			params["artist_name"] = artist
 		try:
-			async with aiohttp.ClientSession() as session:
+			async with http_client.session() as session:
 				async with session.get("https://lrclib.net/api/get", params=params, timeout=aiohttp.ClientTimeout(total=12)) as resp:
 					if resp.status != 200:
 						await interaction.followup.send(f"❌ Lyrics not found for **{title}**.")
@@ -2355,7 +2281,7 @@ class Codunot(commands.Cog):
 		openverse_url = f"https://api.openverse.org/v1/images/?q={quote_plus(query)}&page_size=8"
 		try:
 			results = []
-			async with aiohttp.ClientSession() as session:
+			async with http_client.session() as session:
 				async with session.get(wikimedia_url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
 					if resp.status == 200:
 						data = await resp.json()
@@ -2414,8 +2340,6 @@ class Codunot(commands.Cog):
 		new_model = model.value
 		memory.save_channel_model(chan_id, new_model)
 		memory.clear_channel_messages(chan_id)
-		if clear_runtime_channel_memory is not None:
-			clear_runtime_channel_memory(chan_id)
 		memory.persist()
 		await interaction.response.send_message(
 			f"🧠✨ **Model switched!**\n"
@@ -3483,7 +3407,7 @@ class Codunot(commands.Cog):
 						print(f"[TRANSCRIBE REGISTER] {e}")
 			if register_base:
 				try:
-					async with aiohttp.ClientSession() as session:
+					async with http_client.session() as session:
 						async with session.post(
 							f"{register_base}/register-transcription",
 							json={"request_id": request_id, "channel_id": register_channel_id, "user_id": interaction.user.id, "deliver_in_dm": deliver_in_dm},
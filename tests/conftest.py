@@ -0,0 +1,32 @@
+"""
+Shared test setup. The bot's modules live at the repository root, and
+encryption refuses to import without ENCRYPTION_KEY, so a throwaway key is
+set before any test module imports them.
+"""
+
+import os
+import sys
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+
+class FakeClock:
+    """Stands in for the time module in modules that only call time.monotonic()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
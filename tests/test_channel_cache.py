@@ -0,0 +1,64 @@
+"""LRU / idle eviction in channel_cache.py and cold channels in memory.py."""
+
+import shutil
+
+from channel_cache import ChannelCache
+from memory import MemoryManager
+
+
+def test_lru_eviction_spills_least_recently_used():
+    spilled = {}
+    cache = ChannelCache("test", max_resident=2, on_evict=spilled.__setitem__)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache.get("a")        # b is now least recently used
+    cache["c"] = 3
+
+    assert cache.keys() == ["a", "c"]
+    assert spilled == {"b": 2}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_keep_vetoes_eviction():
+    cache = ChannelCache("test", max_resident=2, keep=lambda _key, value: value == "live")
+    cache["a"] = "live"
+    cache["b"] = "idle"
+    cache["c"] = "idle"   # a is least recently used, but live: b goes instead
+
+    assert cache.keys() == ["a", "c"]
+
+
+def test_loader_rehydrates_cold_keys():
+    cache = ChannelCache("test", loader=lambda key: f"loaded {key}" if key == "cold" else None)
+    assert cache.get("cold") == "loaded cold"
+    assert cache.get("missing", "default") == "default"
+    assert cache.stats()["hydrations"] == 1
+
+
+def test_sweep_expires_idle_entries_but_keeps_live_ones():
+    cache = ChannelCache("test", idle_ttl=60, keep=lambda key, _value: key == "live")
+    cache["idle"] = 1
+    cache["live"] = 2
+    for key in cache._touched:
+        cache._touched[key] -= 120
+
+    assert cache.sweep() == 1
+    assert cache.keys() == ["live"]
+
+
+def test_cold_channels_survive_restart_without_the_cold_dir(tmp_path):
+    path = str(tmp_path / "memory.json")
+    mm = MemoryManager(limit=5, file_path=path)
+    mm.memory.max_resident = 2
+    for channel in "abcd":
+        mm.add_message(channel, "user", f"hi {channel}")
+    mm.save_channel_model("a", "qwen/qwen3-32b")
+    mm.compact()
+    assert mm._cold_ids   # a and b were spilled
+
+    # The deploy keeps only the snapshot file.
+    shutil.rmtree(mm.cold_dir)
+    again = MemoryManager(limit=5, file_path=path)
+    for channel in "abcd":
+        assert again.get_recent_flat(channel, 5) == [f"user: hi {channel}"]
+    assert again.get_channel_model("a") == "qwen/qwen3-32b"
@@ -0,0 +1,87 @@
+"""The chunked Fernet container in encryption.py."""
+
+import asyncio
+
+import pytest
+
+import encryption
+from encryption import (
+    STREAM_MAGIC,
+    encrypt_data,
+    iter_decrypted,
+    load_encrypted,
+    load_encrypted_async,
+    save_encrypted,
+    save_encrypted_async,
+    save_encrypted_stream,
+)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "data.enc")
+
+
+def frames(path):
+    with open(path, "rb") as f:
+        assert f.read(len(STREAM_MAGIC)) == STREAM_MAGIC
+        return f.read().splitlines()
+
+
+def rewrite(path, lines):
+    with open(path, "wb") as f:
+        f.write(STREAM_MAGIC + b"".join(line + b"\n" for line in lines))
+
+
+def test_round_trip(path):
+    text = '{"hello": "wörld 🍊"}' * 10_000   # several STREAM_CHUNK_CHARS chunks
+    save_encrypted(path, text)
+    assert load_encrypted(path) == text
+    assert len(frames(path)) == -(-len(text) // encryption.STREAM_CHUNK_CHARS) + 1
+
+
+def test_empty_round_trip(path):
+    save_encrypted(path, "")
+    assert load_encrypted(path) == ""
+
+
+def test_chunks_come_back_in_order(path):
+    save_encrypted_stream(path, ["a", "b", "c"])
+    assert list(iter_decrypted(path)) == ["a", "b", "c"]
+
+
+def test_legacy_single_token_file_loads(path):
+    with open(path, "wb") as f:
+        f.write(encrypt_data('{"legacy": true}'))
+    assert load_encrypted(path) == '{"legacy": true}'
+
+
+def test_missing_end_frame_is_truncation(path):
+    save_encrypted_stream(path, ["a", "b"])
+    rewrite(path, frames(path)[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        load_encrypted(path)
+
+
+def test_dropped_frame_fails_the_end_count(path):
+    save_encrypted_stream(path, ["a", "b", "c"])
+    lines = frames(path)
+    rewrite(path, lines[:2] + lines[3:])   # frames 0, 1 and END:3
+    with pytest.raises(ValueError, match="ended after 2 of 3"):
+        load_encrypted(path)
+
+
+def test_reordered_frames_fail(path):
+    save_encrypted_stream(path, ["a", "b"])
+    first, second, end = frames(path)
+    rewrite(path, [second, first, end])
+    with pytest.raises(ValueError, match="out of order"):
+        load_encrypted(path)
+
+
+def test_async_round_trip(path):
+    async def main():
+        await save_encrypted_async(path, "async text")
+        return await load_encrypted_async(path)
+
+    assert asyncio.run(main()) == "async text"
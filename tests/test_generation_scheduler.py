@@ -0,0 +1,98 @@
+"""Fair scheduling and load shedding in generation_scheduler.py."""
+
+import asyncio
+import contextvars
+
+from generation_scheduler import GenerationScheduler
+
+
+def run(main):
+    async def wrapper():
+        scheduler = GenerationScheduler(workers=1, max_queue=100, max_per_guild=100)
+        try:
+            return await main(scheduler)
+        finally:
+            for task in scheduler._tasks:
+                task.cancel()
+    return asyncio.run(wrapper())
+
+
+def job(log, label, delay=0.0):
+    async def work():
+        log.append(f"start {label}")
+        await asyncio.sleep(delay)
+        log.append(f"end {label}")
+    return work
+
+
+async def drain(scheduler):
+    while scheduler._queued or scheduler._running_channels:
+        await asyncio.sleep(0.01)
+
+
+def test_guilds_take_turns():
+    log = []
+
+    async def main(scheduler):
+        for i in range(3):
+            scheduler.submit("busy", f"c{i}", job(log, f"busy-{i}"))
+        scheduler.submit("quiet", "c", job(log, "quiet"))
+        await drain(scheduler)
+        return scheduler.stats()
+
+    stats = run(main)
+    starts = [entry[len("start "):] for entry in log if entry.startswith("start")]
+    assert starts == ["busy-0", "quiet", "busy-1", "busy-2"]
+    assert stats["completed"] == 4 and stats["queued"] == 0
+
+
+def test_a_channel_runs_one_job_at_a_time_in_order():
+    log = []
+
+    async def main(scheduler):
+        scheduler.workers = 3
+        scheduler.submit("g", "chan", job(log, "first", 0.02))
+        scheduler.submit("g", "chan", job(log, "second"))
+        await drain(scheduler)
+
+    run(main)
+    assert log == ["start first", "end first", "start second", "end second"]
+
+
+def test_submit_sheds_when_queues_are_full():
+    async def main(scheduler):
+        scheduler.max_queue = 2
+        scheduler.max_per_guild = 1
+        results = [
+            scheduler.submit("a", "c1", job([], "a1")),
+            scheduler.submit("a", "c2", job([], "a2")),   # guild a is at its cap
+            scheduler.submit("b", "c1", job([], "b1")),
+            scheduler.submit("c", "c1", job([], "c1")),   # overall queue is full
+        ]
+        return results, scheduler.stats()["shed"]
+
+    results, shed = run(main)
+    assert results == [True, False, True, False] and shed == 2
+
+
+def test_jobs_run_in_the_submitters_context_and_count_cancellation():
+    var = contextvars.ContextVar("var", default=None)
+    seen = []
+
+    async def main(scheduler):
+        var.set("guild-42")
+
+        async def reads_context():
+            seen.append(var.get())
+
+        async def cancelled():
+            raise asyncio.CancelledError
+
+        scheduler.submit("g", "c1", reads_context)
+        scheduler.submit("g", "c2", cancelled)
+        await drain(scheduler)
+        return scheduler.stats()
+
+    stats = run(main)
+    assert seen == ["guild-42"]
+    assert stats["cancelled"] == 1 and stats["completed"] == 1
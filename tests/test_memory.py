@@ -0,0 +1,114 @@
+"""Journal replay and compaction for MemoryManager (memory.py)."""
+
+import os
+import shutil
+
+import pytest
+
+from memory import COMPACTING_SUFFIX, MemoryManager
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memory.json")
+
+
+def reopen(path, limit=5):
+    return MemoryManager(limit=limit, file_path=path)
+
+
+def write(mm, channel, *texts):
+    for text in texts:
+        mm.add_message(channel, "user", text)
+    mm.persist()   # outside an event loop the journal append is synchronous
+
+
+def test_mutations_replay_from_the_journal(path):
+    mm = reopen(path)
+    write(mm, "c1", "hello", "there")
+    mm.save_channel_mode("c1", "roast")
+    mm.save_channel_model("c1", "qwen/qwen3-32b")
+    mm.set_flag("seen")
+    mm.persist()
+
+    assert not os.path.exists(path)   # nothing compacted yet
+    again = reopen(path)
+    assert again.get_recent_flat("c1", 10) == ["user: hello", "user: there"]
+    assert again.get_channel_mode("c1") == "roast"
+    assert again.get_channel_model("c1") == "qwen/qwen3-32b"
+    assert again.get_flag("seen")
+
+
+def test_history_is_a_ring_buffer(path):
+    mm = reopen(path, limit=3)
+    write(mm, "c1", *[f"m{i}" for i in range(6)])
+    assert reopen(path, limit=3).get_recent_flat("c1", 10) == ["user: m3", "user: m4", "user: m5"]
+
+
+def test_clear_replays(path):
+    mm = reopen(path)
+    write(mm, "c1", "a", "b")
+    mm.clear_channel_messages("c1")
+    write(mm, "c1", "c")
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: c"]
+
+
+def test_compaction_writes_snapshot_and_drops_journal(path):
+    mm = reopen(path)
+    write(mm, "c1", "a", "b")
+    mm.compact()
+
+    assert os.path.exists(path)
+    assert not os.path.exists(mm.journal_path)
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: a", "user: b"]
+
+
+def test_records_after_compaction_replay_on_top_of_snapshot(path):
+    mm = reopen(path)
+    write(mm, "c1", "a")
+    mm.compact()
+    write(mm, "c1", "b")
+    write(mm, "c2", "x")
+
+    again = reopen(path)
+    assert again.get_recent_flat("c1", 10) == ["user: a", "user: b"]
+    assert again.get_recent_flat("c2", 10) == ["user: x"]
+
+
+def test_compaction_picks_up_records_not_yet_flushed(path):
+    mm = reopen(path)
+    mm.add_message("c1", "user", "pending")   # no persist(): still in memory only
+    mm.compact()
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: pending"]
+
+
+def test_crash_before_snapshot_replays_compacting_file_first(path):
+    mm = reopen(path)
+    write(mm, "c1", "a", "b")
+    # Crash after rotating the journal but before the snapshot landed.
+    os.replace(mm.journal_path, mm.journal_path + COMPACTING_SUFFIX)
+    mm._journal_records = 0
+    write(mm, "c1", "c")
+
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: a", "user: b", "user: c"]
+
+
+def test_crash_after_snapshot_does_not_double_apply(path):
+    mm = reopen(path)
+    write(mm, "c1", "a", "b")
+    old_journal = mm.journal_path + ".copy"
+    shutil.copy(mm.journal_path, old_journal)
+    mm.compact()
+    # Crash after the snapshot was written but before the rotated journal was removed.
+    os.replace(old_journal, mm.journal_path + COMPACTING_SUFFIX)
+
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: a", "user: b"]
+
+
+def test_torn_final_frame_keeps_earlier_records(path):
+    mm = reopen(path)
+    write(mm, "c1", "a", "b")
+    with open(mm.journal_path, "ab") as f:
+        f.write(b"gAAAAAtorn-frame\n")
+
+    assert reopen(path).get_recent_flat("c1", 10) == ["user: a", "user: b"]
@@ -0,0 +1,107 @@
+"""Window merging and supersede handling in message_coalescer.py."""
+
+import asyncio
+from types import SimpleNamespace
+
+from message_coalescer import MessageCoalescer, replying
+
+
+def msg(author):
+    return SimpleNamespace(author=SimpleNamespace(id=author))
+
+
+def test_lines_from_one_author_merge_into_one_turn():
+    turns = []
+
+    async def main():
+        coalescer = MessageCoalescer(window=0.02, max_delay=1.0, max_messages=10)
+        coalescer.add("c", msg(1), "yo", turns.append)
+        coalescer.add("c", msg(1), "what's 2+2", turns.append)
+        assert turns == []
+        await asyncio.sleep(0.05)
+        return coalescer.stats()
+
+    stats = asyncio.run(main())
+    assert [t.content for t in turns] == ["yo\nwhat's 2+2"]
+    assert stats["messages"] == 2 and stats["turns"] == 1 and stats["merged"] == 1
+
+
+def test_another_author_flushes_the_pending_turn():
+    turns = []
+
+    async def main():
+        coalescer = MessageCoalescer(window=0.02, max_delay=1.0, max_messages=10)
+        coalescer.add("c", msg(1), "first", turns.append)
+        coalescer.add("c", msg(2), "second", turns.append)
+        assert [t.content for t in turns] == ["first"]
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert [(t.author_id, t.content) for t in turns] == [(1, "first"), (2, "second")]
+
+
+def test_max_messages_flushes_without_waiting():
+    turns = []
+
+    async def main():
+        coalescer = MessageCoalescer(window=10.0, max_delay=10.0, max_messages=3)
+        for line in ("a", "b", "c"):
+            coalescer.add("c", msg(1), line, turns.append)
+        assert [t.content for t in turns] == ["a\nb\nc"]
+
+    asyncio.run(main())
+
+
+def test_a_new_line_supersedes_an_unsent_reply():
+    tasks = []
+
+    async def main():
+        coalescer = MessageCoalescer(window=0.01, max_delay=1.0, max_messages=10)
+
+        def dispatch(turn):
+            async def handler():
+                await asyncio.sleep(0.5)
+            tasks.append(asyncio.ensure_future(coalescer.run(turn, handler)))
+
+        coalescer.add("c", msg(1), "hi", dispatch)
+        await asyncio.sleep(0.03)
+        coalescer.add("c", msg(1), "there", dispatch)
+        await asyncio.sleep(0.03)
+        assert tasks[0].cancelled()
+        turn = coalescer._active["c"]
+        assert turn.content == "hi\nthere" and turn.resubmitted
+        tasks[1].cancel()
+        return coalescer.stats()
+
+    stats = asyncio.run(main())
+    assert stats["cancelled"] == 1
+
+
+def test_replying_turn_is_not_superseded():
+    turns = []
+    sent = []
+
+    async def main():
+        coalescer = MessageCoalescer(window=0.01, max_delay=1.0, max_messages=10)
+        release = asyncio.Event()
+
+        def dispatch(turn):
+            turns.append(turn)
+
+            async def handler():
+                replying()
+                await release.wait()
+                sent.append(turn.content)
+            asyncio.ensure_future(coalescer.run(turn, handler))
+
+        coalescer.add("c", msg(1), "hi", dispatch)
+        await asyncio.sleep(0.03)
+        coalescer.add("c", msg(1), "there", dispatch)
+        await asyncio.sleep(0.03)
+        release.set()
+        await asyncio.sleep(0.01)
+        return coalescer.stats()
+
+    stats = asyncio.run(main())
+    assert sent == ["hi", "there"]
+    assert not turns[1].resubmitted and stats["cancelled"] == 0
@@ -0,0 +1,102 @@
+"""Circuit breaker transitions in model_health.py."""
+
+import pytest
+
+import model_health
+from model_health import CLOSED, HALF_OPEN, OPEN, ModelHealth
+
+
+@pytest.fixture
+def health(clock, monkeypatch):
+    monkeypatch.setattr(model_health, "time", clock)
+    return ModelHealth("groq", "m")
+
+
+def open_breaker(health):
+    for _ in range(model_health.HEALTH_FAILURE_THRESHOLD):
+        health.failure("error")
+    assert health.state == OPEN
+
+
+def test_consecutive_failures_open_the_breaker(health):
+    for _ in range(model_health.HEALTH_FAILURE_THRESHOLD - 1):
+        health.failure("error")
+    assert health.state == CLOSED and health.available()
+    health.failure("error")
+    assert health.state == OPEN and not health.available()
+
+
+def test_success_resets_the_failure_streak(health):
+    for _ in range(model_health.HEALTH_FAILURE_THRESHOLD - 1):
+        health.failure("timeout")
+    health.success(100)
+    health.failure("timeout")
+    assert health.state == CLOSED
+
+
+def test_client_errors_do_not_count(health):
+    for _ in range(10):
+        health.failure("client")
+    assert health.state == CLOSED and health.error_rate() == 0.0
+
+
+def test_overload_and_rate_limit_with_retry_after_open_at_once(health, clock):
+    health.failure("rate_limited", retry_after=7)
+    assert health.state == OPEN
+    clock.advance(6.9)
+    assert not health.available()
+    clock.advance(0.2)
+    assert health.available()
+
+    other = ModelHealth("groq", "n")
+    other.failure("overloaded")
+    assert other.state == OPEN
+
+
+def test_half_open_lets_one_probe_through(health, clock):
+    open_breaker(health)
+    clock.advance(model_health.HEALTH_BASE_OPEN)
+
+    assert health.allow()
+    assert health.state == HALF_OPEN
+    assert not health.available()   # the probe is out
+    clock.advance(model_health.PROBE_TIMEOUT + 1)
+    assert health.available()       # a probe that never reported back stops blocking
+
+
+def test_probe_success_closes(health, clock):
+    open_breaker(health)
+    clock.advance(model_health.HEALTH_BASE_OPEN)
+    assert health.allow()
+    health.success(50)
+    assert health.state == CLOSED and health.open_seconds == model_health.HEALTH_BASE_OPEN
+
+
+def test_probe_failure_reopens_for_twice_as_long_up_to_the_cap(health, clock):
+    open_breaker(health)
+    expected = model_health.HEALTH_BASE_OPEN
+    for _ in range(10):
+        clock.advance(expected)
+        assert health.allow()
+        health.failure("error")
+        expected = min(expected * 2, model_health.HEALTH_MAX_OPEN)
+        assert health.state == OPEN
+        assert health.open_until - clock.now == pytest.approx(expected)
+    assert expected == model_health.HEALTH_MAX_OPEN
+
+
+def test_error_rate_opens_once_there_are_enough_samples(health):
+    for _ in range(model_health.HEALTH_MIN_SAMPLES):
+        health.success(10)
+        health.failure("error")
+        if health.state == OPEN:
+            break
+    assert health.state == OPEN
+
+
+def test_failure_kind_mapping():
+    assert model_health.failure_kind(429) == "rate_limited"
+    assert model_health.failure_kind(503) == "overloaded"
+    assert model_health.failure_kind(504) == "timeout"
+    assert model_health.failure_kind(401) == "client"
+    assert model_health.failure_kind(500) == "error"
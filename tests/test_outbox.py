@@ -0,0 +1,148 @@
+"""Lane priority, per-channel ordering and backlog shedding in outbox.py."""
+
+import asyncio
+
+import pytest
+
+import outbox
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, **kwargs):
+        self.channel.log.append(("edit", kwargs["content"]))
+        self.content = kwargs["content"]
+        return self
+
+    async def delete(self):
+        self.channel.log.append(("delete", self.content))
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.log = []
+        self.gate = None    # an Event sends wait on, to hold the channel busy
+
+    async def send(self, content=None, **kwargs):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.log.append(("send", content))
+        return FakeMessage(self, content)
+
+
+@pytest.fixture(autouse=True)
+def fresh_outbox(monkeypatch):
+    """Module state is per process; give each test (and its event loop) a clean slate."""
+    monkeypatch.setattr(outbox, "_channels", {})
+    monkeypatch.setattr(outbox, "_dispatcher", None)
+    monkeypatch.setattr(outbox, "_in_flight", 0)
+    monkeypatch.setattr(outbox, "_global", outbox.TokenBucket(1000, 1.0))
+    monkeypatch.setattr(outbox, "_stats", dict.fromkeys(outbox._stats, 0))
+
+    def run(main):
+        async def wrapper():
+            monkeypatch.setattr(outbox, "_wakeup", asyncio.Event())
+            try:
+                return await main()
+            finally:
+                if outbox._dispatcher is not None:
+                    outbox._dispatcher.cancel()
+        return asyncio.run(wrapper())
+
+    return run
+
+
+def sent(channel):
+    return [content for kind, content in channel.log if kind == "send"]
+
+
+def test_lanes_go_out_in_priority_order(fresh_outbox):
+    channel = FakeChannel(1)
+
+    async def main():
+        channel.gate = asyncio.Event()
+        first = asyncio.ensure_future(outbox.send(channel, "first"))
+        await asyncio.sleep(0.01)   # "first" is in flight; the rest queue behind it
+        later = [
+            asyncio.ensure_future(outbox.send(channel, "promo", priority=outbox.PROMO)),
+            asyncio.ensure_future(outbox.send(channel, "reply")),
+            asyncio.ensure_future(outbox.send(channel, "mod", priority=outbox.MODERATION)),
+        ]
+        await asyncio.sleep(0.01)
+        assert outbox.stats()["queued"] == {"moderation": 1, "reply": 1, "promo": 1}
+        channel.gate.set()
+        await asyncio.gather(first, *later)
+
+    fresh_outbox(main)
+    assert sent(channel) == ["first", "mod", "reply", "promo"]
+
+
+def test_send_many_parts_stay_together_and_in_order(fresh_outbox):
+    channel = FakeChannel(1)
+
+    async def main():
+        batch = asyncio.ensure_future(outbox.send_many(channel, ["a", "", "b", "c"]))
+        single = asyncio.ensure_future(outbox.send(channel, "d"))
+        messages = await batch
+        await single
+        return [m.content for m in messages]
+
+    assert fresh_outbox(main) == ["a", "b", "c"]
+    assert sent(channel) == ["a", "b", "c", "d"]
+
+
+def test_promos_are_dropped_over_the_backlog(fresh_outbox, monkeypatch):
+    monkeypatch.setattr(outbox, "PROMO_MAX_BACKLOG", 0)
+    channel = FakeChannel(1)
+
+    async def main():
+        channel.gate = asyncio.Event()
+        busy = asyncio.ensure_future(outbox.send(channel, "busy"))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.ensure_future(outbox.send(channel, "waiting"))
+        await asyncio.sleep(0.01)
+        dropped = await outbox.send(channel, "promo", priority=outbox.PROMO)
+        channel.gate.set()
+        await asyncio.gather(busy, waiting)
+        return dropped
+
+    assert fresh_outbox(main) is None
+    assert sent(channel) == ["busy", "waiting"]
+    assert outbox.stats()["dropped"] == 1
+
+
+def test_edits_and_deletes_queue_behind_sends(fresh_outbox):
+    channel = FakeChannel(1)
+
+    async def main():
+        message = await outbox.send(channel, "draft")
+        sending = asyncio.ensure_future(outbox.send(channel, "next"))
+        await asyncio.sleep(0)      # let "next" enqueue first
+        edited = await outbox.edit(message, content="final")
+        await outbox.delete(message)
+        await sending
+        return edited
+
+    edited = fresh_outbox(main)
+    assert edited.content == "final"
+    assert channel.log == [("send", "draft"), ("send", "next"), ("edit", "final"), ("delete", "final")]
+
+
+def test_send_errors_reach_the_caller(fresh_outbox):
+    class Forbidden(Exception):
+        pass
+
+    class LockedChannel(FakeChannel):
+        async def send(self, content=None, **kwargs):
+            raise Forbidden("missing permissions")
+
+    async def main():
+        with pytest.raises(Forbidden):
+            await outbox.send(LockedChannel(2), "hi")
+        return outbox.stats()["failed"]
+
+    assert fresh_outbox(main) == 1
@@ -0,0 +1,96 @@
+"""Debounced flushing and atomic writes in persistence.py."""
+
+import asyncio
+import itertools
+import os
+
+import pytest
+
+import persistence
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A registered plain-text store whose serialize() returns state["text"]."""
+    state = {"text": "", "path": str(tmp_path / "store.json"), "name": f"test-store-{next(_names)}"}
+    persistence.register_store(state["name"], state["path"], lambda: state["text"], delay=0.05)
+    yield state
+    persistence._stores.pop(state["name"], None)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def stats(store):
+    return persistence.get_stats()[store["name"]]
+
+
+def test_outside_a_loop_mark_dirty_writes_at_once(store):
+    store["text"] = "v1"
+    persistence.mark_dirty(store["name"])
+    assert read(store["path"]) == "v1"
+    assert stats(store)["writes"] == 1
+
+
+def test_marks_within_the_delay_coalesce_into_one_write(store):
+    async def main():
+        for i in range(5):
+            store["text"] = f"v{i}"
+            persistence.mark_dirty(store["name"])
+        assert not os.path.exists(store["path"])
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert read(store["path"]) == "v4"
+    assert stats(store)["writes"] == 1
+    assert stats(store)["saved"] == 4
+
+
+def test_mark_after_a_flush_schedules_another(store):
+    async def main():
+        store["text"] = "first"
+        persistence.mark_dirty(store["name"])
+        await asyncio.sleep(0.2)
+        store["text"] = "second"
+        persistence.mark_dirty(store["name"])
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert read(store["path"]) == "second"
+    assert stats(store)["writes"] == 2
+
+
+def test_flush_all_async_writes_without_waiting_for_the_timer(store):
+    async def main():
+        store["text"] = "now"
+        persistence.mark_dirty(store["name"])
+        await persistence.flush_all_async()
+        assert read(store["path"]) == "now"
+
+    asyncio.run(main())
+    assert not stats(store)["dirty"]
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "state.json"
+    persistence.atomic_write(str(path), "plain")
+    persistence.atomic_write(str(path), "encrypted", encrypted=True)
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_write_errors_are_counted_not_raised(tmp_path):
+    name = f"test-store-{next(_names)}"
+
+    def broken(_payload):
+        raise OSError("disk full")
+
+    persistence.register_store(name, str(tmp_path / "x"), lambda: "x", writer=broken)
+    try:
+        persistence.mark_dirty(name)
+        assert persistence.get_stats()[name]["errors"] == 1
+    finally:
+        persistence._stores.pop(name, None)
@@ -0,0 +1,116 @@
+"""Header-learned buckets and the fair wait queue in rate_limiter.py."""
+
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import ModelLimiter, RateLimited, parse_duration
+from token_bucket import TokenBucket
+
+HEADERS = {
+    "x-ratelimit-limit-requests": "1000",
+    "x-ratelimit-remaining-requests": "990",
+    "x-ratelimit-limit-tokens": "6000",
+    "x-ratelimit-remaining-tokens": "100",
+}
+
+
+def test_parse_duration():
+    assert parse_duration("7.66s") == pytest.approx(7.66)
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("3") == 3.0
+    assert parse_duration("") is None and parse_duration("soon") is None
+
+
+def test_token_bucket_refills_over_its_period(clock, monkeypatch):
+    monkeypatch.setattr("token_bucket.time", clock)
+    bucket = TokenBucket(10, 5.0)
+    bucket.take(10)
+    assert bucket.wait_time(2, clock.now) == pytest.approx(1.0)
+    clock.advance(1.0)
+    assert bucket.wait_time(2, clock.now) == 0.0
+    bucket.sync(3, capacity=20)
+    assert (bucket.level, bucket.capacity) == (3, 20)
+
+
+def test_nothing_is_enforced_until_limits_are_known():
+    limiter = ModelLimiter("m@key1")
+    assert limiter.requests is None and limiter.tokens is None
+    assert limiter._wait_time(1_000_000) == 0.0
+    assert limiter.stats()["tpm"] is None
+
+
+def test_limits_are_learned_and_resized_from_headers():
+    limiter = ModelLimiter("m@key1")
+    limiter.update(HEADERS, 200)
+
+    assert limiter.requests.capacity == 1000 and limiter.requests.period == rate_limiter.REQUESTS_PERIOD
+    assert limiter.tokens.capacity == 6000 and limiter.tokens.period == 60.0
+    assert round(limiter.tokens.level) == 100
+    assert limiter._wait_time(1000) > 0
+
+    limiter.update({**HEADERS, "x-ratelimit-limit-tokens": "12000", "x-ratelimit-remaining-tokens": "12000"}, 200)
+    assert limiter.tokens.capacity == 12000 and limiter._wait_time(1000) == 0.0
+
+
+def test_env_override_pins_the_limit(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "GROQ_TPM", 500)
+    limiter = ModelLimiter("m@key1")
+    limiter.update(HEADERS, 200)
+    assert limiter.tokens.capacity == 500 and limiter.tokens.period == 60.0
+
+
+def test_exhausted_requests_and_429_block(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    limiter = ModelLimiter("m@key1")
+
+    limiter.update({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m"}, 200)
+    assert limiter.blocked_until - clock.now == pytest.approx(60)
+
+    other = ModelLimiter("m@key2")
+    other.update({"retry-after": "12"}, 429)
+    assert other.blocked_until - clock.now == pytest.approx(12)
+    assert other.throttled == 1
+
+    third = ModelLimiter("m@key3")
+    third.update({}, 429)
+    assert third.blocked_until - clock.now == pytest.approx(5)
+
+
+def test_acquire_rejects_when_the_wait_is_too_long():
+    limiter = ModelLimiter("m@key1")
+    limiter.tokens = TokenBucket(100, 60.0)
+    limiter.tokens.level = 0
+
+    async def main():
+        with pytest.raises(RateLimited) as excinfo:
+            await limiter.acquire(50, "guild", max_wait=1.0)
+        assert excinfo.value.retry_after == pytest.approx(30, rel=0.05)
+
+    asyncio.run(main())
+    assert limiter.rejected == 1
+
+
+def test_waiters_are_served_round_robin_across_keys():
+    limiter = ModelLimiter("m@key1")
+    limiter.tokens = TokenBucket(100, 1.0)   # one 10-token request every 0.1 s
+    limiter.tokens.level = 0
+    order = []
+
+    async def request(key, label):
+        await limiter.acquire(10, key, max_wait=5.0)
+        order.append(label)
+
+    async def main():
+        await asyncio.gather(
+            request("busy", "busy-1"),
+            request("busy", "busy-2"),
+            request("busy", "busy-3"),
+            request("quiet", "quiet-1"),
+        )
+
+    asyncio.run(main())
+    assert order == ["busy-1", "quiet-1", "busy-2", "busy-3"]
+    assert limiter.granted == 4 and limiter.queued == 4
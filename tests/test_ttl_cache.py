@@ -0,0 +1,102 @@
+"""TTLCache and SingleFlight in ttl_cache.py."""
+
+import asyncio
+import time
+
+import pytest
+
+from ttl_cache import SingleFlight, TTLCache
+
+
+def test_get_set_and_expiry(monkeypatch):
+    cache = TTLCache("test", ttl=10)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("k", "gone") == "gone"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_non_positive_ttl_is_not_stored():
+    cache = TTLCache("test", ttl=10)
+    cache.set("k", "old")
+    cache.set("k", "new", ttl=0)
+    assert "k" not in cache
+    assert len(cache) == 0
+
+
+def test_lru_eviction_at_maxsize():
+    cache = TTLCache("test", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_dump_and_load_keep_the_most_recent_rows():
+    cache = TTLCache("test")
+    for i in range(5):
+        cache.set(i, f"v{i}")
+    rows = cache.dump(limit=2)
+    assert [row[0] for row in rows] == [3, 4]
+
+    restored = TTLCache("restored")
+    restored.load(rows)
+    assert restored.get(4) == "v4" and 0 not in restored
+
+
+def test_get_or_load_coalesces_concurrent_misses():
+    cache = TTLCache("test")
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert await cache.get_or_load("k", loader) == "value"   # now cached
+
+    asyncio.run(main())
+    assert calls == 1
+
+
+def test_get_or_load_does_not_cache_errors_or_zero_ttl():
+    cache = TTLCache("test")
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def empty():
+        return ""
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("k", failing)
+        await cache.get_or_load("e", empty, ttl_for=lambda text: 60 if text else 0)
+
+    asyncio.run(main())
+    assert "k" not in cache and "e" not in cache
+
+
+def test_single_flight_waiter_timeout_does_not_cancel_the_load():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", slow))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.do("k", slow), timeout=0.01)
+        assert await first == "done"
+
+    asyncio.run(main())
+    assert flight.coalesced == 1
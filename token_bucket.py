@@ -0,0 +1,43 @@
+"""
+Continuous-refill token bucket, shared by rate_limiter (Groq requests and
+tokens) and outbox (Discord sends per channel and globally).
+
+    bucket = TokenBucket(5, 5.0)            # 5 units per 5 seconds
+    wait = bucket.wait_time(1, time.monotonic())
+    if wait == 0:
+        bucket.take(1)
+    bucket.sync(remaining, capacity)        # resync from a server's rate-limit headers
+"""
+
+import time
+
+
+class TokenBucket:
+    """*capacity* units, refilled continuously over *period* seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.period = period
+        self.level = capacity
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.capacity / self.period)
+        self.stamp = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * self.period / self.capacity
+
+    def take(self, amount: float):
+        self.refill(time.monotonic())
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, remaining: float, capacity: float | None = None):
+        if capacity:
+            self.capacity = capacity
+        self.level = min(remaining, self.capacity)
+        self.stamp = time.monotonic()
@@ -4,6 +4,7 @@ import os
 import time
 from typing import Optional, Tuple, Any
 import aiohttp
+import http_client
 
 TOPGG_TOKEN = os.getenv("TOPGG_TOKEN")
 BOT_ID = "1435987186502733878"
@@ -90,7 +91,7 @@ async def has_voted(
     attempts = max(1, poll_attempts)
     interval = max(0, poll_interval_seconds)
 
-    async with aiohttp.ClientSession() as session:
+    async with http_client.session() as session:
         for attempt in range(attempts):
             voted, _ = await _request_vote_status(
                 session, user_id, url, headers
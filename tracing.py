@@ -0,0 +1,193 @@
+"""
+Lightweight per-message latency tracing.
+
+A trace follows one message through the bot; stages inside it are spans:
+
+    tracing.start("message", chan=chan_id)      # in on_message, once the bot is addressed
+    with tracing.span("nl_parse"):
+        ...
+    @tracing.traced("vote_check")
+    async def require_vote(message): ...
+    tracing.finish()                            # in on_message's finally
+
+    @tracing.root("reply", follow=True)         # a function that is a trace of its own
+    async def generate_and_reply(...): ...
+
+The current trace lives in a context variable, so spans recorded in child
+tasks (and in jobs on the generation pool, which copy the submitting
+context) land in the right place. A reply produced later on the pool is a
+trace of its own with follow=True: it is timed from the original message's
+arrival and opens with a "pending" span covering debounce and queueing.
+
+Every span feeds a per-stage histogram (HISTOGRAM_BOUNDS_MS buckets plus
+recent samples for p50/p95). A trace slower than SLOW_TRACE_MS is logged
+with its full span breakdown and kept for the !latency command.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+
+SLOW_TRACE_MS = float(os.getenv("SLOW_TRACE_MS", "10000"))
+HISTOGRAM_BOUNDS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)   # last bucket: above every bound
+        self.recent = deque(maxlen=500)
+        self.total = 0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+        self.recent.append(ms)
+        self.total += 1
+
+    def percentile(self, pct: float) -> float | None:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+_histograms: dict[str, Histogram] = {}
+_slow = deque(maxlen=20)
+
+
+def _observe(stage: str, ms: float):
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        histogram = _histograms[stage] = Histogram()
+    histogram.add(ms)
+
+
+class Trace:
+    def __init__(self, name: str, origin: float | None = None, **attrs):
+        self.name = name
+        self.origin = time.perf_counter() if origin is None else origin
+        self.attrs = attrs
+        self.spans = []   # (stage, offset ms, duration ms), in completion order
+
+    def record(self, stage: str, started: float, ended: float):
+        self.spans.append((stage, (started - self.origin) * 1000, (ended - started) * 1000))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.origin) * 1000
+
+    def breakdown(self) -> str:
+        spans = sorted(self.spans, key=lambda s: s[1])
+        return " · ".join(f"{stage} +{offset:.0f}ms {duration:.0f}ms" for stage, offset, duration in spans)
+
+
+class span:
+    """Time a block as *stage* of the current trace (histogram only if there is none)."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter()
+        _observe(self.stage, (ended - self.started) * 1000)
+        trace = _current.get()
+        if trace is not None:
+            trace.record(self.stage, self.started, ended)
+        return False
+
+
+def traced(stage: str):
+    """Decorator: run an async function inside span(stage)."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def root(name: str, follow: bool = False):
+    """Decorator: run an async function as a trace of its own (start ... finish)."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start(name, follow=follow)
+            status = "error"
+            try:
+                result = await func(*args, **kwargs)
+                status = "ok"
+                return result
+            except BaseException as e:
+                if isinstance(e, asyncio.CancelledError):
+                    status = "cancelled"
+                raise
+            finally:
+                finish(status)
+        return wrapper
+    return decorate
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+def start(name: str, follow: bool = False, **attrs) -> Trace:
+    """
+    Start a trace for this task. With follow=True and a trace already in
+    the context (inherited from the message that triggered this work), the
+    new trace is timed from that message's arrival.
+    """
+    parent = _current.get() if follow else None
+    if parent is not None:
+        trace = Trace(name, origin=parent.origin, **{**parent.attrs, **attrs})
+        trace.record("pending", parent.origin, time.perf_counter())
+        _observe("pending", trace.spans[-1][2])
+    else:
+        trace = Trace(name, **attrs)
+    _current.set(trace)
+    return trace
+
+
+def finish(status: str = "ok") -> None:
+    """End the current trace: record its total and log it if slow."""
+    trace = _current.get()
+    if trace is None:
+        return
+    _current.set(None)
+    total = trace.elapsed_ms()
+    _observe(trace.name, total)
+    if total >= SLOW_TRACE_MS:
+        attrs = " ".join(f"{k}={v}" for k, v in trace.attrs.items())
+        line = f"{trace.name} {total:.0f}ms [{status}] {attrs}: {trace.breakdown()}"
+        _slow.append(line)
+        print(f"[SLOW] {line}")
+
+
+# ---------------- METRICS ----------------
+
+def summary() -> dict[str, dict]:
+    """stage -> count, p50/p95 (ms) and bucket counts keyed by upper bound."""
+    result = {}
+    for stage, histogram in sorted(_histograms.items()):
+        p50, p95 = histogram.percentile(0.5), histogram.percentile(0.95)
+        labels = [f"≤{b}" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+        result[stage] = {
+            "count": histogram.total,
+            "p50_ms": round(p50) if p50 is not None else None,
+            "p95_ms": round(p95) if p95 is not None else None,
+            "buckets": dict(zip(labels, histogram.counts)),
+        }
+    return result
+
+
+def slow_traces() -> list[str]:
+    return list(_slow)
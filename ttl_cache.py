@@ -0,0 +1,150 @@
+"""
+Size-bounded TTL cache for memoizing expensive lookups (OCR, search, ...).
+
+Expiry uses wall-clock time so entries can be dumped to disk and reloaded
+after a restart with their remaining lifetime intact. Eviction is LRU once
+``maxsize`` is reached. get_or_load() adds single-flight loading: concurrent
+misses for one key share a single loader call.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+_caches: list["TTLCache"] = []
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one waiter timing out does not cancel the others' load.
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    def __init__(self, name, maxsize=1000, ttl=3600.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data = OrderedDict()   # key -> (expires_at, value), least recently used first
+        self._flight = SingleFlight()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        _caches.append(self)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store *value* for *ttl* seconds (default: the cache's ttl); a ttl <= 0 stores nothing."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader, ttl_for=None):
+        """
+        Cached value for *key*, else await loader() once for all concurrent
+        callers and cache the result. ttl_for(value) can pick a per-value TTL
+        (e.g. shorter for empty results, 0 to not cache it); exceptions are
+        not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def load():
+            result = await loader()
+            self.set(key, result, ttl=ttl_for(result) if ttl_for else None)
+            return result
+
+        return await self._flight.do(key, load)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def __len__(self):
+        return len(self._data)
+
+    # ---------------- PERSISTENCE ----------------
+
+    def dump(self, limit=None):
+        """
+        JSON-friendly [key, expires_at, value] rows, least recently used first,
+        expired rows skipped; with *limit*, only the most recently used rows.
+        """
+        now = time.time()
+        rows = [[key, expires_at, value] for key, (expires_at, value) in self._data.items() if expires_at > now]
+        return rows[-limit:] if limit else rows
+
+    def load(self, rows):
+        now = time.time()
+        for key, expires_at, value in rows:
+            if expires_at > now:
+                self._data[key] = (expires_at, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    # ---------------- METRICS ----------------
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self._flight.coalesced,
+        }
+
+
+_MISSING = object()
+
+
+def all_stats():
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,246 @@
+"""
+Bounded, cached webpage text extraction for fetch_url_content.
+
+    DNS        resolved off the event loop, cached per host, and every
+               redirect hop is checked against private/internal ranges (SSRF)
+    download   streamed through the shared HTTP pool, stopped at URL_MAX_BYTES
+    extract    trafilatura, then BeautifulSoup, in a dedicated process pool
+               (both are CPU-heavy and hold the GIL)
+    cache      extracted text per URL; fresh for URL_CACHE_FRESH seconds, then
+               revalidated with If-None-Match / If-Modified-Since
+"""
+
+import asyncio
+import ipaddress
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+
+import http_client
+from ttl_cache import SingleFlight, TTLCache
+
+URL_MAX_BYTES = int(os.getenv("URL_MAX_BYTES", str(2 * 1024 * 1024)))
+URL_CACHE_FRESH = float(os.getenv("URL_CACHE_FRESH", "900"))
+URL_CACHE_KEEP = 24 * 60 * 60          # how long validators are kept for revalidation
+URL_MAX_REDIRECTS = 5
+URL_MAX_TEXT = 20_000                  # extracted text kept per URL; callers truncate further
+DNS_CACHE_TTL = 300
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    )
+}
+
+_dns_cache = TTLCache("url_dns", maxsize=2000, ttl=DNS_CACHE_TTL)
+_content_cache = TTLCache("url_content", maxsize=500, ttl=URL_CACHE_KEEP)
+_fetches = SingleFlight()
+_pool: ProcessPoolExecutor | None = None
+
+_stats = {"fresh_hits": 0, "revalidated": 0, "downloads": 0, "truncated": 0, "blocked": 0}
+
+
+class FetchError(Exception):
+    """User-facing failure; the message is returned as the ❌ reply."""
+
+
+# ---------------- DNS / SSRF ----------------
+
+async def resolve_host(hostname: str) -> list[str]:
+    async def lookup():
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(hostname, None, family=socket.AF_UNSPEC, type=socket.SOCK_STREAM)
+        return sorted({info[4][0] for info in infos})
+
+    return await _dns_cache.get_or_load(hostname, lookup)
+
+
+def _is_private_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return (
+        ip.is_private or ip.is_loopback or ip.is_reserved or ip.is_link_local
+        or ip.is_multicast or ip.is_unspecified
+    )
+
+
+async def is_private_url(url: str) -> bool:
+    """True if the URL's host is, or resolves to, a private/internal address."""
+    hostname = urlparse(url).hostname or ""
+    try:
+        return _is_private_ip(hostname)
+    except ValueError:
+        pass  # not an IP literal
+    try:
+        addresses = await resolve_host(hostname)
+    except OSError:
+        return False  # unresolvable; the download fails on its own
+    return any(_is_private_ip(address) for address in addresses)
+
+
+# ---------------- DOWNLOAD ----------------
+
+async def _download(url: str, validators: dict) -> tuple[int, str, dict]:
+    """
+    GET *url* following redirects by hand so every hop passes the SSRF check.
+    Returns (status, html, response validators); html is "" for 304.
+    """
+    async with http_client.session() as session:
+        for _ in range(URL_MAX_REDIRECTS + 1):
+            if urlparse(url).scheme not in ("http", "https"):
+                raise FetchError("❌ Only http and https URLs are supported.")
+            if await is_private_url(url):
+                _stats["blocked"] += 1
+                raise FetchError("❌ Cannot access internal/private network addresses.")
+
+            async with session.get(
+                url,
+                headers={**HEADERS, **validators},
+                timeout=aiohttp.ClientTimeout(total=15),
+                allow_redirects=False,
+            ) as resp:
+                if resp.status in (301, 302, 303, 307, 308) and resp.headers.get("Location"):
+                    url = urljoin(url, resp.headers["Location"])
+                    continue
+
+                response_validators = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+                if resp.status != 200:
+                    return resp.status, "", response_validators
+
+                body = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) >= URL_MAX_BYTES:
+                        # The readable text is near the top; stop reading here.
+                        _stats["truncated"] += 1
+                        del body[URL_MAX_BYTES:]
+                        break
+                html = body.decode(resp.charset or "utf-8", errors="replace")
+                return resp.status, html, response_validators
+
+    raise FetchError("❌ Too many redirects.")
+
+
+# ---------------- EXTRACTION ----------------
+
+def _extract_text(html: str) -> str:
+    """Runs in an extraction worker process."""
+    import trafilatura
+
+    # Try trafilatura first (best for articles/news)
+    text = trafilatura.extract(html, include_links=False, include_comments=False) or ""
+
+    # Fallback to BeautifulSoup
+    if not text.strip():
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
+            tag.decompose()
+        text = soup.get_text(separator="\n", strip=True)
+
+    return text[:URL_MAX_TEXT]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and thread pools is unsafe.
+        # Spawned workers re-import the main script (groq_bot) as __mp_main__, which
+        # is why its state files are only loaded under `if __name__ == "__main__"`.
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def extract_text(html: str) -> str:
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), _extract_text, html)
+    except BrokenProcessPool:
+        print("[URL FETCH] Extraction pool died; restarting it")
+        _pool = None
+        return await loop.run_in_executor(_get_pool(), _extract_text, html)
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ---------------- CACHED FETCH ----------------
+
+async def _fetch_text(url: str) -> str:
+    cached = _content_cache.get(url)
+    if cached and time.time() - cached["fetched"] < URL_CACHE_FRESH:
+        _stats["fresh_hits"] += 1
+        return cached["text"]
+
+    validators = {}
+    if cached:
+        if cached.get("etag"):
+            validators["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            validators["If-Modified-Since"] = cached["last_modified"]
+
+    status, html, response_validators = await _download(url, validators)
+
+    if status == 304 and cached:
+        _stats["revalidated"] += 1
+        _content_cache.set(url, {**cached, "fetched": time.time()})
+        return cached["text"]
+    if status != 200:
+        raise FetchError(f"❌ Could not fetch URL (HTTP {status}).")
+
+    _stats["downloads"] += 1
+    text = await extract_text(html)
+    if text.strip():
+        _content_cache.set(url, {"text": text, "fetched": time.time(), **response_validators})
+    return text
+
+
+async def fetch_url_content(url: str, max_chars: int = 2000) -> str:
+    """
+    Fetch a webpage and extract its main text content.
+    Uses trafilatura first; falls back to BeautifulSoup.
+    Returns extracted text truncated to *max_chars*.
+    Blocks private/internal IP ranges (including via redirects) to prevent SSRF.
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        return "❌ Only http and https URLs are supported."
+
+    try:
+        text = await _fetches.do(url, lambda: _fetch_text(url))
+    except FetchError as e:
+        return str(e)
+    except asyncio.TimeoutError:
+        return "❌ URL request timed out."
+    except aiohttp.ClientError as e:
+        return f"❌ Network error: {e}"
+    except Exception as e:
+        return f"❌ Failed to fetch URL: {e}"
+
+    if not text.strip():
+        return "❌ Could not extract readable text from this page."
+
+    if len(text) > max_chars:
+        text = text[:max_chars - 3] + "..."
+    return text
+
+
+def get_stats() -> dict:
+    return dict(_stats)
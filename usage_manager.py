@@ -3,6 +3,8 @@ import json
 import asyncio
 from datetime import date, datetime, timedelta
 
+from persistence import register_store, mark_dirty
+
 USAGE_FILE = "daily_usage.json"
 TOTAL_FILE = "total_usage.json"
 
@@ -291,20 +293,22 @@ async def deny_limit(message_or_interaction, kind: str):
 		else:
 			await message_or_interaction.response.send_message(msg, ephemeral=False)
 
-def save_usage():
-	try:
-		with open(USAGE_FILE, "w", encoding="utf-8") as f:
-			json.dump(channel_usage, f, indent=2)
-	except Exception as e:
-		print("[SAVE DAILY ERROR]", e)
+def _serialize_daily() -> str:
+	return json.dumps(channel_usage, indent=2)
 
-	try:
-		with open(TOTAL_FILE, "w", encoding="utf-8") as f:
-			json.dump({
-				"attachments": attachment_history
-			}, f, indent=2)
-	except Exception as e:
-		print("[SAVE TOTAL ERROR]", e)
+def _serialize_total() -> str:
+	return json.dumps({
+		"attachments": attachment_history
+	}, indent=2)
+
+register_store("daily_usage", USAGE_FILE, _serialize_daily)
+register_store("total_usage", TOTAL_FILE, _serialize_total)
+
+def save_usage():
+	# Coalesced by the persistence scheduler: consume() + consume_total() +
+	# an explicit save_usage() in one handler still cost one write per file.
+	mark_dirty("daily_usage")
+	mark_dirty("total_usage")
 
 def load_usage():
 	global channel_usage, attachment_history